@@ -0,0 +1,204 @@
+import json
+import time
+from typing import Iterator, Optional
+
+from downloaders.post_exporter import EXPORT_FORMATS
+from downloaders.substack_archives_downloader import DownloadTask, SubstackArchivesDownloader
+from utilities import exceptions, helper
+
+"""
+Job file shape:
+{
+    'username': {str} 'reader@example.com',          (optional, can be given on the command line instead)
+    'is_headless': {bool} true,                       (optional, defaults to true)
+    'num_render_workers': {int} 1,                    (optional, at least 1; --render-workers overrides it)
+    'jobs': [
+        {
+            'url': {str} 'https://newsletter.substack.com',
+            'k': {int} 10,                            (either k, or start_date and end_date)
+            'start_date': {int} 20210101,
+            'end_date': {int} 20211231,
+            'download_podcasts': {bool} false,        (optional)
+            'output_format': {str} 'pdf',             (optional, 'pdf', 'html', 'markdown' or 'epub')
+            'priority': {int} 0                       (optional, higher priority jobs run first)
+        }
+    ]
+}
+"""
+
+
+class BatchJob:
+    output_formats = ('pdf', *EXPORT_FORMATS)
+
+    def __init__(self, url: str, k: Optional[int] = None, start_date: Optional[int] = None,
+                 end_date: Optional[int] = None, download_podcasts: bool = False, output_format: str = 'pdf',
+                 priority: int = 0):
+        self.url = url
+        self.k = k
+        self.start_date = start_date
+        self.end_date = end_date
+        self.download_podcasts = download_podcasts
+        self.output_format = output_format
+        self.priority = priority
+
+    def run(self, downloader: SubstackArchivesDownloader) -> int:
+        """
+        :return: the number of articles downloaded or exported
+        """
+        if self.output_format == 'pdf':
+            if self.k is not None:
+                return downloader.download_k_most_recent(self.k, self.download_podcasts)
+            return downloader.download_date_range(self.start_date, self.end_date, self.download_podcasts)
+        if self.k is not None:
+            return downloader.export_k_most_recent(self.k, self.output_format, self.download_podcasts)
+        return downloader.export_date_range(self.start_date, self.end_date, self.output_format,
+                                            self.download_podcasts)
+
+    def get_download_tasks(self, downloader: SubstackArchivesDownloader) -> Iterator[DownloadTask]:
+        # PDFs only, for rendering by worker processes (see Coordinator)
+        if self.k is not None:
+            return downloader.get_download_tasks_k_most_recent(self.k, self.download_podcasts)
+        return downloader.get_download_tasks_date_range(self.start_date, self.end_date, self.download_podcasts)
+
+    def describe(self) -> str:
+        articles = f"{self.k} most recent" if self.k is not None else f"{self.start_date} to {self.end_date}"
+        return f"{self.url} ({articles}, {self.output_format})"
+
+    @staticmethod
+    def convert_dict_to_batch_job(job_file_path: str, job_dict: dict) -> 'BatchJob':
+        def invalid(reason: str) -> exceptions.InvalidJobFile:
+            return exceptions.InvalidJobFile(job_file_path, f"{reason} in job {job_dict}")
+
+        try:
+            batch_job = BatchJob(**job_dict)
+        except TypeError as exc:  # missing url, or unknown keys
+            raise invalid(str(exc))
+        try:
+            helper.input_is_url(batch_job.url)
+        except exceptions.NotUrlException as exc:
+            raise invalid(str(exc))
+        has_k = batch_job.k is not None
+        has_date_range = batch_job.start_date is not None and batch_job.end_date is not None
+        if has_k == has_date_range:
+            raise invalid("either k, or start_date and end_date, are needed")
+        if has_k and (not isinstance(batch_job.k, int) or batch_job.k < 1):
+            raise invalid("k must be a positive integer")
+        if has_date_range and not batch_job.start_date <= batch_job.end_date:
+            raise invalid("start_date must not be after end_date")
+        if batch_job.output_format not in BatchJob.output_formats:
+            raise invalid(f"output_format must be one of {', '.join(BatchJob.output_formats)}")
+        return batch_job
+
+
+class BatchRunner:
+    """
+    Runs every job of a job file in one process, with one browser that signs in once and is then pointed at each
+    job's publication in turn (see SubstackArchivesDownloader.switch_publication). Jobs run from the highest
+    priority to the lowest, in job file order within a priority, and a job that fails does not stop the others.
+    """
+
+    def __init__(self, job_file_path: str, num_render_workers: Optional[int] = None):
+        """
+        :param num_render_workers: if given, instead of the job file's
+        """
+        try:
+            with open(job_file_path) as f:
+                job_file = json.load(f)
+        except (OSError, ValueError) as exc:
+            raise exceptions.InvalidJobFile(job_file_path, str(exc))
+        if not isinstance(job_file, dict) or not job_file.get('jobs'):
+            raise exceptions.InvalidJobFile(job_file_path, "there are no jobs")
+        self.username: Optional[str] = job_file.get('username')
+        self._is_headless = job_file.get('is_headless', True)
+        self._num_render_workers = num_render_workers or job_file.get('num_render_workers', 1)
+        if not isinstance(self._num_render_workers, int) or self._num_render_workers < 1:
+            raise exceptions.InvalidJobFile(job_file_path, "num_render_workers must be a positive integer")
+        self._batch_jobs = [BatchJob.convert_dict_to_batch_job(job_file_path, job_dict)
+                            for job_dict in job_file['jobs']]
+
+    def run(self, username: str, password: str) -> 'BatchReport':
+        batch_report = BatchReport()
+        batch_report.start()
+        scheduled_jobs = self.get_scheduled_jobs()
+        downloader = SubstackArchivesDownloader(scheduled_jobs[0].url, self._is_headless, self._num_render_workers)
+        try:
+            downloader.log_in(username, password)
+            batch_report.record_start_up_time()
+            for job_idx, batch_job in enumerate(scheduled_jobs):
+                print(f"Job {job_idx + 1} of {len(scheduled_jobs)}: {batch_job.describe()}")
+                start_time = time.perf_counter()
+                try:
+                    if job_idx != 0:
+                        downloader.switch_publication(batch_job.url)
+                    num_articles = batch_job.run(downloader)
+                except Exception as exc:
+                    print(str(exc) or type(exc).__name__)
+                    batch_report.record_failure(batch_job, time.perf_counter() - start_time, exc)
+                    continue
+                batch_report.record_success(batch_job, time.perf_counter() - start_time, num_articles)
+        finally:
+            downloader.shut_down()
+            batch_report.stop()
+        return batch_report
+
+    def check_jobs_are_pdf_only(self, job_file_path: str):
+        # worker processes (see Coordinator) only render PDFs
+        for batch_job in self._batch_jobs:
+            if batch_job.output_format != 'pdf':
+                raise exceptions.InvalidJobFile(job_file_path, f"{batch_job.describe()} is not a PDF job")
+
+    def get_is_headless(self) -> bool:
+        return self._is_headless
+
+    def get_scheduled_jobs(self) -> list[BatchJob]:
+        # sorted() is stable, so jobs of the same priority keep their job file order
+        return sorted(self._batch_jobs, key=lambda batch_job: -batch_job.priority)
+
+
+class BatchReport:
+    def __init__(self):
+        self._start_time = 0.0
+        self._end_time = 0.0
+        self.start_up_time = 0.0  # starting the browser and signing in, paid once for every job
+        self.job_results: list[tuple[BatchJob, float, int, Optional[str]]] = []  # (job, time, articles, error)
+
+    def start(self):
+        self._start_time = time.perf_counter()
+
+    def record_start_up_time(self):
+        self.start_up_time = time.perf_counter() - self._start_time
+
+    def stop(self):
+        self._end_time = time.perf_counter()
+
+    def record_success(self, batch_job: BatchJob, elapsed_time: float, num_articles: int):
+        self.job_results.append((batch_job, elapsed_time, num_articles, None))
+
+    def record_failure(self, batch_job: BatchJob, elapsed_time: float, exc: Exception):
+        self.job_results.append((batch_job, elapsed_time, 0, str(exc) or type(exc).__name__))
+
+    def get_num_articles(self) -> int:
+        return sum(num_articles for _, _, num_articles, _ in self.job_results)
+
+    def get_num_failed_jobs(self) -> int:
+        return sum(1 for _, _, _, error in self.job_results if error is not None)
+
+    def get_elapsed_time(self) -> float:
+        return self._end_time - self._start_time
+
+    @staticmethod
+    def get_articles_per_minute(num_articles: int, elapsed_time: float) -> float:
+        return num_articles / elapsed_time * 60 if elapsed_time > 0 else 0.0
+
+    def __str__(self):
+        lines = [f"Ran {len(self.job_results)} job(s) in {self.get_elapsed_time():.1f}s "
+                 f"(of which {self.start_up_time:.1f}s starting up and signing in): {self.get_num_articles()} "
+                 f"article(s), {self.get_articles_per_minute(self.get_num_articles(), self.get_elapsed_time()):.1f} "
+                 f"per minute, with {self.get_num_failed_jobs()} failed job(s)."]
+        for batch_job, elapsed_time, num_articles, error in self.job_results:
+            if error is None:
+                lines.append(f"  {batch_job.describe()}: {num_articles} article(s) in {elapsed_time:.1f}s "
+                             f"({self.get_articles_per_minute(num_articles, elapsed_time):.1f} per minute)")
+            else:
+                lines.append(f"  {batch_job.describe()}: failed after {elapsed_time:.1f}s ({error})")
+        return '\n'.join(lines)
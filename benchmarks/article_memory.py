@@ -0,0 +1,106 @@
+"""
+Measures how much memory Cache takes per 100k posts, and how long projecting the archive API's JSON onto article
+rows takes per post, without any network access:
+    python -m benchmarks.article_memory --posts 300000
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import time
+import tracemalloc
+from typing import Iterator
+
+from downloaders.substack_archives_downloader import Cache, SubstackArchivesDownloader
+
+# a handful of tag combinations, as most publications have
+TAG_COMBINATIONS = ([], [{'slug': 'essays'}], [{'slug': 'podcast'}], [{'slug': 'essays'}, {'slug': 'culture'}])
+
+
+def generate_archive_pages(num_posts: int, page_size: int) -> Iterator[list[dict]]:
+    """
+    Pages of archive API JSON, with the fields that are not projected (description, cover image, ...)
+    so that the pages are as big as real ones. Generated one page at a time, so they are not measured by Cache.
+    """
+    latest_post_date = datetime(2024, 12, 31, 12, 0, 0)
+    for offset in range(0, num_posts, page_size):
+        archive_page = []
+        for idx in range(offset, min(offset + page_size, num_posts)):
+            article_id = num_posts - idx
+            slug = f'title-of-post-number-{article_id}'
+            archive_page.append({
+                'id': article_id,
+                'title': f'Title of post number {article_id}',
+                'slug': slug,
+                'type': 'podcast' if idx % 10 == 0 else 'newsletter',
+                # several posts a day, like a multi-publication cache
+                'post_date': (latest_post_date - timedelta(hours=idx)).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z',
+                'canonical_url': f'https://publication-{idx % 7}.substack.com/p/{slug}',
+                'postTags': TAG_COMBINATIONS[idx % len(TAG_COMBINATIONS)],
+                'description': f'Description of post number {article_id}, a sentence or two long. ' * 2,
+                'cover_image': f'https://substackcdn.com/image/fetch/{article_id}.jpeg',
+                'reactions': {'❤': idx % 100},
+                'audience': 'everyone',
+                'wordcount': 1000 + idx % 5000,
+            })
+        yield archive_page
+
+
+def fill_cache(num_posts: int, page_size: int) -> tuple[Cache, float]:
+    """
+    :return: the cache, and the seconds spent projecting JSON and caching it (not generating it)
+    """
+    cache = Cache('https://benchmark.substack.com')
+    projecting_time = 0.0
+    for archive_page in generate_archive_pages(num_posts, page_size):
+        start_time = time.perf_counter()
+        for json_dict in archive_page:
+            article_row = SubstackArchivesDownloader.convert_json_dict_to_article_row(json_dict)
+            cache.append_article_tuple(*SubstackArchivesDownloader.convert_article_row_to_article_tuple(article_row))
+        projecting_time += time.perf_counter() - start_time
+    return cache, projecting_time
+
+
+def measure(num_posts: int, page_size: int) -> tuple[float, float, float, float]:
+    """
+    :return: bytes per post held by Cache, seconds per post to project and cache JSON, and seconds per post to
+    convert a post date with convert_json_date_to_yyyymmdd and with strptime
+    """
+    # pages are generated and dropped one at a time, so what is left allocated is what Cache holds
+    tracemalloc.start()
+    cache, _ = fill_cache(num_posts, page_size)
+    cache_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert cache.get_cache_size() == num_posts
+    del cache
+    # timed again without tracemalloc, which slows down every allocation
+    _, projecting_time = fill_cache(num_posts, page_size)
+
+    post_dates = [json_dict['post_date'] for archive_page in generate_archive_pages(min(num_posts, 10_000), page_size)
+                  for json_dict in archive_page]
+    start_time = time.perf_counter()
+    for post_date in post_dates:
+        SubstackArchivesDownloader.convert_json_date_to_yyyymmdd(post_date)
+    fast_date_time = (time.perf_counter() - start_time) / len(post_dates)
+    start_time = time.perf_counter()
+    for post_date in post_dates:
+        int(datetime.strptime(post_date, '%Y-%m-%dT%H:%M:%S.%fZ').strftime('%Y%m%d'))
+    strptime_date_time = (time.perf_counter() - start_time) / len(post_dates)
+    return cache_size / num_posts, projecting_time / num_posts, fast_date_time, strptime_date_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the memory Cache takes per 100k posts")
+    parser.add_argument('--posts', type=int, default=100_000, help="number of posts cached")
+    parser.add_argument('--page-size', type=int, default=50, help="posts per archive API page")
+    args = parser.parse_args()
+
+    bytes_per_post, projecting_time, fast_date_time, strptime_date_time = measure(args.posts, args.page_size)
+    print(f"Cache of {args.posts} posts: {bytes_per_post * 100_000 / (1024 * 1024):.1f} MiB per 100k posts "
+          f"({bytes_per_post:.0f} bytes per post)")
+    print(f"Projecting JSON onto cached articles: {projecting_time * 1e6:.2f} µs per post")
+    print(f"Converting post dates: {fast_date_time * 1e6:.2f} µs per post "
+          f"(strptime: {strptime_date_time * 1e6:.2f} µs per post)")
+
+
+if __name__ == '__main__':
+    main()
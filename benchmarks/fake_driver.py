@@ -0,0 +1,94 @@
+import base64
+import itertools
+import threading
+import time
+
+import requests
+
+from downloaders.pdf_downloader import PDFDownloader
+
+
+class FakeDriver:
+    """
+    Stands in for Chrome behind PDFDownloader (see install_fake_driver), so that the downloader's own overhead can
+    be benchmarked: navigating fetches the page over HTTP (from FakeSubstackServer), and printing returns a PDF of
+    pdf_size bytes made up of the page, streamed in chunks like Chrome does.
+
+    The first page of each driver waits for PageReadiness's quiet time, as no network events are ever logged.
+    """
+    pdf_size = 200_000  # in bytes
+    user_agent = 'Mozilla/5.0 (benchmark)'
+    _pdf_times: list[float] = []  # perf_counter when each PDF was printed, by every driver
+    _pdf_times_lock = threading.Lock()
+    _stream_handles = itertools.count()
+
+    def __init__(self):
+        self._session = requests.Session()
+        self.current_url = 'about:blank'
+        self._page = b''
+        self._cookies: list[dict] = []
+        self._streams: dict[str, list] = {}  # handle -> [data, position]
+
+    def get(self, url: str):
+        self._page = self._session.get(url).content if url != 'about:blank' else b''
+        self.current_url = url
+
+    def execute_script(self, script: str, *args):
+        if 'navigator.userAgent' in script:
+            return FakeDriver.user_agent
+        return True  # e.g. PageReadiness checking that the page's content is ready
+
+    def execute_cdp_cmd(self, cmd: str, cmd_args: dict):
+        if cmd == 'Network.getAllCookies':
+            return {'cookies': self._cookies}
+        if cmd == 'Network.setCookies':
+            self._cookies = cmd_args['cookies']
+        elif cmd == 'Network.clearBrowserCookies':
+            self._cookies = []
+        elif cmd == 'Page.printToPDF':
+            return self._print_to_pdf(cmd_args)
+        elif cmd == 'IO.read':
+            return self._read_stream(cmd_args['handle'], cmd_args.get('size', 65536))
+        elif cmd == 'IO.close':
+            self._streams.pop(cmd_args['handle'], None)
+        return {}
+
+    def get_log(self, log_type: str) -> list:
+        return []
+
+    def quit(self):
+        self._session.close()
+
+    def _print_to_pdf(self, cmd_args: dict) -> dict:
+        data = b'%PDF-1.4\n' + self._page
+        data = data[:self.pdf_size].ljust(self.pdf_size, b' ')
+        with FakeDriver._pdf_times_lock:
+            FakeDriver._pdf_times.append(time.perf_counter())
+        if cmd_args.get('transferMode') != 'ReturnAsStream':
+            return {'data': base64.b64encode(data).decode()}
+        handle = str(next(FakeDriver._stream_handles))
+        self._streams[handle] = [data, 0]
+        return {'stream': handle}
+
+    def _read_stream(self, handle: str, size: int) -> dict:
+        stream = self._streams[handle]
+        data, position = stream
+        chunk = data[position:position + size]
+        stream[1] = position + len(chunk)
+        return {'data': base64.b64encode(chunk).decode(), 'base64Encoded': True, 'eof': stream[1] >= len(data)}
+
+    @staticmethod
+    def get_first_pdf_time() -> float:
+        # perf_counter when the first PDF was printed, or 0.0 if none has been
+        with FakeDriver._pdf_times_lock:
+            return FakeDriver._pdf_times[0] if FakeDriver._pdf_times else 0.0
+
+    @staticmethod
+    def reset_pdf_times():
+        with FakeDriver._pdf_times_lock:
+            FakeDriver._pdf_times.clear()
+
+
+def install_fake_driver():
+    # every PDFDownloader (including render workers) created from now on drives a FakeDriver instead of Chrome
+    PDFDownloader._initialize_driver = lambda self: FakeDriver()
@@ -0,0 +1,165 @@
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import json
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+
+class FakeSubstackServer:
+    """
+    Local stand-in for a Substack publication, so that the downloader can be benchmarked without sending a single
+    request to Substack. Serves:
+        /archive                    the archive page
+        /api/v1/archive?offset=     pages of page_size articles, from most to least recent (one a day)
+        /api/v1/posts/<slug>        a post, as loaded by the export mode
+        /p/<slug>                   a post page, as navigated to by the (fake) driver
+
+    Every response is delayed by latency, and API responses fail with 429 Too Many Requests (Retry-After: 0,
+    so that the downloader retries straight away) with probability error_rate. Archive API pages come with an ETag,
+    and are answered with 304 Not Modified when requested with If-None-Match set to it.
+    """
+    latest_post_date = datetime(2024, 12, 31, 12, 0, 0)
+
+    def __init__(self, num_articles: int = 500, page_size: int = 12, latency: float = 0.0, error_rate: float = 0.0,
+                 post_size: int = 20_000, seed: int = 0):
+        """
+        :param latency: in seconds, per response
+        :param post_size: in bytes, of each post's body
+        """
+        assert 0 <= error_rate < 1
+        self.num_articles = num_articles
+        self.page_size = page_size
+        self.latency = latency
+        self.error_rate = error_rate
+        self._post_size = post_size
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._num_requests_by_route: dict[str, int] = {}
+        self.num_errors = 0
+        self._http_server = ThreadingHTTPServer(('127.0.0.1', 0), _make_request_handler(self))
+        self._http_server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._http_server.server_port}'
+        self._thread = threading.Thread(target=self._http_server.serve_forever, daemon=True)
+
+    def __enter__(self) -> 'FakeSubstackServer':
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._http_server.shutdown()
+        self._http_server.server_close()
+
+    # Methods for counting requests
+    def reset_counts(self):
+        with self._lock:
+            self._num_requests_by_route.clear()
+            self.num_errors = 0
+
+    def get_num_requests(self, route: Optional[str] = None) -> int:
+        with self._lock:
+            if route:
+                return self._num_requests_by_route.get(route, 0)
+            return sum(self._num_requests_by_route.values())
+
+    def count_request(self, route: str) -> bool:
+        """
+        :return: whether to fail the request
+        """
+        with self._lock:
+            self._num_requests_by_route[route] = self._num_requests_by_route.get(route, 0) + 1
+            is_error = route.startswith('api') and self._random.random() < self.error_rate
+            if is_error:
+                self.num_errors += 1
+            return is_error
+
+    # Methods for generating content
+    def get_article(self, idx: int) -> dict:
+        # idx 0 is the most recent article; ids decrease with idx, as they do on Substack
+        article_id = self.num_articles - idx
+        post_date = FakeSubstackServer.latest_post_date - timedelta(days=idx)
+        slug = f'post-{article_id}'
+        return {
+            'id': article_id,
+            'title': f'Post number {article_id}',
+            'slug': slug,
+            'type': 'newsletter',
+            'post_date': post_date.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'canonical_url': f'{self.url}/p/{slug}',
+            'postTags': [{'slug': 'benchmark'}] if article_id % 3 == 0 else [],
+        }
+
+    def get_archive_page(self, offset: int) -> list[dict]:
+        return [self.get_article(idx) for idx in range(offset, min(offset + self.page_size, self.num_articles))]
+
+    def get_post(self, slug: str) -> dict:
+        article_id = int(slug.rsplit('-', 1)[-1])
+        post = self.get_article(self.num_articles - article_id)
+        post['body_html'] = self.get_post_body_html(article_id)
+        return post
+
+    def get_post_body_html(self, article_id: int) -> str:
+        paragraph = f'<p>Paragraph of post number {article_id}, repeated to make up the size of a post.</p>'
+        return paragraph * max(1, self._post_size // len(paragraph))
+
+
+def _make_request_handler(server: FakeSubstackServer):
+    class RequestHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like Substack
+
+        def do_GET(self):
+            parsed_url = urlparse(self.path)
+            path = parsed_url.path.rstrip('/')
+            if path == '/archive':
+                route = 'archive'
+            elif path == '/api/v1/archive':
+                route = 'api_archive'
+            elif path.startswith('/api/v1/posts/'):
+                route = 'api_post'
+            elif path.startswith('/p/'):
+                route = 'post'
+            else:
+                self._send(404, 'text/plain', b'Not Found')
+                return
+            if server.latency:
+                time.sleep(server.latency)
+            if server.count_request(route):
+                self._send(429, 'text/plain', b'Too Many Requests', {'Retry-After': '0'})
+                return
+            slug = path.rsplit('/', 1)[-1]
+            if route == 'archive':
+                self._send(200, 'text/html', b'<html><head><title>Archive</title></head><body></body></html>')
+            elif route == 'api_archive':
+                offset = int(parse_qs(parsed_url.query).get('offset', ['0'])[0])
+                body = json.dumps(server.get_archive_page(offset)).encode()
+                etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+                if self.headers.get('If-None-Match') == etag:
+                    self._send(304, 'application/json', b'', {'ETag': etag})
+                else:
+                    self._send(200, 'application/json', body, {'ETag': etag})
+            elif route == 'api_post':
+                self._send_json(server.get_post(slug))
+            else:
+                post = server.get_post(slug)
+                self._send(200, 'text/html', f"<html><head><title>{post['title']}</title></head>"
+                                             f"<body>{post['body_html']}</body></html>".encode())
+
+        def _send_json(self, body):
+            self._send(200, 'application/json', json.dumps(body).encode())
+
+        def _send(self, status_code: int, content_type: str, body: bytes, headers: Optional[dict] = None):
+            self.send_response(status_code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # a line per request would drown out the results
+
+    return RequestHandler
@@ -0,0 +1,246 @@
+"""
+Runs the downloader against a FakeSubstackServer with FakeDrivers, without any network access beyond localhost:
+    python -m benchmarks.run_benchmarks --articles 1000 --latency 0.05 --save baseline.json
+    python -m benchmarks.run_benchmarks --articles 1000 --latency 0.05 --compare baseline.json
+
+Benchmarks:
+    pagination      loading every article of the archive API, page by page
+    pagination-warm the same, with the response cache of pagination (every page is revalidated with a 304)
+    date-range      loading a month of articles from the middle of the archive (galloping search)
+    index-cold      loading every article into an empty archive index
+    index-warm      the same, with the archive index of index-cold (only the newest page is requested)
+    rendering       rendering render_articles PDFs with the driver of the downloader
+    rendering-pool  the same, with a RenderPool of render_workers workers
+
+Each benchmark runs in a process of its own, so that its peak RSS is its own.
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from typing import Optional
+
+try:
+    import resource  # not available on Windows, where peak RSS is not reported
+except ImportError:
+    resource = None
+
+from benchmarks.fake_substack import FakeSubstackServer
+
+BENCHMARK_NAMES = ('pagination', 'pagination-warm', 'date-range', 'index-cold', 'index-warm', 'rendering',
+                   'rendering-pool')
+# benchmarks run in the output folder left by another one, by the name of that other one
+COLD_BENCHMARK_NAMES = {'pagination-warm': 'pagination', 'index-warm': 'index-cold'}
+
+
+class BenchmarkResult:
+    def __init__(self, name: str, elapsed_time: float, num_items: int, num_requests: int, num_pages: int,
+                 num_errors: int, time_to_first_pdf: Optional[float], peak_rss: Optional[float]):
+        """
+        :param num_items: articles loaded, or PDFs rendered
+        :param num_pages: archive API pages requested, including failed requests
+        :param num_errors: failures injected by the server
+        :param time_to_first_pdf: in seconds, for rendering benchmarks
+        :param peak_rss: in MiB
+        """
+        self.name = name
+        self.elapsed_time = elapsed_time
+        self.num_items = num_items
+        self.num_requests = num_requests
+        self.num_pages = num_pages
+        self.num_errors = num_errors
+        self.time_to_first_pdf = time_to_first_pdf
+        self.peak_rss = peak_rss
+
+    def get_items_per_second(self) -> float:
+        return self.num_items / self.elapsed_time if self.elapsed_time > 0 else 0.0
+
+    def get_requests_per_second(self) -> float:
+        return self.num_requests / self.elapsed_time if self.elapsed_time > 0 else 0.0
+
+    def get_pages_per_second(self) -> float:
+        return self.num_pages / self.elapsed_time if self.elapsed_time > 0 else 0.0
+
+    def get_regressions(self, baseline: 'BenchmarkResult', tolerance: float) -> list[str]:
+        """
+        :param tolerance: e.g. 0.2 for 20% slower (or bigger) than baseline
+        """
+        regressions = []
+        if self.get_items_per_second() < baseline.get_items_per_second() * (1 - tolerance):
+            regressions.append(f"{self.name}: {self.get_items_per_second():.1f} items/s, "
+                               f"down from {baseline.get_items_per_second():.1f}")
+        if self.time_to_first_pdf and baseline.time_to_first_pdf \
+                and self.time_to_first_pdf > baseline.time_to_first_pdf * (1 + tolerance):
+            regressions.append(f"{self.name}: {self.time_to_first_pdf:.3f}s to first PDF, "
+                               f"up from {baseline.time_to_first_pdf:.3f}s")
+        if self.peak_rss and baseline.peak_rss and self.peak_rss > baseline.peak_rss * (1 + tolerance):
+            regressions.append(f"{self.name}: {self.peak_rss:.1f} MiB peak RSS, up from {baseline.peak_rss:.1f} MiB")
+        return regressions
+
+    def convert_to_dict(self) -> dict:
+        return dict(vars(self))
+
+    @staticmethod
+    def convert_dict_to_benchmark_result(result_dict: dict) -> 'BenchmarkResult':
+        return BenchmarkResult(**result_dict)
+
+    def __str__(self):
+        time_to_first_pdf = f"{self.time_to_first_pdf:.3f}s" if self.time_to_first_pdf is not None else '-'
+        peak_rss = f"{self.peak_rss:.1f}" if self.peak_rss is not None else '-'
+        return (f"{self.name:<15} {self.elapsed_time:>8.2f}s {self.num_items:>7} {self.get_items_per_second():>9.1f} "
+                f"{self.get_requests_per_second():>9.1f} {self.get_pages_per_second():>9.1f} {self.num_errors:>6} "
+                f"{time_to_first_pdf:>9} {peak_rss:>9}")
+
+    @staticmethod
+    def get_header() -> str:
+        return (f"{'benchmark':<15} {'time':>9} {'items':>7} {'items/s':>9} {'req/s':>9} {'pages/s':>9} "
+                f"{'errors':>6} {'1st PDF':>9} {'RSS MiB':>9}")
+
+
+# Methods run in each benchmark's own process
+def run_benchmark(name: str, server_url: str, output_path: str, num_articles: int, date_range: tuple[int, int],
+                  num_render_articles: int, num_render_workers: int,
+                  pdf_size: int) -> tuple[float, int, Optional[float], Optional[float]]:
+    """
+    :return: elapsed time, number of items, time to first PDF and peak RSS
+    """
+    # before anything creates a Directory, so that the real output folder is not touched
+    from downloaders.pdf_downloader import Directory
+    os.environ[Directory.output_path_environment_variable] = output_path
+    from benchmarks.fake_driver import FakeDriver, install_fake_driver
+    install_fake_driver()
+    FakeDriver.pdf_size = pdf_size
+    FakeDriver.reset_pdf_times()
+    downloader = create_downloader(server_url, num_render_workers if name == 'rendering-pool' else 1,
+                                   use_archive_index=name.startswith('index'))
+    try:
+        start_time = time.perf_counter()
+        if name in ('pagination', 'pagination-warm', 'index-cold', 'index-warm'):
+            num_items = sum(1 for _ in downloader.get_download_tasks_k_most_recent(num_articles))
+        elif name == 'date-range':
+            num_items = sum(1 for _ in downloader.get_download_tasks_date_range(*date_range))
+        else:
+            num_items = downloader.download_k_most_recent(num_render_articles)
+        elapsed_time = time.perf_counter() - start_time
+    finally:
+        downloader.shut_down()
+    first_pdf_time = FakeDriver.get_first_pdf_time()
+    time_to_first_pdf = first_pdf_time - start_time if first_pdf_time else None
+    return elapsed_time, num_items, time_to_first_pdf, get_peak_rss()
+
+
+def create_downloader(server_url: str, num_render_workers: int, use_archive_index: bool):
+    from downloaders.substack_archives_downloader import SubstackArchivesDownloader
+    from utilities.rate_limiter import RateLimiter
+    # unthrottled, so that the downloader rather than the rate limiter is benchmarked
+    unthrottled = 1_000_000
+    rate_limiter = RateLimiter(requests_per_second=unthrottled, max_requests_per_second=unthrottled,
+                               min_requests_per_second=unthrottled, burst=1000)
+    downloader = SubstackArchivesDownloader('https://benchmark.substack.com', is_headless=True,
+                                            num_render_workers=num_render_workers,
+                                            use_archive_index=use_archive_index, rate_limiter=rate_limiter,
+                                            use_session_store=False)
+    # signing in is not benchmarked, as the fake server needs no session; its url is not a public one either
+    downloader._user_credential.set_credential('reader@example.com', 'password')
+    downloader._url_cache.set_substack_url_from_full_url(server_url)
+    return downloader
+
+
+def get_peak_rss() -> Optional[float]:
+    # in MiB; ru_maxrss is in KiB on Linux but in bytes on macOS
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return max_rss / (1024 * 1024) if sys.platform == 'darwin' else max_rss / 1024
+
+
+# Methods run in the main process
+def run_benchmarks(args: argparse.Namespace) -> list[BenchmarkResult]:
+    benchmark_names = args.only or BENCHMARK_NAMES
+    context = multiprocessing.get_context('spawn')
+    results = []
+    with FakeSubstackServer(args.articles, args.page_size, args.latency, args.error_rate) as server, \
+            tempfile.TemporaryDirectory(prefix='substack-archives-downloader-benchmark-') as temp_path:
+        date_range = get_middle_month(args.articles)
+        for name in benchmark_names:
+            # index-warm uses the archive index left by index-cold, and pagination-warm the response cache left by
+            # pagination; every other benchmark starts from scratch
+            cold_name = COLD_BENCHMARK_NAMES.get(name)
+            output_path = os.path.join(temp_path, cold_name or name)
+            os.makedirs(output_path, exist_ok=True)
+            if cold_name and cold_name not in benchmark_names:
+                run_in_own_process(context, cold_name, server, output_path, args, date_range)
+            server.reset_counts()
+            elapsed_time, num_items, time_to_first_pdf, peak_rss = run_in_own_process(
+                context, name, server, output_path, args, date_range)
+            result = BenchmarkResult(name, elapsed_time, num_items, server.get_num_requests(),
+                                     server.get_num_requests('api_archive'), server.num_errors, time_to_first_pdf,
+                                     peak_rss)
+            print(result)
+            results.append(result)
+    return results
+
+
+def run_in_own_process(context, name: str, server: FakeSubstackServer, output_path: str,
+                       args: argparse.Namespace, date_range: tuple[int, int]):
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(run_benchmark, name, server.url, output_path, args.articles, date_range,
+                               args.render_articles, args.render_workers, args.pdf_size).result()
+
+
+def get_middle_month(num_articles: int) -> tuple[int, int]:
+    # FakeSubstackServer posts one article a day
+    start_date = FakeSubstackServer.latest_post_date - timedelta(days=num_articles // 2 + 15)
+    end_date = FakeSubstackServer.latest_post_date - timedelta(days=num_articles // 2 - 15)
+    return int(start_date.strftime('%Y%m%d')), int(end_date.strftime('%Y%m%d'))
+
+
+def compare_with_baseline(results: list[BenchmarkResult], baseline_path: str, tolerance: float) -> list[str]:
+    with open(baseline_path) as f:
+        baseline_results = {result_dict['name']: BenchmarkResult.convert_dict_to_benchmark_result(result_dict)
+                            for result_dict in json.load(f)}
+    regressions = []
+    for result in results:
+        if result.name in baseline_results:
+            regressions.extend(result.get_regressions(baseline_results[result.name], tolerance))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the downloader against a local fake Substack")
+    parser.add_argument('--articles', type=int, default=500, help="number of articles in the fake archive")
+    parser.add_argument('--page-size', type=int, default=12, help="articles per archive API page")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="fraction of API requests failing with 429 Too Many Requests")
+    parser.add_argument('--render-articles', type=int, default=50, help="number of PDFs rendered")
+    parser.add_argument('--render-workers', type=int, default=4, help="workers of rendering-pool")
+    parser.add_argument('--pdf-size', type=int, default=200_000, help="bytes per PDF")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARK_NAMES, help="benchmarks to run, all by default")
+    parser.add_argument('--save', help="save the results as JSON, e.g. as a baseline")
+    parser.add_argument('--compare', help="compare the results with a baseline saved by --save")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="how much worse than the baseline a result may be before it is a regression")
+    args = parser.parse_args()
+
+    print(BenchmarkResult.get_header())
+    results = run_benchmarks(args)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump([result.convert_to_dict() for result in results], f, indent=4)
+    if args.compare:
+        regressions = compare_with_baseline(results, args.compare, args.tolerance)
+        for regression in regressions:
+            print(f"Regression in {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,185 @@
+import multiprocessing
+import os
+import socket
+import time
+from typing import Optional
+
+from batch_runner import BatchJob
+from downloaders.download_ledger import DownloadLedger
+from downloaders.pdf_downloader import Directory
+from downloaders.render_pool import RenderPool, RenderWorker
+from downloaders.substack_archives_downloader import SubstackArchivesDownloader
+from downloaders.work_queue import DONE, FAILED, WorkQueue
+from utilities.rate_limiter import RateLimiter
+from utilities.timing import stage_timings
+
+
+class Coordinator:
+    """
+    Renders the PDFs of many publications with num_workers worker processes, each with its own browser.
+
+    Articles are first enqueued into a WorkQueue in the output folder by one signed-in downloader, then workers
+    lease them one at a time. As the queue is durable and leases expire, a crashed worker's article is retried by
+    another worker, a worker that crashes is replaced, and a run that is interrupted (even by a reboot) can be
+    resumed without rendering completed articles again.
+    """
+    max_worker_restarts = 3  # per worker, so that a worker that can never start does not restart forever
+    poll_interval = 2  # in seconds
+
+    def __init__(self, num_workers: int, visibility_timeout: float = 600, max_attempts: int = 3):
+        """
+        :param visibility_timeout: in seconds; an article leased for longer than this is leased again
+        :param max_attempts: after which an article is marked as failed
+        """
+        assert num_workers >= 1
+        self._num_workers = num_workers
+        self._visibility_timeout = visibility_timeout
+        self._max_attempts = max_attempts
+        self._output_path = Directory(is_headless=True).output_path
+        self._work_queue = WorkQueue(self._output_path, max_attempts)
+
+    def enqueue(self, downloader: SubstackArchivesDownloader, batch_jobs: list[BatchJob]) -> int:
+        """
+        :param downloader: signed in, and pointed at the publication of batch_jobs[0]
+        :param batch_jobs: PDF jobs only
+        :return: the number of articles enqueued (not counting articles enqueued by a previous run)
+        """
+        num_enqueued = 0
+        for job_idx, batch_job in enumerate(batch_jobs):
+            if job_idx != 0:
+                downloader.switch_publication(batch_job.url)
+            num_enqueued += self._work_queue.enqueue(downloader.get_substack_url(),
+                                                     list(batch_job.get_download_tasks(downloader)))
+            print(f"Enqueued {batch_job.describe()}")
+        return num_enqueued
+
+    def run(self, cookies: list[dict]) -> 'CoordinatorReport':
+        """
+        :param cookies: of a signed-in driver, copied to every worker's driver
+        """
+        coordinator_report = CoordinatorReport(self._work_queue.get_num_items_by_status())
+        # spawned rather than forked, as a forked process would share the parent's sockets and threads
+        context = multiprocessing.get_context('spawn')
+        processes: dict[int, multiprocessing.Process] = {}
+        num_restarts = {worker_id: 0 for worker_id in range(self._num_workers)}
+        for worker_id in range(self._num_workers):
+            processes[worker_id] = self._start_worker(context, worker_id, cookies)
+        try:
+            while processes:
+                time.sleep(self.poll_interval)
+                for worker_id, process in list(processes.items()):
+                    if process.is_alive():
+                        continue
+                    del processes[worker_id]
+                    # a worker exits cleanly once there is nothing left to lease
+                    if process.exitcode == 0 or not self._work_queue.has_unfinished_items():
+                        continue
+                    if num_restarts[worker_id] >= self.max_worker_restarts:
+                        coordinator_report.record_retired_worker(worker_id, process.exitcode)
+                        continue
+                    num_restarts[worker_id] += 1
+                    coordinator_report.record_restarted_worker()
+                    processes[worker_id] = self._start_worker(context, worker_id, cookies)
+        finally:
+            for process in processes.values():
+                process.terminate()  # their leases expire, so their articles are retried by the next run
+                process.join()
+            coordinator_report.stop(self._work_queue.get_num_items_by_status(), self._work_queue.get_failed_items())
+            self._work_queue.close()
+        return coordinator_report
+
+    def retry_failed_items(self) -> int:
+        return self._work_queue.retry_failed_items()
+
+    def _start_worker(self, context, worker_id: int, cookies: list[dict]) -> multiprocessing.Process:
+        process = context.Process(target=run_worker_process, daemon=True, args=(
+            worker_id, self._output_path, cookies, self._num_workers, self._visibility_timeout, self._max_attempts))
+        process.start()
+        return process
+
+
+def run_worker_process(worker_id: int, output_path: str, cookies: list[dict], num_workers: int,
+                       visibility_timeout: float, max_attempts: int):
+    """
+    Leases and renders articles until the queue has none left, in a process of its own.
+    Exits with a non-zero code after too many failures in a row (e.g. its browser crashed), to be restarted.
+    """
+    stage_timings.enable_in_worker_process(worker_id)
+    # worker processes cannot share a RateLimiter, so each is allowed its share of the rates, without bursts, as
+    # num_workers bursts at once would be num_workers times the burst of a single RateLimiter
+    share = 1 / num_workers
+    rate_limiter = RateLimiter(requests_per_second=share, max_requests_per_second=4 * share,
+                               min_requests_per_second=0.2 * share, burst=1)
+    lease_owner = f'{socket.gethostname()}:{os.getpid()}:{worker_id}'
+    work_queue = WorkQueue(output_path, max_attempts)
+    download_ledger = DownloadLedger(output_path)
+    render_worker: Optional[RenderWorker] = None
+    consecutive_failures = 0
+    try:
+        render_worker = RenderWorker(worker_id, cookies, rate_limiter)
+        while True:
+            work_item = work_queue.lease(lease_owner, visibility_timeout)
+            if work_item is None:
+                if not work_queue.has_unfinished_items():
+                    return
+                time.sleep(Coordinator.poll_interval)  # others' leases may yet expire
+                continue
+            work_item_id, article_id, _, url, output_path_with_filename, attempts = work_item
+            try:
+                render_time = render_worker.render(url, output_path_with_filename)
+            except Exception as exc:
+                print(f"Worker {worker_id} failed to render {url} (attempt {attempts}): {exc}")
+                work_queue.fail(work_item_id, lease_owner, str(exc) or type(exc).__name__)
+                consecutive_failures += 1
+                if consecutive_failures >= RenderPool.max_consecutive_failures:
+                    raise SystemExit(1)
+                continue
+            consecutive_failures = 0
+            download_ledger.record(article_id, url, output_path_with_filename, render_time)
+            work_queue.complete(work_item_id, lease_owner)
+    finally:
+        if render_worker:
+            render_worker.shut_down()
+        download_ledger.close()
+        work_queue.close()
+        stage_timings.close()
+
+
+class CoordinatorReport:
+    def __init__(self, num_items_by_status_at_start: dict[str, int]):
+        self._start_time = time.perf_counter()
+        self._end_time = 0.0
+        self._num_items_by_status_at_start = num_items_by_status_at_start
+        self.num_items_by_status: dict[str, int] = {}
+        self.failed_items: list[tuple[str, Optional[str]]] = []
+        self.num_restarted_workers = 0
+        self.retired_workers: dict[int, int] = {}  # worker id -> exit code
+
+    def stop(self, num_items_by_status: dict[str, int], failed_items: list[tuple[str, Optional[str]]]):
+        self._end_time = time.perf_counter()
+        self.num_items_by_status = num_items_by_status
+        self.failed_items = failed_items
+
+    def record_restarted_worker(self):
+        self.num_restarted_workers += 1
+
+    def record_retired_worker(self, worker_id: int, exit_code: int):
+        self.retired_workers[worker_id] = exit_code
+
+    def get_num_rendered(self) -> int:
+        return self.num_items_by_status[DONE] - self._num_items_by_status_at_start[DONE]
+
+    def get_elapsed_time(self) -> float:
+        return self._end_time - self._start_time
+
+    def __str__(self):
+        elapsed_time = self.get_elapsed_time()
+        articles_per_minute = self.get_num_rendered() / elapsed_time * 60 if elapsed_time > 0 else 0.0
+        lines = [f"Rendered {self.get_num_rendered()} PDF(s) in {elapsed_time:.1f}s ({articles_per_minute:.1f} per "
+                 f"minute), {self.num_restarted_workers} worker restart(s). Queue: "
+                 + ', '.join(f"{num_items} {status}" for status, num_items in self.num_items_by_status.items())]
+        for worker_id, exit_code in sorted(self.retired_workers.items()):
+            lines.append(f"  worker {worker_id} retired after exiting with {exit_code}")
+        for url, error in self.failed_items:
+            lines.append(f"  {FAILED} {url} ({error})")
+        return '\n'.join(lines)
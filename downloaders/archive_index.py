@@ -0,0 +1,127 @@
+import os
+import sqlite3
+import threading
+from typing import NamedTuple, Optional
+
+ArticleId = int
+
+
+class ArticleRow(NamedTuple):
+    # the fields of an article that are indexed, as projected from the archive API's JSON
+    id: ArticleId
+    post_timestamp: str  # e.g. '2021-10-12T14:52:58.738Z'
+    post_date: int  # e.g. 20211012
+    title: str
+    tags: str
+    type: str
+    canonical_url: str
+
+
+class ArchiveIndex:
+    """
+    Persistent index of the articles of a publication, stored as SQLite in the output folder so that
+    repeat runs only need to fetch the archive pages that are newer than the most recent indexed article.
+
+    Articles are always indexed from the most recent one onwards, without gaps, so the indexed articles are
+    the num_articles most recent articles of the publication. This is what allows syncing to stop at the
+    first known id and backfilling to resume at offset num_articles.
+    """
+    filename = '.archive_index.sqlite3'
+
+    def __init__(self, output_path: str, publication: str):
+        self._publication = publication
+        self._lock = threading.Lock()  # archive pages are indexed while articles are prefetched in the background
+        # as for DownloadLedger, several processes may use the same output folder at the same time
+        self._connection = sqlite3.connect(os.path.join(output_path, ArchiveIndex.filename),
+                                           check_same_thread=False, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS articles (
+                    id INTEGER PRIMARY KEY,
+                    publication TEXT NOT NULL,
+                    post_timestamp TEXT NOT NULL,
+                    post_date INTEGER NOT NULL,
+                    title TEXT NOT NULL,
+                    tags TEXT NOT NULL,
+                    type TEXT NOT NULL,
+                    canonical_url TEXT NOT NULL
+                )""")
+            self._connection.execute("""
+                CREATE INDEX IF NOT EXISTS articles_by_publication_and_timestamp
+                ON articles (publication, post_timestamp)""")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS publications (
+                    publication TEXT PRIMARY KEY,
+                    is_complete INTEGER NOT NULL DEFAULT 0
+                )""")
+
+    def close(self):
+        self._connection.close()
+
+    # Methods used while syncing
+    def has_article(self, article_id: ArticleId) -> bool:
+        with self._lock:
+            cursor = self._connection.execute("SELECT 1 FROM articles WHERE id = ?", (article_id,))
+            return cursor.fetchone() is not None
+
+    def add_articles(self, article_rows: list[ArticleRow]):
+        with self._lock, self._connection:
+            self._connection.executemany("""
+                INSERT OR IGNORE INTO articles
+                (id, publication, post_timestamp, post_date, title, tags, type, canonical_url)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(article_id, self._publication, *rest) for article_id, *rest in article_rows])
+
+    def get_num_articles(self, include_podcasts: bool = True) -> int:
+        with self._lock:
+            cursor = self._connection.execute(
+                f"SELECT COUNT(*) FROM articles WHERE publication = ? {self._type_filter(include_podcasts)}",
+                (self._publication,))
+            return cursor.fetchone()[0]
+
+    def get_earliest_post_date(self) -> Optional[int]:
+        # None if no article of the publication has been indexed yet
+        with self._lock:
+            cursor = self._connection.execute("SELECT MIN(post_date) FROM articles WHERE publication = ?",
+                                              (self._publication,))
+            return cursor.fetchone()[0]
+
+    # whether every article of the publication has been indexed (as opposed to only the most recent ones)
+    def is_complete(self) -> bool:
+        with self._lock:
+            cursor = self._connection.execute("SELECT is_complete FROM publications WHERE publication = ?",
+                                              (self._publication,))
+            row = cursor.fetchone()
+            return row is not None and bool(row[0])
+
+    def set_complete(self):
+        with self._lock, self._connection:
+            self._connection.execute("INSERT OR REPLACE INTO publications (publication, is_complete) VALUES (?, 1)",
+                                     (self._publication,))
+
+    # Methods used while downloading
+    def get_most_recent_k_articles(self, k: int,
+                                   include_podcasts: bool) -> list[tuple[int, str, str, str, ArticleId]]:
+        with self._lock:
+            cursor = self._connection.execute(f"""
+                SELECT post_date, title, tags, canonical_url, id FROM articles
+                WHERE publication = ? {self._type_filter(include_podcasts)}
+                ORDER BY post_timestamp DESC LIMIT ?""", (self._publication, k))
+            return cursor.fetchall()
+
+    def get_articles_by_date_range(self, start_date: int, end_date: int,
+                                   include_podcasts: bool) -> list[tuple[int, str, str, str, ArticleId]]:
+        with self._lock:
+            cursor = self._connection.execute(f"""
+                SELECT post_date, title, tags, canonical_url, id FROM articles
+                WHERE publication = ? AND post_date BETWEEN ? AND ? {self._type_filter(include_podcasts)}
+                ORDER BY post_timestamp DESC""", (self._publication, start_date, end_date))
+            return cursor.fetchall()
+
+    @staticmethod
+    def _type_filter(include_podcasts: bool) -> str:
+        return "" if include_podcasts else "AND type != 'podcast'"
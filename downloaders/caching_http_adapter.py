@@ -0,0 +1,57 @@
+from typing import Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from downloaders.response_cache import ResponseCache
+
+IsCacheable = Callable[[str], bool]  # url -> whether responses to GET requests for it are cached
+
+
+class CachingHTTPAdapter(HTTPAdapter):
+    """
+    Sends GET requests for cacheable urls conditionally (If-None-Match, If-Modified-Since) when a response to them
+    is in the ResponseCache, and turns a 304 Not Modified into the 200 OK it stands for, with the cached body, so
+    that callers cannot tell the difference (except by the X-Response-Cache header). 200 OK responses with an ETag
+    or Last-Modified are cached.
+    """
+    cache_header = 'X-Response-Cache'
+
+    def __init__(self, response_cache: ResponseCache, is_cacheable: IsCacheable, **kwargs):
+        super().__init__(**kwargs)
+        self._response_cache = response_cache
+        self._is_cacheable = is_cacheable
+
+    def send(self, request: requests.PreparedRequest, stream: bool = False, **kwargs) -> requests.Response:
+        if request.method != 'GET' or stream or not self._is_cacheable(request.url):
+            return super().send(request, stream=stream, **kwargs)
+        cached_response = self._response_cache.get(request.url)
+        if cached_response:
+            etag, last_modified, _, _ = cached_response
+            if etag:
+                request.headers['If-None-Match'] = etag
+            if last_modified:
+                request.headers['If-Modified-Since'] = last_modified
+        response = super().send(request, stream=stream, **kwargs)
+        if response.status_code == 304 and cached_response:
+            _, _, content_type, body = cached_response
+            response.content  # reads the empty body of the 304, so that its connection goes back to the pool
+            response.status_code = 200
+            response.reason = 'OK'
+            response._content = body
+            if content_type:
+                response.headers['Content-Type'] = content_type
+            response.headers['Content-Length'] = str(len(body))
+            response.headers[CachingHTTPAdapter.cache_header] = 'hit'
+            self._response_cache.mark_used(request.url)
+        elif response.status_code == 200:
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self._response_cache.put(request.url, etag, last_modified, response.headers.get('Content-Type'),
+                                         response.content)
+        return response
+
+    @staticmethod
+    def is_from_cache(response: requests.Response) -> bool:
+        return response.headers.get(CachingHTTPAdapter.cache_header) == 'hit'
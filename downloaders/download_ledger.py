@@ -0,0 +1,143 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+LedgerArticleId = int
+
+
+class DownloadLedger:
+    """
+    Record of every article downloaded to the output folder, keyed by Substack post id rather than by filename,
+    so that an article is not downloaded again after its title or tags are edited, and two articles whose
+    filenames would be the same do not overwrite or skip each other.
+
+    Stored as SQLite in the output folder, and loaded into memory when opened so that checking whether an article
+    has been downloaded is a dict lookup and a stat. Output paths are stored relative to the output folder.
+    """
+    filename = '.download_ledger.sqlite3'
+    hash_chunk_size = 1024 * 1024  # in bytes
+
+    def __init__(self, output_path: str):
+        self._output_path = output_path
+        self._lock = threading.Lock()  # render workers record downloads from their own threads
+        # coordinate's worker processes record downloads at the same time, each with its own connection, so wait
+        # for each other's (short) transactions rather than fail, and let readers carry on while one writes
+        self._connection = sqlite3.connect(os.path.join(output_path, DownloadLedger.filename),
+                                           check_same_thread=False, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._create_table()
+        self._output_paths_by_id: dict[LedgerArticleId, str] = {}
+        self._ids_by_output_path: dict[str, LedgerArticleId] = {}
+        self._contents_by_id: dict[LedgerArticleId, tuple[int, str, float]] = {}  # (size, sha256, downloaded_at)
+        self._load()
+
+    def _create_table(self):
+        with self._lock, self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS downloads (
+                    id INTEGER PRIMARY KEY,
+                    canonical_url TEXT NOT NULL,
+                    output_path TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    sha256 TEXT NOT NULL,
+                    render_time REAL,
+                    downloaded_at REAL NOT NULL
+                )""")
+
+    def _load(self):
+        with self._lock:
+            cursor = self._connection.execute("SELECT id, output_path, size, sha256, downloaded_at FROM downloads")
+            for article_id, relative_output_path, *contents in cursor:
+                self._output_paths_by_id[article_id] = relative_output_path
+                self._ids_by_output_path[relative_output_path] = article_id
+                self._contents_by_id[article_id] = tuple(contents)
+
+    def close(self):
+        self._connection.close()
+
+    def get_output_path(self, article_id: LedgerArticleId) -> Optional[str]:
+        """
+        :return: where the article was downloaded to, or None if it has not been downloaded
+        """
+        relative_output_path = self._output_paths_by_id.get(article_id)
+        return os.path.join(self._output_path, relative_output_path) if relative_output_path else None
+
+    def is_intact(self, article_id: LedgerArticleId) -> bool:
+        """
+        Whether the article has been downloaded and its PDF is still as it was downloaded, i.e. it need not be
+        downloaded again. Its size is always checked, but its sha256 only if it was modified after it was
+        downloaded, so that skipping articles does not mean reading every PDF back.
+        """
+        output_path_with_filename = self.get_output_path(article_id)
+        if output_path_with_filename is None:
+            return False
+        size, sha256, downloaded_at = self._contents_by_id[article_id]
+        try:
+            stat_result = os.stat(output_path_with_filename)
+        except OSError:
+            return False
+        if stat_result.st_size != size:
+            return False
+        if stat_result.st_mtime <= downloaded_at:
+            return True
+        return DownloadLedger.get_size_and_sha256(output_path_with_filename, self.hash_chunk_size)[1] == sha256
+
+    def get_article_id(self, output_path_with_filename: str) -> Optional[LedgerArticleId]:
+        """
+        :return: the id of the article downloaded to output_path_with_filename, or None if there is none
+        """
+        return self._ids_by_output_path.get(self._get_relative_output_path(output_path_with_filename))
+
+    def record(self, article_id: LedgerArticleId, canonical_url: str, output_path_with_filename: str,
+               render_time: Optional[float]):
+        """
+        :param render_time: in seconds, from navigating to the article until its PDF was saved;
+        None for articles downloaded before the ledger was kept
+        """
+        size, sha256 = DownloadLedger.get_size_and_sha256(output_path_with_filename, self.hash_chunk_size)
+        relative_output_path = self._get_relative_output_path(output_path_with_filename)
+        downloaded_at = time.time()
+        with self._lock, self._connection:
+            self._connection.execute("""
+                INSERT OR REPLACE INTO downloads
+                (id, canonical_url, output_path, size, sha256, render_time, downloaded_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (article_id, canonical_url, relative_output_path, size, sha256, render_time, downloaded_at))
+            previous_relative_output_path = self._output_paths_by_id.get(article_id)
+            if previous_relative_output_path:
+                self._ids_by_output_path.pop(previous_relative_output_path, None)
+            self._output_paths_by_id[article_id] = relative_output_path
+            self._ids_by_output_path[relative_output_path] = article_id
+            self._contents_by_id[article_id] = (size, sha256, downloaded_at)
+
+    def get_canonical_url(self, article_id: LedgerArticleId) -> Optional[str]:
+        with self._lock:
+            cursor = self._connection.execute("SELECT canonical_url FROM downloads WHERE id = ?", (article_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
+    def move(self, article_id: LedgerArticleId, output_path_with_filename: str):
+        # for when a downloaded PDF is moved, e.g. by migrating the output folder to another layout
+        relative_output_path = self._get_relative_output_path(output_path_with_filename)
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE downloads SET output_path = ? WHERE id = ?",
+                                     (relative_output_path, article_id))
+            self._ids_by_output_path.pop(self._output_paths_by_id[article_id], None)
+            self._output_paths_by_id[article_id] = relative_output_path
+            self._ids_by_output_path[relative_output_path] = article_id
+
+    def _get_relative_output_path(self, output_path_with_filename: str) -> str:
+        return os.path.relpath(output_path_with_filename, self._output_path)
+
+    @staticmethod
+    def get_size_and_sha256(path_with_filename: str, chunk_size: int) -> tuple[int, str]:
+        sha256 = hashlib.sha256()
+        size = 0
+        with open(path_with_filename, 'rb') as f:
+            while chunk := f.read(chunk_size):
+                sha256.update(chunk)
+                size += len(chunk)
+        return size, sha256.hexdigest()
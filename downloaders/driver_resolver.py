@@ -0,0 +1,117 @@
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+from typing import Optional
+
+from utilities import exceptions
+
+ChromeVersion = str  # e.g. '120.0.6099.109'
+
+
+class DriverResolver:
+    """
+    Finds the chromedriver matching the installed Chrome. ChromeDriverManager().install() checks driver versions
+    over the network every time, so the path it returns is cached on disk keyed on the installed Chrome version,
+    and ChromeDriverManager is only asked again (and only imported) after Chrome is updated.
+
+    Offline, only cached drivers are used: the one for the installed Chrome version, or if that version cannot be
+    found, the one resolved most recently. A driver resolved without knowing the Chrome version is cached too
+    (under unknown_chrome_version), so that ChromeDriverManager is not asked on every run where the version
+    cannot be found.
+    """
+    filename = 'chromedriver.json'
+    unknown_chrome_version = 'unknown'
+    offline_environment_variable = 'SUBSTACK_ARCHIVES_DOWNLOADER_OFFLINE'  # set by main.py's --offline
+    version_command_timeout = 5  # in seconds
+    # commands printing the installed Chrome version, tried in order
+    linux_version_commands = (
+        ['google-chrome', '--version'], ['google-chrome-stable', '--version'],
+        ['chromium', '--version'], ['chromium-browser', '--version'],
+    )
+    mac_version_commands = (
+        ['/Applications/Google Chrome.app/Contents/MacOS/Google Chrome', '--version'],
+        ['/Applications/Chromium.app/Contents/MacOS/Chromium', '--version'],
+    )
+    windows_version_commands = (
+        ['reg', 'query', r'HKEY_CURRENT_USER\Software\Google\Chrome\BLBeacon', '/v', 'version'],
+        ['reg', 'query', r'HKEY_CURRENT_USER\Software\Chromium\BLBeacon', '/v', 'version'],
+    )
+
+    def __init__(self, driver_cache_path: str):
+        self._cache_path_with_filename = os.path.join(driver_cache_path, DriverResolver.filename)
+
+    def resolve(self) -> str:
+        """
+        :return: the path of a chromedriver matching the installed Chrome
+        """
+        chrome_version = DriverResolver.get_chrome_version()
+        cache = self._load_cache()
+        # without the Chrome version, the driver resolved most recently is the best guess
+        driver_path = cache['drivers'].get(chrome_version or cache['last_chrome_version'])
+        if driver_path and os.path.isfile(driver_path):
+            return driver_path
+        if DriverResolver.is_offline():
+            raise exceptions.ChromedriverNotCached(chrome_version)
+        from webdriver_manager.chrome import ChromeDriverManager  # slow to import, so only when needed
+        driver_path = ChromeDriverManager().install()
+        cache_key = chrome_version or DriverResolver.unknown_chrome_version
+        cache['drivers'][cache_key] = driver_path
+        cache['last_chrome_version'] = cache_key
+        self._save_cache(cache)
+        return driver_path
+
+    def _load_cache(self) -> dict:
+        # a cache that cannot be read, or is not shaped as _save_cache writes it, is as good as none
+        try:
+            with open(self._cache_path_with_filename) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            cache = None
+        if not DriverResolver.is_valid_cache(cache):
+            return {'drivers': {}, 'last_chrome_version': None}
+        return cache
+
+    @staticmethod
+    def is_valid_cache(cache) -> bool:
+        return isinstance(cache, dict) and isinstance(cache.get('drivers'), dict) \
+            and all(isinstance(chrome_version, str) and isinstance(driver_path, str)
+                    for chrome_version, driver_path in cache['drivers'].items()) \
+            and isinstance(cache.get('last_chrome_version'), (str, type(None)))
+
+    def _save_cache(self, cache: dict):
+        # written to a temporary file first, as drivers of other processes may be reading it
+        part_path_with_filename = f'{self._cache_path_with_filename}.{os.getpid()}.part'
+        with open(part_path_with_filename, 'w') as f:
+            json.dump(cache, f, indent=4)
+        os.replace(part_path_with_filename, self._cache_path_with_filename)
+
+    @staticmethod
+    def is_offline() -> bool:
+        return bool(os.environ.get(DriverResolver.offline_environment_variable))
+
+    @staticmethod
+    def get_chrome_version() -> Optional[ChromeVersion]:
+        """
+        :return: the version of the installed Chrome (or Chromium), or None if it cannot be found
+        """
+        if sys.platform.startswith('win'):
+            version_commands = DriverResolver.windows_version_commands
+        elif sys.platform == 'darwin':
+            version_commands = DriverResolver.mac_version_commands
+        else:
+            version_commands = DriverResolver.linux_version_commands
+        for version_command in version_commands:
+            if not (shutil.which(version_command[0]) or os.path.isfile(version_command[0])):
+                continue
+            try:
+                output = subprocess.run(version_command, capture_output=True, text=True,
+                                        timeout=DriverResolver.version_command_timeout).stdout
+            except (OSError, subprocess.SubprocessError):
+                continue
+            match = re.search(r'\d+\.\d+\.\d+\.\d+', output)
+            if match:
+                return match.group()
+        return None
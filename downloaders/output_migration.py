@@ -0,0 +1,92 @@
+import os
+from typing import Optional
+
+from downloaders.download_ledger import DownloadLedger
+from downloaders.pdf_downloader import Directory, OutputLayout
+
+
+class OutputMigration:
+    """
+    Moves every PDF under the output folder to where output_layout puts it (in place, by renaming, so nothing is
+    copied), updates the download ledger to match, and saves output_layout as the output folder's layout so that
+    later runs download into it.
+
+    The publication of a PDF is looked up in the download ledger, so with per_publication, PDFs that are not in the
+    ledger are left where they are; so are PDFs whose filename does not start with a date when sharding by date.
+    """
+
+    def __init__(self, output_layout: OutputLayout):
+        self._output_layout = output_layout
+        self._directory = Directory(is_headless=True, output_layout=output_layout)
+        self._output_path = os.path.normpath(self._directory.output_path)
+        self._download_ledger = DownloadLedger(self._output_path)
+        self.num_moved = 0
+        self.num_in_place = 0
+        self.left_behind: list[tuple[str, str]] = []  # (relative path, reason)
+
+    def run(self):
+        try:
+            for path_with_filename in self._find_pdfs():
+                self._migrate(path_with_filename)
+            self._remove_empty_folders()
+            self._output_layout.save(self._output_path)
+        finally:
+            self._download_ledger.close()
+
+    def _find_pdfs(self) -> list[str]:
+        # listed up front, as PDFs are moved into folders that are still to be walked
+        pdfs = []
+        for folder_path, folder_names, filenames in os.walk(self._output_path):
+            folder_names[:] = [folder_name for folder_name in folder_names if not folder_name.startswith('.')]
+            pdfs.extend(os.path.join(folder_path, filename) for filename in filenames
+                        if filename.endswith('.pdf') and not filename.startswith('.'))
+        return pdfs
+
+    def _migrate(self, path_with_filename: str):
+        filename = os.path.basename(path_with_filename)
+        article_id = self._download_ledger.get_article_id(path_with_filename)
+        article_url = self._download_ledger.get_canonical_url(article_id) if article_id is not None else None
+        date = OutputMigration.get_date_from_filename(filename)
+        if self._output_layout.per_publication and article_url is None:
+            self._leave_behind(path_with_filename, "not in the download ledger, so its publication is unknown")
+            return
+        if self._output_layout.shard_by and date is None:
+            self._leave_behind(path_with_filename, "its filename does not start with a date")
+            return
+        new_path_with_filename = os.path.normpath(
+            self._directory.get_output_path_with_filename(article_url or '', date or 0, filename))
+        if new_path_with_filename == path_with_filename:
+            self.num_in_place += 1
+            return
+        if os.path.exists(new_path_with_filename):
+            self._leave_behind(path_with_filename, f"{self._get_relative_path(new_path_with_filename)} already exists")
+            return
+        os.rename(path_with_filename, new_path_with_filename)
+        if article_id is not None:
+            self._download_ledger.move(article_id, new_path_with_filename)
+        self.num_moved += 1
+
+    def _remove_empty_folders(self):
+        for folder_path, _, _ in os.walk(self._output_path, topdown=False):
+            if folder_path != self._output_path and not os.path.basename(folder_path).startswith('.') \
+                    and not os.listdir(folder_path):
+                os.rmdir(folder_path)
+
+    def _leave_behind(self, path_with_filename: str, reason: str):
+        self.left_behind.append((self._get_relative_path(path_with_filename), reason))
+
+    def _get_relative_path(self, path_with_filename: str) -> str:
+        return os.path.relpath(path_with_filename, self._output_path)
+
+    @staticmethod
+    def get_date_from_filename(filename: str) -> Optional[int]:
+        # e.g. '20211012 - Title of Article.pdf'
+        yyyymmdd = filename[:8]
+        return int(yyyymmdd) if yyyymmdd.isdigit() else None
+
+    def __str__(self):
+        lines = [f"Migrated the output folder to the {self._output_layout} layout: moved {self.num_moved} PDF(s), "
+                 f"{self.num_in_place} already in place, {len(self.left_behind)} left behind."]
+        for relative_path, reason in self.left_behind:
+            lines.append(f"  left {relative_path} ({reason})")
+        return '\n'.join(lines)
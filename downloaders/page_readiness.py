@@ -0,0 +1,82 @@
+import json
+import time
+
+from selenium.common.exceptions import WebDriverException
+
+# lazy images are only fetched when scrolled into view, so make them load now; then check that everything is in
+_CHECK_PAGE_CONTENT_IS_READY_SCRIPT = """
+document.querySelectorAll('img[loading="lazy"]').forEach(function (img) { img.loading = 'eager'; });
+return document.readyState === 'complete'
+    && (!document.fonts || document.fonts.status === 'loaded')
+    && Array.from(document.images).every(function (img) { return img.complete; });
+"""
+
+
+class PageReadiness:
+    """
+    Decides when a page is ready to be printed: its document, web fonts and images have loaded, and no network
+    request has been in flight for quiet_time, so that async JavaScript has had a chance to finish rendering.
+
+    Network requests are tracked from the CDP Network events in Chrome's performance log (which requires the
+    driver to be started with performance logging enabled). Requests in flight for longer than
+    max_request_age (websockets, long polling, streaming video) are not waited for.
+    """
+
+    def __init__(self, driver, quiet_time: float = 0.5, timeout: float = 15, max_request_age: float = 5,
+                 poll_interval: float = 0.1):
+        self._driver = driver
+        self._quiet_time = quiet_time  # in seconds
+        self._timeout = timeout  # in seconds, per page
+        self._max_request_age = max_request_age  # in seconds
+        self._poll_interval = poll_interval  # in seconds
+        self._requests_in_flight: dict[str, float] = {}  # request id -> time it was first seen
+        self._last_network_activity_time = time.monotonic()
+
+    def reset(self):
+        # to be called before navigating, so that events of the previous page are not counted
+        self._read_network_events()
+        self._requests_in_flight.clear()
+
+    def wait_until_ready(self) -> bool:
+        """
+        :return: True if the page became ready, False if timeout was reached first (the page may still be usable)
+        """
+        deadline = time.monotonic() + self._timeout
+        while time.monotonic() < deadline:
+            self._read_network_events()
+            now = time.monotonic()
+            is_network_idle = self._get_num_requests_in_flight(now) == 0 \
+                and now - self._last_network_activity_time >= self._quiet_time
+            # content is checked first as it may kick off requests (lazy images), which the next poll will pick up
+            if self._is_page_content_ready() and is_network_idle:
+                return True
+            time.sleep(self._poll_interval)
+        print(f"Page did not finish loading within {self._timeout}s, saving it anyway")  # TODO proper logging?
+        return False
+
+    def _read_network_events(self):
+        try:
+            log_entries = self._driver.get_log('performance')
+        except WebDriverException:  # performance logging is not enabled
+            return
+        now = time.monotonic()
+        for log_entry in log_entries:
+            message = json.loads(log_entry['message'])['message']
+            method = message['method']
+            if method == 'Network.requestWillBeSent':
+                self._requests_in_flight.setdefault(message['params']['requestId'], now)
+            elif method in ('Network.loadingFinished', 'Network.loadingFailed'):
+                self._requests_in_flight.pop(message['params']['requestId'], None)
+            else:
+                continue
+            self._last_network_activity_time = now
+
+    def _get_num_requests_in_flight(self, now: float) -> int:
+        return sum(1 for first_seen_time in self._requests_in_flight.values()
+                   if now - first_seen_time < self._max_request_age)
+
+    def _is_page_content_ready(self) -> bool:
+        try:
+            return bool(self._driver.execute_script(_CHECK_PAGE_CONTENT_IS_READY_SCRIPT))
+        except WebDriverException:  # e.g. the page navigated away while the script was running
+            return False
@@ -1,16 +1,29 @@
 from base64 import b64decode
+import hashlib
 import json
 import os
 import random
+import shutil
+import tempfile
+import time
+from typing import Callable, Optional
+from urllib.parse import urlparse
+import uuid
 
 from selenium import webdriver
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
 
+from downloaders.driver_resolver import DriverResolver
+from downloaders.page_readiness import PageReadiness
 from utilities import exceptions
+from utilities.file_watcher import FolderWatcher
+from utilities.rate_limiter import RateLimiter
+from utilities.timing import stage_timings, startup_timing
+
+OnSaved = Callable[[str], None]  # called with the output path once a PDF is saved there
 
 
 class PDFDownloader:
@@ -18,17 +31,44 @@ class PDFDownloader:
     To have a more abstract class which can be repurposed to download PDFs in general
     with no assumption that it's supposed to download from Substack or that any login is required
     """
+    pdf_stream_chunk_size = 1024 * 1024  # in bytes, when reading PDFs generated in headless mode
+    max_in_flight_prints = 2  # PDFs being saved by the visible browser while it moves on to the next page
+    # requests that add nothing to a PDF: analytics, tracking and ads, and video players
+    blocked_url_patterns = (
+        '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*connect.facebook.net*',
+        '*facebook.com/tr*', '*static.ads-twitter.com*', '*segment.io*', '*segment.com*', '*sentry.io*',
+        '*youtube.com/embed*', '*youtube-nocookie.com/embed*', '*player.vimeo.com*', '*.mp4*', '*.m3u8*',
+    )
+    asset_cache_size = 500 * 1024 * 1024  # in bytes; Chrome evicts least recently used entries beyond this
 
-    def __init__(self, is_headless: bool = False):
+    def __init__(self, is_headless: bool = False, rate_limiter: Optional[RateLimiter] = None,
+                 asset_cache_name: str = 'main', output_layout: Optional['OutputLayout'] = None):
+        """
+        :param asset_cache_name: fonts, stylesheets, scripts and images are cached on disk under this name,
+        and reused by later drivers of the same name. Drivers running at the same time need different names.
+        :param output_layout: how PDFs are organised in folders under the output folder; if not given,
+        the layout the output folder was last migrated to (flat if never)
+        """
         self._is_headless = is_headless
-        self._directory = Directory(self._is_headless)
+        self._directory = Directory(self._is_headless, output_layout)
+        self._asset_cache_name = asset_cache_name
+        # a fresh profile every time keeps sessions apart like --incognito did, without giving up the disk cache
+        self._profile_path = tempfile.mkdtemp(prefix='substack-archives-downloader-profile-')
+        self._current_url: Optional[str] = None  # so that the spans of saving a page know which article it is
         self._driver = self._initialize_driver()
+        self._block_urls()
         self._wait_time = WaitTime()  # randomized wait time
+        self._page_readiness = PageReadiness(self._driver)
+        self._print_jobs = PrintJobs(self._directory.temp_path) if not self._is_headless else None
+        # shared with anything else sending requests to the same hosts (e.g. other drivers, API calls)
+        self._rate_limiter = rate_limiter if rate_limiter else RateLimiter()
 
     # Methods for managing PDFDownloader's life cycle
     def _initialize_driver(self):
         chrome_options = webdriver.ChromeOptions()
-        chrome_options.add_argument('--incognito')
+        chrome_options.add_argument(f'--user-data-dir={self._profile_path}')
+        chrome_options.add_argument(f'--disk-cache-dir={self._directory.get_asset_cache_path(self._asset_cache_name)}')
+        chrome_options.add_argument(f'--disk-cache-size={self.asset_cache_size}')
         chrome_options.add_argument('--window-size=1920,1080')
 
         if self._is_headless:
@@ -52,78 +92,174 @@ class PDFDownloader:
             chrome_options.add_experimental_option('prefs', profile)
             chrome_options.add_argument('--kiosk-printing')
 
-        return webdriver.Chrome(options=chrome_options, executable_path=ChromeDriverManager().install())
+        capabilities = chrome_options.to_capabilities()
+        # CDP network events end up in the performance log, which PageReadiness uses to tell when a page is idle
+        capabilities['goog:loggingPrefs'] = {'performance': 'ALL'}
+        executable_path = DriverResolver(self._directory.get_driver_cache_path()).resolve()
+        startup_timing.record('resolve chromedriver')
+        with stage_timings.span('launch_browser'):
+            driver = webdriver.Chrome(desired_capabilities=capabilities, executable_path=executable_path)
+        startup_timing.report('launch browser')
+        return driver
+
+    def _block_urls(self):
+        self._driver.execute_cdp_cmd("Network.enable", {})
+        self._driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(self.blocked_url_patterns)})
 
     def shut_down(self):
-        if not self._is_headless:
-            self._directory.delete_temp_folder()
-        self._driver.quit()
+        try:
+            if not self._is_headless:
+                try:
+                    self.wait_for_pending_pdfs()
+                finally:
+                    self._print_jobs.close()
+        finally:
+            # even if a PDF failed to save, so that neither Chrome nor its profile outlives the downloader, and the
+            # next run does not find the temp folder full
+            try:
+                self._driver.quit()
+            finally:
+                shutil.rmtree(self._profile_path, ignore_errors=True)
+                if not self._is_headless:
+                    for unsaved_path_with_filename in self._directory.delete_temp_folder():
+                        print(f"{os.path.basename(unsaved_path_with_filename)} was not saved in time, "
+                              f"so it was kept at {unsaved_path_with_filename}")
+
+    # Methods for sharing a browser session between drivers
+    def get_all_cookies(self) -> list[dict]:
+        # unlike driver.get_cookies(), this is not limited to the domain of the current page
+        return self._driver.execute_cdp_cmd("Network.getAllCookies", {})['cookies']
+
+    def set_cookies(self, cookies: list[dict]):
+        cookie_params = [PDFDownloader.convert_cookie_to_cookie_param(cookie) for cookie in cookies]
+        self._driver.execute_cdp_cmd("Network.setCookies", {"cookies": cookie_params})
+
+    # Methods for navigating
+    def _navigate_to(self, url: str):
+        with stage_timings.span('wait_for_rate_limit', url):
+            self._rate_limiter.wait_for_turn(url)
+        self._page_readiness.reset()
+        self._current_url = url
+        start_time = time.monotonic()
+        with stage_timings.span('navigate', url):
+            self._driver.get(url)
+        self._rate_limiter.record_response(url, time.monotonic() - start_time)
 
     # Methods for generating PDF
-    def _save_current_page_as_pdf_in_output_folder(self, output_path_with_filename: str):
+    def _save_current_page_as_pdf_in_output_folder(self, output_path_with_filename: str,
+                                                   on_saved: Optional[OnSaved] = None):
+        """
+        :param on_saved: called once the PDF is complete at its output path, which for the visible browser
+        may be after this returns (see PrintJobs)
+        """
         if self._is_headless:
             self._write_to_local_file_in_output_folder(output_path_with_filename)
+            if on_saved:
+                on_saved(output_path_with_filename)
         else:
-            self._write_to_temp_folder_and_move_to_output_folder(output_path_with_filename)
+            self._write_to_temp_folder_and_move_to_output_folder(output_path_with_filename, on_saved)
 
     def _write_to_local_file_in_output_folder(self, output_path_with_filename: str):
-        b64_data = self._driver.execute_cdp_cmd("Page.printToPDF", {
-            "printBackground": True,
-        })['data']
-        b64_data_decoded = b64decode(b64_data, validate=True)
-        PDFDownloader.validate_b64_string_is_pdf(b64_data_decoded)
-        with open(output_path_with_filename, "wb") as f:
-            f.write(b64_data_decoded)
+        # ask for a stream handle rather than the whole PDF as one base64 string, then read it in chunks
+        # so that at most one chunk of the PDF is held in memory, however long the article
+        with stage_timings.span('generate_pdf', self._current_url):
+            stream_handle = self._driver.execute_cdp_cmd("Page.printToPDF", {
+                "printBackground": True,
+                "transferMode": "ReturnAsStream",
+            })['stream']
+        # write to a temp file first, so an interrupted run never leaves a truncated PDF behind
+        temp_path_with_filename = output_path_with_filename + '.part'
+        try:
+            with stage_timings.span('write_pdf', self._current_url) as span, open(temp_path_with_filename, "wb") as f:
+                is_first_chunk = True
+                while True:
+                    chunk = self._driver.execute_cdp_cmd("IO.read", {
+                        "handle": stream_handle,
+                        "size": self.pdf_stream_chunk_size,
+                    })
+                    data = b64decode(chunk['data'], validate=True) if chunk.get('base64Encoded') \
+                        else chunk['data'].encode()
+                    if is_first_chunk:
+                        PDFDownloader.validate_pdf_signature(data)
+                        is_first_chunk = False
+                    f.write(data)
+                    span.add_bytes(len(data))
+                    if chunk['eof']:
+                        break
+            os.replace(temp_path_with_filename, output_path_with_filename)
+        except Exception:
+            if os.path.isfile(temp_path_with_filename):
+                os.remove(temp_path_with_filename)
+            raise
+        finally:
+            self._driver.execute_cdp_cmd("IO.close", {"handle": stream_handle})
+
+    def _write_to_temp_folder_and_move_to_output_folder(self, filename_path_output: str,
+                                                        on_saved: Optional[OnSaved] = None):
+        # Chrome names the PDF after the page's title, so a unique title identifies this page's PDF in temp folder
+        unique_title = uuid.uuid4().hex
+        self._driver.execute_script('document.title = arguments[0]; window.print();', unique_title)
+        # the PDF is moved from temp folder to output folder once Chrome has finished writing it
+        self._print_jobs.add(f'{unique_title}.pdf', filename_path_output, on_saved, self._current_url)
+        self._print_jobs.wait_until_num_pending_is_at_most(self.max_in_flight_prints - 1)
 
     # Methods to do with waiting
-    def _write_to_temp_folder_and_move_to_output_folder(self, filename_path_output: str):
-        self._driver.execute_script('window.print();')  # download PDF to temp directory
-        # move file from temp directory to output directory and rename file
-        for _, _, filenames in os.walk(self._directory.temp_path):
-            for filename in filenames:  # should only ever have one file in temp, but you never know. just in case.
-                if filename.lower().endswith('.pdf'):
-                    filename_temp = filenames[0]
-                    filename_path_temp = os.path.join(self._directory.temp_path, filename_temp)
-                    os.rename(filename_path_temp, filename_path_output)
+    def wait_for_pending_pdfs(self):
+        if self._print_jobs:
+            self._print_jobs.wait_until_num_pending_is_at_most(0)
 
     # not sure if there is a better way of doing this; return boolean so exact exception can vary depending on context
     def _wait_for_element_to_load(self, by: type(By), element_target: str) -> bool:
-        try:
-            WebDriverWait(self._driver, self._wait_time.max_wait_time).until(
-                EC.presence_of_element_located((by, element_target)))
-            return True
-        except TimeoutException:
-            print("Timeout exception while waiting for element to load")  # TODO proper logging?
-            return False
-
-    # TODO figure out how to wait for async javascript to finish loading
-    #  1. Look into polling2
-    #  2. If on Java, this looks promising: https://github.com/swtestacademy/JSWaiter/tree/master/src/test/java
-    #  Tried and failed:
-    #  WebDriverWait(driver, 10).until(lambda driver: driver.execute_script('return document.readyState') == 'complete')
-    #  WebDriverWait(driver, 10).until(lambda driver: driver.execute_script('return "return jQuery.active') == '0')
-    # def _wait_for_page_to_finish_loading(self):  # TODO WIP
-    #     try:
-    #         WebDriverWait(self._driver, self._wait_time.max_wait_time).until(
-    #             staleness_of(self._driver.find_element_by_tag_name('html')))
-    #         return True
-    #     except TimeoutException:
-    #         print("Timeout exception while waiting for [age to load")
-    #         return False
+        with stage_timings.span('wait_for_element', self._current_url) as span:
+            try:
+                WebDriverWait(self._driver, self._wait_time.max_wait_time).until(
+                    EC.presence_of_element_located((by, element_target)))
+                return True
+            except TimeoutException:
+                print("Timeout exception while waiting for element to load")  # TODO proper logging?
+                span.set_error()
+                return False
+
+    # waits for network requests (CDP events), web fonts and images rather than for a fixed amount of time
+    def _wait_for_page_to_finish_loading(self) -> bool:
+        with stage_timings.span('wait_for_page', self._current_url) as span:
+            is_ready = self._page_readiness.wait_until_ready()
+            if not is_ready:
+                span.set_error()
+            return is_ready
 
     @staticmethod
-    def validate_b64_string_is_pdf(b64_string: bytes):
-        if b64_string[0:4] != b'%PDF':
+    def convert_cookie_to_cookie_param(cookie: dict) -> dict:
+        # Network.getAllCookies returns fields (size, session etc.) that Network.setCookies does not accept
+        cookie_param_keys = ('name', 'value', 'domain', 'path', 'secure', 'httpOnly', 'sameSite')
+        cookie_param = {key: cookie[key] for key in cookie_param_keys if key in cookie}
+        if not cookie.get('session', False) and cookie.get('expires', -1) > 0:
+            cookie_param['expires'] = cookie['expires']
+        return cookie_param
+
+    @staticmethod
+    def validate_pdf_signature(first_chunk: bytes):
+        if first_chunk[0:4] != b'%PDF':
             # TODO use more specific error?
             raise ValueError('Missing PDF file signature')
 
 
 class Directory:
     # TODO methods to set different directories?
-    def __init__(self, is_headless: bool):
+    # e.g. for benchmarks, which must not touch the real output folder (or its ledger and archive index)
+    output_path_environment_variable = 'SUBSTACK_ARCHIVES_DOWNLOADER_OUTPUT_PATH'
+    # in the output folder; hidden, so that migrate-output leaves it alone
+    unsaved_folder_name = '.unsaved'
+
+    def __init__(self, is_headless: bool, output_layout: Optional['OutputLayout'] = None):
         self._path_to_directory = os.path.dirname(__file__)
-        self.output_path = os.path.join(self._path_to_directory, '../output')
+        self.output_path = os.environ.get(Directory.output_path_environment_variable) \
+            or os.path.join(self._path_to_directory, '../output')
+        self._asset_cache_path = os.path.join(self._path_to_directory, '../asset_cache')
+        self._driver_cache_path = os.path.join(self._path_to_directory, '../driver_cache')
         self._ensure_output_folder_exists()
+        self.output_layout = output_layout if output_layout else OutputLayout.load(self.output_path)
+        self._existing_output_folders: set[str] = set()  # so that each folder is only created once per run
         if not is_headless:
             self.temp_path = os.path.join(self._path_to_directory, 'temp')
             self._ensure_temp_folder_exists()
@@ -139,16 +275,46 @@ class Directory:
     def _ensure_output_folder_exists(self):
         Directory.ensure_folder_exists(self.output_path)
 
+    def get_output_path_with_filename(self, article_url: str, date: int, filename: str) -> str:
+        folder_path = os.path.join(self.output_path,
+                                   self.output_layout.get_relative_folder_path(article_url, date, filename))
+        if folder_path not in self._existing_output_folders:
+            Directory.ensure_folder_exists(folder_path)
+            self._existing_output_folders.add(folder_path)
+        return os.path.join(folder_path, filename)
+
+    def get_asset_cache_path(self, asset_cache_name: str) -> str:
+        asset_cache_path = os.path.join(self._asset_cache_path, asset_cache_name)
+        Directory.ensure_folder_exists(asset_cache_path)
+        return asset_cache_path
+
+    def get_driver_cache_path(self) -> str:
+        Directory.ensure_folder_exists(self._driver_cache_path)
+        return self._driver_cache_path
+
     # Tell Directory object to delete its temp folder (as part of wrapping up the program)
-    def delete_temp_folder(self):
-        if os.path.isdir(self.temp_path):
-            os.rmdir(self.temp_path)  # remove empty directory
-            # shutil.rmtree(self.temp_path)  # delete directory and all its contents
+    def delete_temp_folder(self) -> list[str]:
+        """
+        Files still in the temp folder (e.g. PDFs that Chrome finished after we stopped waiting for them) are moved
+        to the output folder's unsaved folder first, so that they are not lost and the next run starts with an
+        empty temp folder.
+        :return: where each file left in the temp folder was moved to
+        """
+        if not os.path.isdir(self.temp_path):
+            return []
+        unsaved_paths_with_filename = []
+        for filename in os.listdir(self.temp_path):
+            unsaved_path = os.path.join(self.output_path, Directory.unsaved_folder_name)
+            Directory.ensure_folder_exists(unsaved_path)
+            unsaved_path_with_filename = os.path.join(unsaved_path, f'{time.strftime("%Y%m%d-%H%M%S")}-{filename}')
+            shutil.move(os.path.join(self.temp_path, filename), unsaved_path_with_filename)
+            unsaved_paths_with_filename.append(unsaved_path_with_filename)
+        os.rmdir(self.temp_path)  # remove empty directory
+        return unsaved_paths_with_filename
 
     @staticmethod
     def ensure_folder_exists(path_to_folder: str):
-        if not os.path.isdir(path_to_folder):
-            os.mkdir(path_to_folder)
+        os.makedirs(path_to_folder, exist_ok=True)  # render workers may race to create the same folder
 
     @staticmethod
     def check_folder_is_empty(path_to_folder: str):
@@ -156,6 +322,139 @@ class Directory:
             raise (exceptions.TempFolderNotEmpty(path_to_folder))
 
 
+class OutputLayout:
+    """
+    Where a PDF goes under the output folder, so that a folder never has to hold a whole archive:
+    optionally in a folder per publication (named after the article url's host), then optionally in a folder
+    per year or per month of publication, then optionally in one of 16 ** hash_bucket_digits folders picked
+    by hashing the filename. With none of these (the default), every PDF goes directly in the output folder.
+    """
+    filename = '.output_layout.json'
+    shard_by_options = (None, 'year', 'month')
+
+    def __init__(self, per_publication: bool = False, shard_by: Optional[str] = None, hash_bucket_digits: int = 0):
+        assert shard_by in OutputLayout.shard_by_options
+        assert 0 <= hash_bucket_digits <= 4
+        self.per_publication = per_publication
+        self.shard_by = shard_by
+        self.hash_bucket_digits = hash_bucket_digits
+
+    def get_relative_folder_path(self, article_url: str, date: int, filename: str) -> str:
+        folders = []
+        if self.per_publication:
+            folders.append(OutputLayout.get_publication_folder_name(article_url))
+        if self.shard_by:
+            yyyymmdd = str(date)
+            folders.append(yyyymmdd[:4])
+            if self.shard_by == 'month':
+                folders.append(yyyymmdd[4:6])
+        if self.hash_bucket_digits:
+            folders.append(hashlib.sha1(filename.encode()).hexdigest()[:self.hash_bucket_digits])
+        return os.path.join(*folders) if folders else ''
+
+    def is_flat(self) -> bool:
+        return not self.per_publication and not self.shard_by and not self.hash_bucket_digits
+
+    # the layout is saved in the output folder when it is migrated, and used by later runs by default
+    def save(self, output_path: str):
+        with open(os.path.join(output_path, OutputLayout.filename), 'w') as f:
+            json.dump({
+                'per_publication': self.per_publication,
+                'shard_by': self.shard_by,
+                'hash_bucket_digits': self.hash_bucket_digits,
+            }, f)
+
+    @staticmethod
+    def load(output_path: str) -> 'OutputLayout':
+        try:
+            with open(os.path.join(output_path, OutputLayout.filename)) as f:
+                return OutputLayout(**json.load(f))
+        except FileNotFoundError:
+            return OutputLayout()
+
+    @staticmethod
+    def get_publication_folder_name(article_url: str) -> str:
+        return urlparse(article_url).netloc.lower().replace(':', '_')
+
+    def __str__(self):
+        if self.is_flat():
+            return "flat"
+        parts = (['per publication'] if self.per_publication else []) \
+            + ([f'by {self.shard_by}'] if self.shard_by else []) \
+            + ([f'{16 ** self.hash_bucket_digits} hash buckets'] if self.hash_bucket_digits else [])
+        return ', '.join(parts)
+
+
+class PrintJobs:
+    """
+    Keeps track of PDFs that window.print() is saving to temp folder (when the browser is not headless),
+    and moves each one to its output path once it is finished, i.e. once Chrome's .crdownload is gone
+    and its size has stopped changing. Several prints can be in flight at once.
+    """
+
+    def __init__(self, temp_path: str, stable_time: float = 0.5, timeout: float = 60):
+        self._temp_path = temp_path
+        self._stable_time = stable_time  # in seconds, for which the size of a PDF must not change
+        self._timeout = timeout  # in seconds, without any PDF finishing
+        self._watcher = FolderWatcher(temp_path)
+        self._output_paths: dict[str, str] = {}  # filename in temp folder -> output path
+        self._on_saved: dict[str, OnSaved] = {}  # filename in temp folder -> callback, if any
+        self._last_sizes: dict[str, tuple[int, float]] = {}  # filename -> (size, time the size last changed)
+        self._print_starts: dict[str, tuple[Optional[str], float]] = {}  # filename -> (article url, time printed)
+
+    def add(self, filename_temp: str, filename_path_output: str, on_saved: Optional[OnSaved] = None,
+            article_url: Optional[str] = None):
+        self._output_paths[filename_temp] = filename_path_output
+        self._print_starts[filename_temp] = (article_url, time.perf_counter())
+        if on_saved:
+            self._on_saved[filename_temp] = on_saved
+
+    def wait_until_num_pending_is_at_most(self, num_pending: int):
+        deadline = time.monotonic() + self._timeout
+        while True:
+            if self._move_finished_pdfs_to_output_folder():
+                deadline = time.monotonic() + self._timeout
+            if len(self._output_paths) <= num_pending:
+                return
+            time_remaining = deadline - time.monotonic()
+            if time_remaining <= 0:
+                raise exceptions.ErrorWhileSavingPDF(next(iter(self._output_paths.values())))
+            # wake up on changes in temp folder, or after stable_time to check whether sizes have stopped changing
+            self._watcher.wait_for_changes(min(time_remaining, self._stable_time))
+
+    def close(self):
+        self._watcher.close()
+
+    def _move_finished_pdfs_to_output_folder(self) -> bool:
+        filenames_in_temp = set(os.listdir(self._temp_path))
+        now = time.monotonic()
+        moved_any = False
+        for filename_temp, filename_path_output in list(self._output_paths.items()):
+            if filename_temp not in filenames_in_temp or f'{filename_temp}.crdownload' in filenames_in_temp:
+                continue
+            filename_path_temp = os.path.join(self._temp_path, filename_temp)
+            size = os.path.getsize(filename_path_temp)
+            last_size, last_size_change_time = self._last_sizes.get(filename_temp, (-1, now))
+            if size != last_size:
+                self._last_sizes[filename_temp] = (size, now)
+                continue
+            if size == 0 or now - last_size_change_time < self._stable_time:
+                continue
+            # moved next to its output path first, so that the output path only ever holds a complete PDF
+            # even if temp folder and output folder are on different file systems
+            shutil.move(filename_path_temp, filename_path_output + '.part')
+            os.replace(filename_path_output + '.part', filename_path_output)
+            del self._output_paths[filename_temp]
+            del self._last_sizes[filename_temp]
+            article_url, print_start_time = self._print_starts.pop(filename_temp)
+            stage_timings.record('save_pdf', time.perf_counter() - print_start_time, article_url, size)
+            on_saved = self._on_saved.pop(filename_temp, None)
+            if on_saved:
+                on_saved(filename_path_output)
+            moved_any = True
+        return moved_any
+
+
 class WaitTime:
     # TODO include setters to modify wait_time?
     def __init__(self):
@@ -0,0 +1,600 @@
+import base64
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+import hashlib
+import html
+from html.parser import HTMLParser
+import mimetypes
+import os
+import re
+import threading
+import time
+from typing import Callable, Iterable, Iterator, Optional
+from urllib.parse import urlparse
+import uuid
+import zipfile
+
+import requests
+
+from utilities import helper
+
+ExportPostDate = int
+ExportTitle = str
+ExportTags = str
+ExportUrl = str
+ExportArticleId = int
+ExportArticle = tuple[ExportPostDate, ExportTitle, ExportTags, ExportUrl, ExportArticleId]
+GetPost = Callable[[ExportUrl], dict]
+GetLocalImagePath = Callable[[str], Optional[str]]
+
+EXPORT_FORMATS = ('html', 'markdown', 'epub')
+
+# elements that are interactive or need a browser (embeds, scripts), and add nothing to an offline copy
+_SKIPPED_ELEMENTS = {'script', 'style', 'noscript', 'iframe', 'svg', 'button', 'form', 'input', 'source'}
+_VOID_ELEMENTS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track',
+                  'wbr'}
+# elements whose start implicitly closes an open <p>, as in https://html.spec.whatwg.org/#the-p-element
+_BLOCK_ELEMENTS = {'address', 'blockquote', 'div', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'ol', 'p',
+                   'pre', 'table', 'ul'}
+_ATTRIBUTE_NAME_PATTERN = re.compile(r'^[a-z][a-z0-9_-]*$')
+_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.svg'}
+
+_HTML_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8"/>
+<title>{title}</title>
+<style>body {{ max-width: 42em; margin: 2em auto; padding: 0 1em; font-family: Georgia, serif; line-height: 1.6; }}
+img {{ max-width: 100%; height: auto; }}</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p><time>{date}</time> · <a href="{url}">{url}</a></p>
+{body}
+</body>
+</html>
+"""
+
+_XHTML_TEMPLATE = """<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml">
+<head><title>{title}</title></head>
+<body>
+<h1>{title}</h1>
+<p>{date}</p>
+{body}
+</body>
+</html>
+"""
+
+_EPUB_CONTAINER_XML = """<?xml version="1.0" encoding="utf-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+<rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>
+"""
+
+
+class PostExporter:
+    """
+    Exports posts without a browser: each post's body_html is loaded over HTTP (get_post), its images are
+    downloaded once into a shared images folder, and it is written as HTML (with its images inlined as data: URIs,
+    so that each file is self-contained), Markdown (with its images linked locally), or a chapter of a single EPUB
+    for the publication (with its images packed into the EPUB).
+
+    get_post is paced by the downloader's rate limiter like every other request to the publication, so that is
+    what bounds how many posts are exported per minute, however many workers there are.
+
+    Posts are loaded and converted in a thread pool, with at most 2 * num_workers posts in flight, so that
+    articles are only generated (and their metadata loaded) as fast as they are exported.
+    """
+
+    image_request_timeout = 30  # in seconds
+
+    def __init__(self, session: requests.Session, get_post: GetPost, output_path: str, export_format: str,
+                 publication: str, num_workers: int = 8):
+        """
+        :param get_post: loads a post's JSON by its url, e.g. SubstackArchivesDownloader.get_post
+        :param publication: e.g. https://subdomain.substack.com, used to name the EPUB
+        """
+        assert export_format in EXPORT_FORMATS
+        assert num_workers >= 1
+        self._session = session
+        self._get_post = get_post
+        self._export_format = export_format
+        self._publication = publication
+        self._num_workers = num_workers
+        self._export_path = os.path.join(output_path, export_format)
+        self._image_store = ImageStore(os.path.join(output_path, 'images'), session, self.image_request_timeout)
+        self._report = ExportReport()
+        os.makedirs(self._export_path, exist_ok=True)
+
+    def run(self, articles: Iterable[ExportArticle]) -> 'ExportReport':
+        self._report.start()
+        if self._export_format == 'epub':
+            self._export_as_epub(articles)
+        else:
+            for _ in self._export_in_parallel(self._generate_articles_to_export(articles), self._export_as_file):
+                pass
+        self._report.stop()
+        return self._report
+
+    def _generate_articles_to_export(self, articles: Iterable[ExportArticle]) -> Iterator[ExportArticle]:
+        for article in articles:
+            if os.path.isfile(self._get_output_path(article)):
+                self._report.record_skipped()  # exported in a previous run
+                continue
+            yield article
+
+    def _export_in_parallel(self, articles: Iterable[ExportArticle], export: Callable) -> Iterator:
+        # yields what export returns for each article, in the order they finish
+        with ThreadPoolExecutor(max_workers=self._num_workers) as executor:
+            futures: dict[Future, ExportArticle] = {}
+            for article in articles:
+                if len(futures) >= 2 * self._num_workers:
+                    yield from self._collect_finished(futures)
+                futures[executor.submit(export, article)] = article
+            while futures:
+                yield from self._collect_finished(futures)
+
+    def _collect_finished(self, futures: dict[Future, ExportArticle]) -> Iterator:
+        finished, _ = wait(futures, return_when=FIRST_COMPLETED)
+        for future in finished:
+            article = futures.pop(future)
+            try:
+                result = future.result()
+            except Exception as exc:
+                self._report.record_failure(article[3], exc)
+                continue
+            self._report.record_success()
+            yield result
+
+    def _export_as_file(self, article: ExportArticle):
+        date, title, _, url, _ = article
+        post = self._get_post(url)
+        body_html = post.get('body_html') or ''
+        if self._export_format == 'html':
+            body = PostExporter.convert_body_html_to_xhtml(body_html, self._image_store.get_image_data_uri)
+            content = _HTML_TEMPLATE.format(title=html.escape(title), date=date, url=html.escape(url), body=body)
+        else:
+            body = PostExporter.convert_body_html_to_markdown(body_html, self._image_store.get_local_image_path)
+            content = f"# {title}\n\n{date} · <{url}>\n\n{body}\n"
+        PostExporter.write_atomically(self._get_output_path(article), content.encode())
+
+    def _export_as_epub(self, articles: Iterable[ExportArticle]):
+        def load_chapter(article: ExportArticle) -> tuple[ExportArticle, str, list[str]]:
+            _, _, _, url, _ = article
+            post = self._get_post(url)
+            image_paths: list[str] = []
+
+            def get_local_image_path(image_url: str) -> Optional[str]:
+                local_image_path = self._image_store.get_local_image_path(image_url)
+                if local_image_path:
+                    image_paths.append(local_image_path)
+                return local_image_path
+
+            body = PostExporter.convert_body_html_to_xhtml(post.get('body_html') or '', get_local_image_path)
+            return article, body, image_paths
+
+        epub_path = os.path.join(self._export_path,
+                                 f"{helper.clean_filename(urlparse(self._publication).netloc.replace('.', '_'))}.epub")
+        with EpubWriter(epub_path, self._publication) as epub_writer:
+            # chapters are added as they finish, and put back into date order in the table of contents
+            for (date, title, _, _, article_id), body, image_paths in self._export_in_parallel(articles, load_chapter):
+                for image_path in image_paths:
+                    epub_writer.add_image(self._image_store.get_image_file_path(image_path))
+                xhtml = _XHTML_TEMPLATE.format(title=html.escape(title), date=date, body=body)
+                epub_writer.add_chapter(f'{date}-{article_id:012d}', title, xhtml)
+
+    def _get_output_path(self, article: ExportArticle) -> str:
+        date, title, tags, _, _ = article
+        extension = 'html' if self._export_format == 'html' else 'md'
+        return os.path.join(self._export_path, f'{date} - {tags}{helper.clean_filename(title)}.{extension}')
+
+    @staticmethod
+    def convert_body_html_to_xhtml(body_html: str, get_local_image_path: GetLocalImagePath) -> str:
+        converter = _XHTMLConverter(get_local_image_path)
+        converter.feed(body_html)
+        converter.close()
+        return converter.get_xhtml()
+
+    @staticmethod
+    def convert_body_html_to_markdown(body_html: str, get_local_image_path: GetLocalImagePath) -> str:
+        converter = _MarkdownConverter(get_local_image_path)
+        converter.feed(body_html)
+        converter.close()
+        return converter.get_markdown()
+
+    @staticmethod
+    def write_atomically(path_with_filename: str, content: bytes):
+        # write to a temp file first, so an interrupted run never leaves a truncated file behind
+        temp_path_with_filename = path_with_filename + '.part'
+        with open(temp_path_with_filename, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path_with_filename, path_with_filename)
+
+
+class ImageStore:
+    """
+    Downloads each image once into images_path, named after a hash of its url, and returns paths relative to
+    the folders that exported posts are written to. Images that fail to download keep their remote url.
+    Images are served by Substack's CDN rather than the publication, so they are not paced by the rate limiter.
+    """
+
+    def __init__(self, images_path: str, session: requests.Session, timeout: float):
+        self._images_path = images_path
+        self._session = session
+        self._timeout = timeout
+        self._local_image_paths: dict[str, Optional[str]] = {}  # image url -> relative path
+        self._lock = threading.Lock()
+        os.makedirs(images_path, exist_ok=True)
+
+    def get_local_image_path(self, image_url: str) -> Optional[str]:
+        with self._lock:
+            if image_url in self._local_image_paths:
+                return self._local_image_paths[image_url]
+        filename = self._find_downloaded_image(image_url) or self._download_image(image_url)
+        local_image_path = f'../images/{filename}' if filename else None
+        with self._lock:
+            self._local_image_paths[image_url] = local_image_path
+        return local_image_path
+
+    def get_image_file_path(self, local_image_path: str) -> str:
+        return os.path.join(self._images_path, os.path.basename(local_image_path))
+
+    def get_image_data_uri(self, image_url: str) -> Optional[str]:
+        # read from the downloaded copy each time rather than kept, as images can take far more memory than posts
+        local_image_path = self.get_local_image_path(image_url)
+        if not local_image_path:
+            return None
+        image_file_path = self.get_image_file_path(local_image_path)
+        content_type, _ = mimetypes.guess_type(image_file_path)
+        with open(image_file_path, 'rb') as f:
+            return f"data:{content_type or 'application/octet-stream'};base64,{base64.b64encode(f.read()).decode()}"
+
+    def _find_downloaded_image(self, image_url: str) -> Optional[str]:
+        # images are reused across runs, whatever extension they were saved with
+        image_name = ImageStore.get_image_name(image_url)
+        extension = ImageStore.get_extension_from_url(image_url)
+        if extension and os.path.isfile(os.path.join(self._images_path, image_name + extension)):
+            return image_name + extension
+        return None
+
+    def _download_image(self, image_url: str) -> Optional[str]:
+        if urlparse(image_url).scheme not in ('http', 'https'):
+            return None
+        try:
+            response = self._session.get(image_url, timeout=self._timeout)
+        except requests.RequestException:
+            return None
+        if response.status_code != 200:
+            return None
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip()
+        extension = ImageStore.get_extension_from_url(image_url) or mimetypes.guess_extension(content_type)
+        if extension not in _IMAGE_EXTENSIONS:
+            return None
+        filename = ImageStore.get_image_name(image_url) + extension
+        # several threads may download the same image; each writes its own temp file and the last one wins
+        temp_path_with_filename = os.path.join(self._images_path, f'{filename}.{uuid.uuid4().hex}.part')
+        with open(temp_path_with_filename, 'wb') as f:
+            f.write(response.content)
+        os.replace(temp_path_with_filename, os.path.join(self._images_path, filename))
+        return filename
+
+    @staticmethod
+    def get_image_name(image_url: str) -> str:
+        return hashlib.sha1(image_url.encode()).hexdigest()
+
+    @staticmethod
+    def get_extension_from_url(image_url: str) -> Optional[str]:
+        # Substack's CDN urls end with the url of the original image, e.g. .../https%3A%2F%2F...%2Fimage.png
+        extension = os.path.splitext(urlparse(image_url).path)[1].lower()
+        return extension if extension in _IMAGE_EXTENSIONS else None
+
+
+class EpubWriter:
+    """
+    Writes an EPUB 3 file one chapter at a time, so that only the table of contents is kept in memory.
+    Chapters are listed in the order of their sort keys, whatever order they are added in.
+    """
+
+    def __init__(self, epub_path: str, title: str):
+        self._epub_path = epub_path
+        self._temp_epub_path = epub_path + '.part'
+        self._title = title
+        self._chapters: list[tuple[str, str, str]] = []  # (sort key, chapter id, title)
+        self._image_filenames: set[str] = set()
+        self._zip_file = zipfile.ZipFile(self._temp_epub_path, 'w', zipfile.ZIP_DEFLATED)
+        # the mimetype must be the first entry, and must not be compressed
+        self._zip_file.writestr('mimetype', 'application/epub+zip', compress_type=zipfile.ZIP_STORED)
+        self._zip_file.writestr('META-INF/container.xml', _EPUB_CONTAINER_XML)
+
+    def __enter__(self) -> 'EpubWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self._zip_file.close()
+            os.remove(self._temp_epub_path)
+
+    def add_chapter(self, sort_key: str, title: str, xhtml: str):
+        chapter_id = f'chapter-{len(self._chapters)}'
+        self._zip_file.writestr(f'OEBPS/text/{chapter_id}.xhtml', xhtml)
+        self._chapters.append((sort_key, chapter_id, title))
+
+    def add_image(self, image_file_path: str):
+        filename = os.path.basename(image_file_path)
+        if filename in self._image_filenames:
+            return
+        self._zip_file.write(image_file_path, f'OEBPS/images/{filename}')
+        self._image_filenames.add(filename)
+
+    def close(self):
+        self._chapters.sort()
+        self._zip_file.writestr('OEBPS/content.opf', self._get_package_document())
+        self._zip_file.writestr('OEBPS/nav.xhtml', self._get_navigation_document())
+        self._zip_file.close()
+        os.replace(self._temp_epub_path, self._epub_path)
+
+    def _get_package_document(self) -> str:
+        manifest_items = ['<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>']
+        manifest_items += [f'<item id="{chapter_id}" href="text/{chapter_id}.xhtml" '
+                           f'media-type="application/xhtml+xml"/>' for _, chapter_id, _ in self._chapters]
+        manifest_items += [f'<item id="image-{os.path.splitext(filename)[0]}" href="images/{filename}" '
+                           f'media-type="{mimetypes.guess_type(filename)[0]}"/>'
+                           for filename in sorted(self._image_filenames)]
+        spine_items = [f'<itemref idref="{chapter_id}"/>' for _, chapter_id, _ in self._chapters]
+        modified = time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())
+        return f"""<?xml version="1.0" encoding="utf-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+<dc:identifier id="book-id">{html.escape(self._title)}</dc:identifier>
+<dc:title>{html.escape(self._title)}</dc:title>
+<dc:language>en</dc:language>
+<meta property="dcterms:modified">{modified}</meta>
+</metadata>
+<manifest>
+{chr(10).join(manifest_items)}
+</manifest>
+<spine>
+{chr(10).join(spine_items)}
+</spine>
+</package>
+"""
+
+    def _get_navigation_document(self) -> str:
+        toc_items = [f'<li><a href="text/{chapter_id}.xhtml">{html.escape(title)}</a></li>'
+                     for _, chapter_id, title in self._chapters]
+        return f"""<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE html>
+<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">
+<head><title>{html.escape(self._title)}</title></head>
+<body>
+<nav epub:type="toc"><ol>
+{chr(10).join(toc_items)}
+</ol></nav>
+</body>
+</html>
+"""
+
+
+class ExportReport:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start_time = 0.0
+        self._end_time = 0.0
+        self.num_exported = 0
+        self.num_skipped = 0
+        self.failures: list[tuple[ExportUrl, str]] = []
+
+    def start(self):
+        self._start_time = time.perf_counter()
+
+    def stop(self):
+        self._end_time = time.perf_counter()
+
+    def record_success(self):
+        with self._lock:
+            self.num_exported += 1
+
+    def record_skipped(self):
+        with self._lock:
+            self.num_skipped += 1
+
+    def record_failure(self, url: str, exc: Exception):
+        with self._lock:
+            self.failures.append((url, str(exc)))
+
+    def get_elapsed_time(self) -> float:
+        return self._end_time - self._start_time
+
+    def get_articles_per_minute(self) -> float:
+        elapsed_time = self.get_elapsed_time()
+        return self.num_exported / elapsed_time * 60 if elapsed_time > 0 else 0.0
+
+    def __str__(self):
+        lines = [f"Exported {self.num_exported} article(s) in {self.get_elapsed_time():.1f}s "
+                 f"({self.get_articles_per_minute():.1f} per minute), skipped {self.num_skipped} exported before, "
+                 f"with {len(self.failures)} failure(s)."]
+        for url, error in self.failures:
+            lines.append(f"  failed {url} ({error})")
+        return '\n'.join(lines)
+
+
+class _XHTMLConverter(HTMLParser):
+    # re-serializes body_html as well-formed XHTML (as EPUB requires), with images pointing at local copies
+    def __init__(self, get_local_image_path: GetLocalImagePath):
+        super().__init__(convert_charrefs=True)
+        self._get_local_image_path = get_local_image_path
+        self._parts: list[str] = []
+        self._open_elements: list[str] = []
+        self._skip_depth = 0  # > 0 while inside a skipped element
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]):
+        if self._skip_depth or tag in _SKIPPED_ELEMENTS:
+            if tag not in _VOID_ELEMENTS:
+                self._skip_depth += 1
+            return
+        # attribute names must be valid and unique in XML
+        attrs = list({name: value for name, value in attrs
+                      if _ATTRIBUTE_NAME_PATTERN.match(name) and not name.startswith('on')}.items())
+        self._close_implicitly_closed_elements(tag)
+        if tag == 'img':
+            attrs = self._convert_image_attrs(attrs)
+        attributes = ''.join(f' {name}="{html.escape(value or "")}"' for name, value in attrs)
+        if tag in _VOID_ELEMENTS:
+            self._parts.append(f'<{tag}{attributes}/>')
+        else:
+            self._parts.append(f'<{tag}{attributes}>')
+            self._open_elements.append(tag)
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, Optional[str]]]):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str):
+        if self._skip_depth:
+            if tag not in _VOID_ELEMENTS:
+                self._skip_depth -= 1
+            return
+        if tag not in self._open_elements:
+            return  # stray end tag
+        # close elements left open inside this one, as a browser would
+        while True:
+            open_element = self._open_elements.pop()
+            self._parts.append(f'</{open_element}>')
+            if open_element == tag:
+                return
+
+    def handle_data(self, data: str):
+        if not self._skip_depth:
+            self._parts.append(html.escape(data, quote=False))
+
+    def get_xhtml(self) -> str:
+        closing_tags = [f'</{open_element}>' for open_element in reversed(self._open_elements)]
+        return ''.join(self._parts + closing_tags)
+
+    def _close_implicitly_closed_elements(self, tag: str):
+        if tag in _BLOCK_ELEMENTS and self._open_elements and self._open_elements[-1] == 'p':
+            self.handle_endtag('p')
+        elif tag == 'li':
+            # an open <li> in the same list, i.e. not outside the nearest list
+            for open_element in reversed(self._open_elements):
+                if open_element in ('ul', 'ol'):
+                    return
+                if open_element == 'li':
+                    self.handle_endtag('li')
+                    return
+
+    def _convert_image_attrs(self, attrs: list[tuple[str, Optional[str]]]) -> list[tuple[str, Optional[str]]]:
+        # srcset and sizes would point the reader back at the remote images
+        attrs = [(name, value) for name, value in attrs if name not in ('srcset', 'sizes')]
+        src = dict(attrs).get('src')
+        local_image_path = self._get_local_image_path(src) if src else None
+        if local_image_path:
+            attrs = [(name, local_image_path if name == 'src' else value) for name, value in attrs]
+        if 'alt' not in dict(attrs):
+            attrs.append(('alt', ''))
+        return attrs
+
+
+class _MarkdownConverter(HTMLParser):
+    # covers the elements Substack's editor produces; anything else is reduced to its text
+    def __init__(self, get_local_image_path: GetLocalImagePath):
+        super().__init__(convert_charrefs=True)
+        self._get_local_image_path = get_local_image_path
+        self._buffers: list[list[str]] = [[]]  # elements whose text is post-processed get a buffer of their own
+        self._links: list[str] = []
+        self._lists: list[list] = []  # [tag, number of items so far] of each open list
+        self._skip_depth = 0
+        self._pre_depth = 0
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]):
+        if self._skip_depth or tag in _SKIPPED_ELEMENTS:
+            if tag not in _VOID_ELEMENTS:
+                self._skip_depth += 1
+            return
+        attributes = dict(attrs)
+        if tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            self._write(f"\n\n{'#' * int(tag[1])} ")
+        elif tag in ('p', 'div', 'figure', 'figcaption', 'table', 'tr'):
+            self._write('\n\n')
+        elif tag == 'br':
+            self._write('  \n')
+        elif tag == 'hr':
+            self._write('\n\n---\n\n')
+        elif tag in ('strong', 'b'):
+            self._write('**')
+        elif tag in ('em', 'i'):
+            self._write('*')
+        elif tag == 'code' and not self._pre_depth:
+            self._write('`')
+        elif tag == 'a':
+            self._links.append(attributes.get('href') or '')
+            self._buffers.append([])
+        elif tag == 'blockquote':
+            self._buffers.append([])
+        elif tag == 'pre':
+            self._pre_depth += 1
+            self._buffers.append([])
+        elif tag in ('ul', 'ol'):
+            self._lists.append([tag, 0])
+            self._write('\n')
+        elif tag == 'li' and self._lists:
+            current_list = self._lists[-1]
+            current_list[1] += 1
+            bullet = f'{current_list[1]}. ' if current_list[0] == 'ol' else '- '
+            self._write(f"\n{'  ' * (len(self._lists) - 1)}{bullet}")
+        elif tag == 'img':
+            src = attributes.get('src') or ''
+            local_image_path = self._get_local_image_path(src) if src else None
+            self._write(f"![{attributes.get('alt') or ''}]({local_image_path or src})")
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, Optional[str]]]):
+        self.handle_starttag(tag, attrs)
+        if tag not in _VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str):
+        if self._skip_depth:
+            if tag not in _VOID_ELEMENTS:
+                self._skip_depth -= 1
+            return
+        if tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'p', 'div', 'figure', 'figcaption', 'table', 'tr'):
+            self._write('\n\n')
+        elif tag in ('strong', 'b'):
+            self._write('**')
+        elif tag in ('em', 'i'):
+            self._write('*')
+        elif tag == 'code' and not self._pre_depth:
+            self._write('`')
+        elif tag == 'a' and self._links:
+            text = ''.join(self._buffers.pop()).strip()
+            href = self._links.pop()
+            self._write(f'[{text}]({href})' if href else text)
+        elif tag == 'blockquote' and len(self._buffers) > 1:
+            text = re.sub(r'\n{3,}', '\n\n', ''.join(self._buffers.pop())).strip()
+            self._write('\n\n' + '\n'.join(f'> {line}'.rstrip() for line in text.split('\n')) + '\n\n')
+        elif tag == 'pre' and self._pre_depth:
+            self._pre_depth -= 1
+            self._write(f"\n\n```\n{''.join(self._buffers.pop()).strip(chr(10))}\n```\n\n")
+        elif tag in ('ul', 'ol') and self._lists:
+            self._lists.pop()
+            self._write('\n\n')
+        elif tag in ('td', 'th'):
+            self._write(' ')
+
+    def handle_data(self, data: str):
+        if self._skip_depth:
+            return
+        self._write(data if self._pre_depth else re.sub(r'\s+', ' ', data))
+
+    def get_markdown(self) -> str:
+        while len(self._buffers) > 1:  # elements left open
+            text = ''.join(self._buffers.pop())
+            self._buffers[-1].append(text)
+        return re.sub(r'\n{3,}', '\n\n', ''.join(self._buffers[0])).strip()
+
+    def _write(self, text: str):
+        self._buffers[-1].append(text)
@@ -0,0 +1,171 @@
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional
+
+from downloaders.pdf_downloader import PDFDownloader
+from utilities.rate_limiter import RateLimiter
+from utilities.timing import stage_timings
+
+RenderJobUrl = str
+RenderJobOutputPath = str
+RenderJob = tuple[RenderJobUrl, RenderJobOutputPath]
+OnRendered = Callable[[RenderJobUrl, RenderJobOutputPath, float], None]  # called with the job and its render time
+
+
+class RenderWorker(PDFDownloader):
+    """
+    A headless PDFDownloader owning its own driver, which renders jobs pulled off RenderPool's queue.
+    Cookies of the driver that logged in are copied over so that every worker shares the same session.
+    """
+
+    def __init__(self, worker_id: int, cookies: list[dict], rate_limiter: RateLimiter):
+        super().__init__(is_headless=True, rate_limiter=rate_limiter, asset_cache_name=f'render-worker-{worker_id}')
+        self.worker_id = worker_id
+        self.set_cookies(cookies)
+
+    def render(self, url: str, output_path_with_filename: str) -> float:
+        """
+        :return: render time in seconds, from navigating to url until the PDF was saved
+        """
+        start_time = time.perf_counter()
+        with stage_timings.span('render_article', url):
+            self._navigate_to(url)
+            self._wait_for_page_to_finish_loading()
+            self._save_current_page_as_pdf_in_output_folder(output_path_with_filename)
+        return time.perf_counter() - start_time
+
+
+class RenderPool:
+    """
+    Renders PDFs using num_workers RenderWorkers in parallel.
+    A worker that fails to start or fails too many jobs in a row is retired; the remaining workers keep
+    pulling from the same queue, so one crashed browser does not take the whole download down with it.
+    """
+    max_consecutive_failures = 3
+
+    def __init__(self, num_workers: int, cookies: list[dict], rate_limiter: RateLimiter,
+                 on_rendered: Optional[OnRendered] = None):
+        assert num_workers >= 1
+        self._num_workers = num_workers
+        self._cookies = cookies
+        self._rate_limiter = rate_limiter  # shared by all workers, so that they are polite as a whole
+        self._on_rendered = on_rendered  # called from the worker's thread after each successful render
+        # bounded, so that jobs are only generated (and their metadata loaded) as fast as workers render them
+        self._jobs: queue.Queue[Optional[RenderJob]] = queue.Queue(maxsize=2 * num_workers)
+        self._report = RenderReport()
+
+    def run(self, jobs: Iterable[RenderJob]) -> 'RenderReport':
+        self._report.start()
+        threads = [threading.Thread(target=self._work, args=(worker_id,), daemon=True)
+                   for worker_id in range(self._num_workers)]
+        for thread in threads:
+            thread.start()
+        for job in jobs:
+            if not self._put_while_any_worker_is_alive(job, threads):
+                break
+        for _ in threads:
+            self._put_while_any_worker_is_alive(None, threads)  # one sentinel per worker
+        for thread in threads:
+            thread.join()
+        self._report.stop(self._drain_unrendered_jobs())
+        return self._report
+
+    def _work(self, worker_id: int):
+        try:
+            worker = RenderWorker(worker_id, self._cookies, self._rate_limiter)
+        except Exception as exc:
+            self._report.record_retired_worker(worker_id, f"failed to start: {exc}")
+            return
+        consecutive_failures = 0
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+                url, output_path_with_filename = job
+                try:
+                    render_time = worker.render(url, output_path_with_filename)
+                    self._report.record_success(worker_id)
+                    if self._on_rendered:
+                        self._on_rendered(url, output_path_with_filename, render_time)
+                    consecutive_failures = 0
+                except Exception as exc:
+                    self._report.record_failure(worker_id, url, exc)
+                    consecutive_failures += 1
+                    if consecutive_failures >= RenderPool.max_consecutive_failures:
+                        self._report.record_retired_worker(worker_id, f"{consecutive_failures} failures in a row")
+                        return
+        finally:
+            worker.shut_down()
+
+    def _put_while_any_worker_is_alive(self, job: Optional[RenderJob], threads: list[threading.Thread]) -> bool:
+        while any(thread.is_alive() for thread in threads):
+            try:
+                self._jobs.put(job, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _drain_unrendered_jobs(self) -> list[RenderJob]:
+        # jobs left in the queue if every worker was retired before the queue was emptied
+        unrendered_jobs = []
+        while not self._jobs.empty():
+            job = self._jobs.get_nowait()
+            if job is not None:
+                unrendered_jobs.append(job)
+        return unrendered_jobs
+
+
+class RenderReport:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._start_time = 0.0
+        self._end_time = 0.0
+        self.num_rendered_by_worker: dict[int, int] = {}
+        self.failures: list[tuple[RenderJobUrl, str]] = []
+        self.retired_workers: dict[int, str] = {}
+        self.unrendered_jobs: list[RenderJob] = []
+
+    def start(self):
+        self._start_time = time.perf_counter()
+
+    def stop(self, unrendered_jobs: list[RenderJob]):
+        self._end_time = time.perf_counter()
+        self.unrendered_jobs = unrendered_jobs
+
+    def record_success(self, worker_id: int):
+        with self._lock:
+            self.num_rendered_by_worker[worker_id] = self.num_rendered_by_worker.get(worker_id, 0) + 1
+
+    def record_failure(self, worker_id: int, url: str, exc: Exception):
+        with self._lock:
+            self.failures.append((url, f"worker {worker_id}: {exc}"))
+
+    def record_retired_worker(self, worker_id: int, reason: str):
+        with self._lock:
+            self.retired_workers[worker_id] = reason
+
+    def get_num_rendered(self) -> int:
+        return sum(self.num_rendered_by_worker.values())
+
+    def get_elapsed_time(self) -> float:
+        return self._end_time - self._start_time
+
+    def get_articles_per_minute(self) -> float:
+        elapsed_time = self.get_elapsed_time()
+        return self.get_num_rendered() / elapsed_time * 60 if elapsed_time > 0 else 0.0
+
+    def __str__(self):
+        lines = [f"Rendered {self.get_num_rendered()} PDF(s) in {self.get_elapsed_time():.1f}s "
+                 f"({self.get_articles_per_minute():.1f} per minute) with {len(self.failures)} failure(s)."]
+        for worker_id, num_rendered in sorted(self.num_rendered_by_worker.items()):
+            lines.append(f"  worker {worker_id}: {num_rendered} PDF(s)")
+        for worker_id, reason in sorted(self.retired_workers.items()):
+            lines.append(f"  worker {worker_id} retired: {reason}")
+        for url, error in self.failures:
+            lines.append(f"  failed {url} ({error})")
+        if self.unrendered_jobs:
+            lines.append(f"  {len(self.unrendered_jobs)} article(s) not rendered as all workers were retired")
+        return '\n'.join(lines)
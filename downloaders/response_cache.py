@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class ResponseCache:
+    """
+    Bodies of responses to GET requests, with the ETag and Last-Modified they came with, so that later runs can
+    request them again conditionally (see CachingHTTPAdapter): a response that has not changed since then costs a
+    304 Not Modified instead of the whole body.
+
+    Stored as SQLite in the output folder, up to max_size bytes of bodies; beyond that, the least recently used
+    responses are evicted. Without requests, so that main.py can import it (for size_environment_variable) without
+    slowing down starting up.
+    """
+    filename = '.response_cache.sqlite3'
+    # set by main.py's --response-cache-size, in MiB, so that it applies to every downloader
+    size_environment_variable = 'SUBSTACK_ARCHIVES_DOWNLOADER_RESPONSE_CACHE_SIZE'
+    default_max_size = 50 * 1024 * 1024  # in bytes
+
+    def __init__(self, output_path: str, max_size: Optional[int] = None):
+        """
+        :param max_size: in bytes; if not given, the size set in the environment, or else default_max_size
+        """
+        self.max_size = max_size if max_size is not None else ResponseCache.get_max_size_from_environment()
+        self._lock = threading.Lock()  # archive pages are requested from several threads at once
+        self._connection = sqlite3.connect(os.path.join(output_path, ResponseCache.filename),
+                                           check_same_thread=False)
+        self._create_table()
+        self._size = self._load_size()
+
+    def _create_table(self):
+        with self._lock, self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    url TEXT PRIMARY KEY,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_type TEXT,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used_at REAL NOT NULL
+                )""")
+            self._connection.execute("""
+                CREATE INDEX IF NOT EXISTS responses_by_last_used_at ON responses (last_used_at)""")
+
+    def _load_size(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def close(self):
+        self._connection.close()
+
+    def get(self, url: str) -> Optional[tuple[Optional[str], Optional[str], Optional[str], bytes]]:
+        """
+        :return: the ETag, Last-Modified, Content-Type and body cached for url, or None if there is none
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "SELECT etag, last_modified, content_type, body FROM responses WHERE url = ?", (url,))
+            return cursor.fetchone()
+
+    def put(self, url: str, etag: Optional[str], last_modified: Optional[str], content_type: Optional[str],
+            body: bytes):
+        if len(body) > self.max_size:
+            return
+        with self._lock, self._connection:
+            cursor = self._connection.execute("SELECT size FROM responses WHERE url = ?", (url,))
+            row = cursor.fetchone()
+            self._connection.execute("""
+                INSERT OR REPLACE INTO responses
+                (url, etag, last_modified, content_type, body, size, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)""",
+                (url, etag, last_modified, content_type, body, len(body), time.time()))
+            self._size += len(body) - (row[0] if row else 0)
+            self._evict_least_recently_used()
+
+    def mark_used(self, url: str):
+        # after a 304, so that the response is the last to be evicted
+        with self._lock, self._connection:
+            self._connection.execute("UPDATE responses SET last_used_at = ? WHERE url = ?", (time.time(), url))
+
+    def _evict_least_recently_used(self):
+        # called with the lock held, within the transaction of put
+        while self._size > self.max_size:
+            url, size = self._connection.execute(
+                "SELECT url, size FROM responses ORDER BY last_used_at LIMIT 1").fetchone()
+            self._connection.execute("DELETE FROM responses WHERE url = ?", (url,))
+            self._size -= size
+
+    @staticmethod
+    def get_max_size_from_environment() -> int:
+        max_size_in_mib = os.environ.get(ResponseCache.size_environment_variable)
+        return int(float(max_size_in_mib) * 1024 * 1024) if max_size_in_mib else ResponseCache.default_max_size
@@ -0,0 +1,115 @@
+import base64
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from typing import Optional
+
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+_SALT_SIZE = 16  # in bytes
+_NONCE_SIZE = 12  # in bytes, as recommended for AES-GCM
+_KEY_SIZE = 32  # in bytes, for AES-256
+# scrypt parameters recommended for interactive logins, see https://www.tarsnap.com/scrypt/scrypt.pdf
+_SCRYPT_N = 2 ** 14
+_SCRYPT_R = 8
+_SCRYPT_P = 1
+
+
+class SessionStore:
+    """
+    Keeps the cookies of a signed-in browser session (and the substack url they belong to) on disk between runs,
+    so that signing in through the browser is only needed once the session has expired.
+
+    Sessions are encrypted with AES-256-GCM under a key derived from the user's password (with scrypt), so the file
+    is useless without it, and each session is keyed by publication and username. Anything that cannot be decrypted
+    (wrong password, tampered or corrupt file) is treated as if there were no saved session.
+    """
+
+    filename = '.session_store.json'
+
+    def __init__(self, output_path: str):
+        self._path_to_file = os.path.join(output_path, self.filename)
+        self._lock = threading.Lock()
+
+    def load(self, root_url: str, username: str, password: str) -> Optional[dict]:
+        """
+        :return: the session saved by save() for root_url and username, or None if there is none
+        (or it cannot be decrypted with password)
+        """
+        with self._lock:
+            encrypted_session = self._read_all().get(SessionStore.get_session_key(root_url, username))
+        if not encrypted_session:
+            return None
+        try:
+            return json.loads(SessionStore.decrypt(encrypted_session, username, password))
+        except (InvalidTag, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, root_url: str, username: str, password: str, substack_url: str, cookies: list[dict]):
+        session = {
+            'substack_url': substack_url,
+            'cookies': cookies,
+            'saved_at': time.time(),
+        }
+        encrypted_session = SessionStore.encrypt(json.dumps(session).encode(), username, password)
+        with self._lock:
+            encrypted_sessions = self._read_all()
+            encrypted_sessions[SessionStore.get_session_key(root_url, username)] = encrypted_session
+            self._write_all(encrypted_sessions)
+
+    def delete(self, root_url: str, username: str):
+        with self._lock:
+            encrypted_sessions = self._read_all()
+            if encrypted_sessions.pop(SessionStore.get_session_key(root_url, username), None):
+                self._write_all(encrypted_sessions)
+
+    def _read_all(self) -> dict[str, dict]:
+        try:
+            with open(self._path_to_file) as f:
+                encrypted_sessions = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+        return encrypted_sessions if isinstance(encrypted_sessions, dict) else {}  # corrupt, if not a dict
+
+    def _write_all(self, encrypted_sessions: dict[str, dict]):
+        # readable by the owner only, and replaced in one go so an interrupted write never loses every session
+        temp_path_to_file = self._path_to_file + '.part'
+        file_descriptor = os.open(temp_path_to_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(file_descriptor, 'w') as f:
+            json.dump(encrypted_sessions, f)
+        os.replace(temp_path_to_file, self._path_to_file)
+
+    @staticmethod
+    def get_session_key(root_url: str, username: str) -> str:
+        # hashed so that the file does not say who reads what
+        return hashlib.sha256(f'{root_url}\n{username.lower()}'.encode()).hexdigest()
+
+    @staticmethod
+    def encrypt(plaintext: bytes, username: str, password: str) -> dict:
+        salt = secrets.token_bytes(_SALT_SIZE)
+        nonce = secrets.token_bytes(_NONCE_SIZE)
+        # the salt is authenticated too, so that it cannot be swapped for another session's
+        ciphertext = AESGCM(SessionStore.derive_key(username, password, salt)).encrypt(nonce, plaintext, salt)
+        return {
+            'salt': base64.b64encode(salt).decode(),
+            'nonce': base64.b64encode(nonce).decode(),
+            'ciphertext': base64.b64encode(ciphertext).decode(),
+        }
+
+    @staticmethod
+    def decrypt(encrypted: dict, username: str, password: str) -> bytes:
+        """
+        :raises InvalidTag: if the session was encrypted with another password, or has been tampered with
+        """
+        salt, nonce, ciphertext = (base64.b64decode(encrypted[field], validate=True)
+                                   for field in ('salt', 'nonce', 'ciphertext'))
+        return AESGCM(SessionStore.derive_key(username, password, salt)).decrypt(nonce, ciphertext, salt)
+
+    @staticmethod
+    def derive_key(username: str, password: str, salt: bytes) -> bytes:
+        return hashlib.scrypt(password.encode(), salt=salt + username.lower().encode(),
+                              n=_SCRYPT_N, r=_SCRYPT_R, p=_SCRYPT_P, dklen=_KEY_SIZE)
@@ -1,19 +1,42 @@
+import bisect
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from http.cookiejar import Cookie
+import itertools
+import math
 import os
+import sys
+import threading
 import time
-from typing import Union
+from typing import Iterable, Iterator, Optional, Union
+from urllib.parse import urlparse
 
 import requests
+from requests.adapters import HTTPAdapter
+from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.common.by import By
 
-from utilities import exceptions, helper
-from downloaders.pdf_downloader import PDFDownloader
+from utilities import exceptions, helper, retry
+from utilities.pipeline import prefetch_in_background
+from utilities.rate_limiter import RateLimiter
+from utilities.timing import stage_timings
+from downloaders.archive_index import ArchiveIndex, ArticleId, ArticleRow
+from downloaders.caching_http_adapter import CachingHTTPAdapter
+from downloaders.download_ledger import DownloadLedger
+from downloaders.pdf_downloader import OnSaved, OutputLayout, PDFDownloader
+from downloaders.post_exporter import PostExporter
+from downloaders.render_pool import RenderJob, RenderPool
+from downloaders.response_cache import ResponseCache
+from downloaders.session_store import SessionStore
 
 ArticlePostDate = int
 ArticleTitle = str
 ArticleTags = str
 ArticleUrl = str
-ArticleTuple = tuple[ArticlePostDate, ArticleTitle, ArticleTags, ArticleUrl]
+ArticleTuple = tuple[ArticlePostDate, ArticleTitle, ArticleTags, ArticleUrl, ArticleId]
+DownloadTask = tuple[ArticleId, ArticleUrl, str]  # article to be rendered elsewhere, and its output path
 
 
 class SubstackArchivesDownloader(PDFDownloader):
@@ -27,33 +50,158 @@ class SubstackArchivesDownloader(PDFDownloader):
         'password_field_xpath': '//input[@name="password"]',
         'submit_button_xpath': '//button[@type="submit"]',
     }
-
-    def __init__(self, input_url: str, is_headless: bool = False):
+    # re-read a few indexed articles when backfilling, in case articles were deleted since the last sync
+    archive_index_backfill_overlap = 5
+    # how far loading article metadata may run ahead of rendering
+    max_prefetched_articles = 50
+    # how many archive API pages may be requested at once
+    max_concurrent_page_requests = 4
+    # for retrying archive API pages which fail transiently (e.g. 429 Too Many Requests)
+    max_page_request_attempts = 6
+    page_request_timeout = 30  # in seconds
+    # posts loaded and converted at once when exporting without a browser
+    num_export_workers = 8
+    # cookie that Substack keeps a signed-in session in, and a cheap API call that fails without one
+    session_cookie_name = 'substack.sid'
+    session_validation_url = 'https://substack.com/api/v1/subscriptions'
+
+    def __init__(self, input_url: str, is_headless: bool = False, num_render_workers: int = 1,
+                 use_archive_index: bool = True, rate_limiter: Optional[RateLimiter] = None,
+                 use_session_store: bool = True, output_layout: Optional[OutputLayout] = None):
         helper.input_is_url(input_url)
-        super().__init__(is_headless)
+        super().__init__(is_headless, rate_limiter, output_layout=output_layout)
+        self._num_render_workers = num_render_workers  # more than 1 renders in parallel using headless workers
+        self._use_archive_index = use_archive_index
         self._url_cache = Cache(input_url)
         self._user_credential = UserCredential()
         self._signed_in = False
         self.session = None
+        # cookies set by responses to the API session, to be copied to the driver before it next navigates
+        self._cookies_pending_for_driver: list[dict] = []
+        self._cookies_pending_for_driver_lock = threading.Lock()
+        self._archive_index = None
+        # which articles have been downloaded, and where to, by id
+        self._download_ledger = DownloadLedger(self._directory.output_path)
+        # signed-in sessions are saved so that later runs can skip signing in through the browser
+        self._session_store = SessionStore(self._directory.output_path) if use_session_store else None
+        # archive pages are revalidated rather than downloaded again when they have not changed since the last run,
+        # unless the response cache is turned off (--response-cache-size 0), in which case it has no file either
+        self._response_cache = ResponseCache(self._directory.output_path) \
+            if ResponseCache.get_max_size_from_environment() > 0 else None
 
     # Methods for managing sign in
     def log_in(self, input_username: str, input_password: str):
-        self._navigate_to_sign_in_page()  # TODO: we can navigate to sign in page without logging in
+        with stage_timings.span('log_in'):
+            self._log_in(input_username, input_password)
+
+    def _log_in(self, input_username: str, input_password: str):
         self._load_credentials(input_username, input_password)
-        self._log_in_using_browser()
+        if self._session_store and self._restore_saved_session():
+            return
+        self._sign_in_using_browser()
 
-    def download_k_most_recent(self, k: int, download_podcasts: bool = False):
+    def ensure_signed_in(self) -> bool:
+        """
+        Checks the signed-in session with a cheap API call, and signs in through the browser again if it has
+        expired, e.g. for a Watcher that keeps one downloader for days.
+        :return: whether it had to sign in again
+        """
+        if self._is_session_signed_in():
+            return False
+        self._signed_in = False
+        if self._session_store:
+            username, _ = self._user_credential.get_credential()
+            self._session_store.delete(self._url_cache.get_root_url(), username)
+        self._driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+        self.session.cookies.clear()
+        with stage_timings.span('log_in'):
+            self._sign_in_using_browser()
+        return True
+
+    def switch_publication(self, input_url: str, substack_url: Optional[str] = None):
+        """
+        Points the downloader at another publication, keeping the signed-in browser and API session,
+        so that several publications can be downloaded without starting a browser and signing in for each.
+        :param substack_url: of the publication (see get_substack_url) if already known, e.g. from switching to it
+        before, as finding it for a custom domain means navigating to it. If it cannot be found, the downloader
+        is left pointed at the publication it was pointed at before.
+        """
+        helper.input_is_url(input_url)
+        previous_url_cache = self._url_cache
+        self._url_cache = Cache(input_url)
+        try:
+            if substack_url:
+                self._url_cache.set_substack_url_from_full_url(substack_url)
+            else:
+                self._resolve_substack_url()
+        except Exception:
+            self._url_cache = previous_url_cache
+            raise
+        if self._archive_index:
+            self._archive_index.close()
+            self._archive_index = None
+
+    # articles are rendered as soon as their archive page is loaded, instead of after every page is loaded
+    # the download_* and export_* methods return the number of articles downloaded or exported
+    def download_k_most_recent(self, k: int, download_podcasts: bool = False) -> int:
         self._check_ready_to_download()
-        self._load_k_articles_into_cache(k, download_podcasts)
-        article_tuples = self._url_cache.get_most_recent_k_article_tuples(k)
-        self._convert_article_tuples_to_pdfs(article_tuples)
+        article_tuples = self._load_k_articles_into_cache(k, download_podcasts)
+        return self._convert_article_tuples_to_pdfs(article_tuples)
 
-    def download_date_range(self, start_date: ArticlePostDate, end_date: ArticlePostDate, download_podcasts: bool = False):
+    def download_date_range(self, start_date: ArticlePostDate, end_date: ArticlePostDate,
+                            download_podcasts: bool = False) -> int:
         self._check_ready_to_download()
         assert start_date <= end_date
-        self._load_articles_in_date_range(start_date, end_date, download_podcasts)
-        article_tuples = self._url_cache.get_article_tuples_by_date_range(start_date, end_date)
-        self._convert_article_tuples_to_pdfs(article_tuples)
+        article_tuples = self._load_articles_in_date_range(start_date, end_date, download_podcasts)
+        return self._convert_article_tuples_to_pdfs(article_tuples)
+
+    # for articles to be rendered somewhere else, e.g. by worker processes (see Coordinator)
+    def get_download_tasks_k_most_recent(self, k: int, download_podcasts: bool = False) -> Iterator[DownloadTask]:
+        self._check_ready_to_download()
+        return self._generate_download_tasks(self._load_k_articles_into_cache(k, download_podcasts))
+
+    def get_download_tasks_date_range(self, start_date: ArticlePostDate, end_date: ArticlePostDate,
+                                      download_podcasts: bool = False) -> Iterator[DownloadTask]:
+        self._check_ready_to_download()
+        assert start_date <= end_date
+        return self._generate_download_tasks(
+            self._load_articles_in_date_range(start_date, end_date, download_podcasts))
+
+    # for polling a publication for new articles (see Watcher): only the first archive page is requested, and the
+    # articles on it which have not been downloaded before are rendered
+    def download_new_articles(self, download_podcasts: bool = False) -> int:
+        self._check_ready_to_download()
+        article_tuples = self._load_first_page_articles_into_cache(download_podcasts)
+        num_rendered = self._convert_article_tuples_to_pdfs(article_tuples)
+        if num_rendered:
+            self._driver.get('about:blank')  # so that the last article's scripts do not keep running until next poll
+        return num_rendered
+
+    def get_substack_url(self) -> str:
+        return self._url_cache.get_substack_url()
+
+    # export_format is one of post_exporter.EXPORT_FORMATS ('html', 'markdown' or 'epub'), loaded over HTTP only
+    def export_k_most_recent(self, k: int, export_format: str, download_podcasts: bool = False) -> int:
+        self._check_ready_to_download()
+        article_tuples = self._load_k_articles_into_cache(k, download_podcasts)
+        return self._convert_article_tuples_to_exports(article_tuples, export_format)
+
+    def export_date_range(self, start_date: ArticlePostDate, end_date: ArticlePostDate, export_format: str,
+                          download_podcasts: bool = False) -> int:
+        self._check_ready_to_download()
+        assert start_date <= end_date
+        article_tuples = self._load_articles_in_date_range(start_date, end_date, download_podcasts)
+        return self._convert_article_tuples_to_exports(article_tuples, export_format)
+
+    def shut_down(self):
+        try:
+            super().shut_down()  # may still be saving PDFs, which are recorded in the ledger and archive index
+        finally:
+            if self._archive_index:
+                self._archive_index.close()
+            self._download_ledger.close()
+            if self._response_cache:
+                self._response_cache.close()
 
     def sign_out(self):
         # TODO
@@ -70,13 +218,33 @@ class SubstackArchivesDownloader(PDFDownloader):
         self._user_credential.set_credential(input_username, input_password)
 
     def _navigate_to_sign_in_page(self):
-        self._driver.get(self._url_cache.get_archive_url())
+        self._navigate_to(self._url_cache.get_archive_url())
         sign_in_button = self._driver.find_element_by_css_selector(self.element_selectors['get_to_sign_in_page_css'])
         sign_in_button.click()
         sign_in_url = self._driver.current_url
         substack_subdomain = SubstackArchivesDownloader.extract_substack_subdomain(sign_in_url)
         self._url_cache.set_substack_url(substack_subdomain)
 
+    def _resolve_substack_url(self):
+        # without signing in again: subdomain.substack.com is its own substack url, and other domains reveal theirs
+        # through the sign-in button if there is one (the archive API is served on custom domains too otherwise)
+        root_url = self._url_cache.get_root_url()
+        host = urlparse(root_url).netloc
+        if host.endswith('.substack.com'):
+            self._url_cache.set_substack_url(host[:-len('.substack.com')])
+            return
+        try:
+            self._navigate_to_sign_in_page()
+        except NoSuchElementException:
+            self._url_cache.set_substack_url_from_full_url(root_url)
+
+    def _sign_in_using_browser(self):
+        self._navigate_to_sign_in_page()  # TODO: we can navigate to sign in page without logging in
+        self._log_in_using_browser()
+        if self._session_store:
+            self._save_session()  # if the session cookie cannot be found, the next run signs in again
+        self._sync_cookies_from_driver_to_session()
+
     def _log_in_using_browser(self):
         loaded_successfully = self._wait_for_element_to_load(By.LINK_TEXT,
                                                              self.element_selectors['log_in_with_password_link_text'])
@@ -100,6 +268,95 @@ class SubstackArchivesDownloader(PDFDownloader):
         submit_button.click()
         self._signed_in = True
 
+    # Methods for reusing a signed-in session across runs
+    def _restore_saved_session(self) -> bool:
+        username, password = self._user_credential.get_credential()
+        root_url = self._url_cache.get_root_url()
+        saved_session = self._session_store.load(root_url, username, password)
+        if not saved_session:
+            return False
+        cookies = [cookie for cookie in saved_session['cookies']
+                   if not SubstackArchivesDownloader.is_cookie_expired(cookie)]
+        self._url_cache.set_substack_url_from_full_url(saved_session['substack_url'])
+        self.set_cookies(cookies)
+        self._add_cookies_to_session(cookies)
+        if not self._is_session_signed_in():  # expired, so sign in again
+            self._session_store.delete(root_url, username)
+            self._driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            self.session.cookies.clear()
+            return False
+        self._signed_in = True
+        return True
+
+    def _save_session(self) -> bool:
+        """
+        :return: whether the session was saved, i.e. whether its session cookie was found
+        """
+        cookies = self._wait_for_session_cookie()
+        if not cookies:
+            return False
+        username, password = self._user_credential.get_credential()
+        self._session_store.save(self._url_cache.get_root_url(), username, password,
+                                 self._url_cache.get_substack_url(), cookies)
+        return True
+
+    def _wait_for_session_cookie(self) -> Optional[list[dict]]:
+        # the session cookie is set once the sign-in form has been submitted and accepted
+        deadline = time.monotonic() + self._wait_time.max_wait_time
+        while time.monotonic() < deadline:
+            cookies = self.get_all_cookies()
+            if any(cookie['name'] == self.session_cookie_name for cookie in cookies):
+                return cookies
+            time.sleep(self._wait_time.get_short_wait_time())
+        return None
+
+    def _is_session_signed_in(self) -> bool:
+        url = self.session_validation_url
+        self._rate_limiter.wait_for_turn(url)
+        start_time = time.monotonic()
+        try:
+            response = self._get_session().get(url, timeout=self.page_request_timeout)
+        except requests.RequestException:
+            return False
+        self._rate_limiter.record_response(url, time.monotonic() - start_time, is_error=retry.is_retryable(response))
+        return response.ok
+
+    # Methods for keeping the cookies of the driver and of the API session in sync
+    # so that API calls are made as the signed-in user, and the browser picks up cookies refreshed by API calls
+    def _navigate_to(self, url: str):
+        self._sync_cookies_from_session_to_driver()
+        super()._navigate_to(url)
+        self._sync_cookies_from_driver_to_session()
+
+    def _sync_cookies_from_driver_to_session(self):
+        if self.session is not None:
+            self._add_cookies_to_session(self.get_all_cookies())
+
+    def _sync_cookies_from_session_to_driver(self):
+        # the driver is not thread-safe, so this is only called from the thread that owns it
+        with self._cookies_pending_for_driver_lock:
+            cookies, self._cookies_pending_for_driver = self._cookies_pending_for_driver, []
+        if cookies:
+            # only the most recent value of each cookie matters
+            self.set_cookies(list({(cookie['name'], cookie['domain'], cookie['path']): cookie
+                                   for cookie in cookies}.values()))
+
+    def _add_cookies_to_session(self, cookies: list[dict]):
+        session = self._get_session()
+        for cookie in cookies:
+            session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain', ''),
+                                path=cookie.get('path', '/'), secure=cookie.get('secure', False),
+                                expires=SubstackArchivesDownloader.get_cookie_expiry(cookie))
+
+    def _queue_cookies_set_by_response(self, response: requests.Response, *args, **kwargs):
+        # response hook, called from whichever thread made the request; redirects may set cookies too
+        cookies = [SubstackArchivesDownloader.convert_session_cookie_to_cookie(session_cookie)
+                   for redirect_or_response in (*response.history, response)
+                   for session_cookie in redirect_or_response.cookies]
+        if cookies:
+            with self._cookies_pending_for_driver_lock:
+                self._cookies_pending_for_driver.extend(cookies)
+
     # Methods for downloading
     def _check_ready_to_download(self):
         if not self._user_credential.is_credential_filled():
@@ -107,15 +364,33 @@ class SubstackArchivesDownloader(PDFDownloader):
         # if not self._signed_in:
         #     raise exceptions.NotSignedIn()
 
+    def _get_session(self) -> requests.Session:
+        # created once, so that cookies restored from a saved session are kept
+        if self.session is None:
+            self.session = requests.Session()
+            # archive pages are requested concurrently, so keep enough connections alive for every request in flight
+            if self._response_cache:
+                http_adapter = CachingHTTPAdapter(self._response_cache, SubstackArchivesDownloader.is_archive_api_url,
+                                                  pool_maxsize=self.max_concurrent_page_requests)
+            else:
+                http_adapter = HTTPAdapter(pool_maxsize=self.max_concurrent_page_requests)
+            self.session.mount('https://', http_adapter)
+            self.session.mount('http://', http_adapter)
+            selenium_user_agent = self._driver.execute_script("return navigator.userAgent")
+            self.session.headers.update({'User-Agent': selenium_user_agent})
+            self.session.hooks['response'].append(self._queue_cookies_set_by_response)
+        return self.session
+
     def _initialize_for_api_call(self):
-        self.session = requests.Session()
-        selenium_user_agent = self._driver.execute_script("return navigator.userAgent")
-        self.session.headers.update({'User-Agent': selenium_user_agent})
+        self._get_session()
+        self._sync_cookies_from_driver_to_session()
         archive_api_url = self._url_cache.get_archive_api_url()
-        response = self.session.get(
-            f"{archive_api_url}?sort=new")
-        if response.status_code != 200:
+        try:
+            self._get_archive_page(0)
+        except exceptions.SubsequentLoadError:
             raise exceptions.InitialLoadError(f"{archive_api_url}")
+        if self._use_archive_index and not self._archive_index:
+            self._archive_index = ArchiveIndex(self._directory.output_path, self._url_cache.get_substack_url())
 
     """
     JSON shape:
@@ -127,91 +402,376 @@ class SubstackArchivesDownloader(PDFDownloader):
     }
     """
 
-    def _load_k_articles_into_cache(self, k: int, download_podcasts: bool):
+    # the _load_* methods are generators, yielding each article as soon as its archive page has been loaded
+    def _load_k_articles_into_cache(self, k: int, download_podcasts: bool) -> Iterator[ArticleTuple]:
         self._initialize_for_api_call()
+        if self._archive_index:
+            yield from self._load_k_articles_from_archive_index(k, download_podcasts)
+            return
         set_of_articles_saved = set()
-        reached_end_of_articles = False
-        while True:
-            num_articles_saved = len(set_of_articles_saved)
-            get_request_url = f"{self._url_cache.get_archive_api_url()}?sort=new&offset={num_articles_saved}"
-            response = self.session.get(f"{get_request_url}")
-            if response.status_code != 200:
-                raise exceptions.SubsequentLoadError(f"{get_request_url}")
-            json_response = response.json()  # automatically converted to list of dict
-            if len(json_response) == 0:
-                break
-            for json_dict in json_response:
-                if json_dict['type'] == "podcast" and not download_podcasts:
+        for archive_page in self._generate_archive_pages():
+            reached_end_of_articles = False
+            for article_row in archive_page:
+                article_type = article_row.type
+                if article_type == "podcast" and not download_podcasts:
                     continue
-                article_id = json_dict['id']
+                article_id = article_row.id
                 if article_id in set_of_articles_saved:
                     reached_end_of_articles = True
                     continue
-                post_date = json_dict['post_date']
-                converted_date = SubstackArchivesDownloader.convert_json_date_to_yyyymmdd(post_date)
-                title = json_dict['title']
-                tags = []
-                for tag in json_dict['postTags']:
-                    tags.append(tag['slug'])                    
-                converted_tags = SubstackArchivesDownloader.convert_tags_to_string(tags)
-                canonical_url = json_dict['canonical_url']
-                self._url_cache.append_article_tuple(converted_date, title, converted_tags, canonical_url)
+                yield self._load_article_tuple_into_cache(
+                    SubstackArchivesDownloader.convert_article_row_to_article_tuple(article_row))
                 set_of_articles_saved.add(article_id)
-                num_articles_saved += 1
-                if num_articles_saved == k:
+                if len(set_of_articles_saved) == k:
                     return
-            if len(set_of_articles_saved) >= k or reached_end_of_articles:
+            if reached_end_of_articles:
                 break
             # TODO add random delay to make it more human-like?
 
-    def _load_articles_in_date_range(self, start_date: int, end_date: int, download_podcasts: bool):
+    def _load_first_page_articles_into_cache(self, download_podcasts: bool) -> Iterator[ArticleTuple]:
+        # without _initialize_for_api_call, which would request the first page twice, and without the archive index,
+        # which must not be left with a gap when more than a page of articles are new (the next run syncs it instead)
+        self._get_session()
+        self._sync_cookies_from_driver_to_session()
+        for article_row in self._get_archive_page(0):
+            article_type = article_row.type
+            if article_type == "podcast" and not download_podcasts:
+                continue
+            yield self._load_article_tuple_into_cache(
+                SubstackArchivesDownloader.convert_article_row_to_article_tuple(article_row))
+
+    def _load_articles_in_date_range(self, start_date: int, end_date: int,
+                                     download_podcasts: bool) -> Iterator[ArticleTuple]:
         self._initialize_for_api_call()
-        num_articles_loaded = 0
-        while True:
-            get_request_url = f"{self._url_cache.get_archive_api_url()}?sort=new&offset={num_articles_loaded}"
-            response = self.session.get(f"{get_request_url}")
-            if response.status_code != 200:
-                raise exceptions.SubsequentLoadError(f"{get_request_url}")
-            json_response = response.json()  # automatically converted to list of dict
-            if len(json_response) == 0:  # reached the end
-                break
-            num_articles_loaded += len(json_response)
-            earliest_article_date = SubstackArchivesDownloader.convert_json_date_to_yyyymmdd(
-                json_response[-1]['post_date'])
-            if earliest_article_date > end_date:
+        if self._archive_index:
+            yield from self._load_articles_in_date_range_from_archive_index(start_date, end_date, download_podcasts)
+            return
+        for _, archive_page in self._generate_archive_pages_in_date_range(start_date, end_date):
+            yield from self._load_archive_page_articles_in_date_range(archive_page, start_date, end_date,
+                                                                      download_podcasts)
+            # TODO add random delay to make it more human-like?
+
+    def _generate_archive_pages_in_date_range(self, start_date: int,
+                                              end_date: int) -> Iterator[tuple[int, list[ArticleRow]]]:
+        """
+        Gallops to the first page on or before end_date (see _find_first_page_on_or_before), then streams pages
+        until one that reaches back before start_date.
+        :return: generator of the offset of each page, and the page
+        """
+        offset, first_archive_page = self._find_first_page_on_or_before(end_date)
+        if len(first_archive_page) == 0:  # empty page means we reached the end
+            return
+        archive_pages = itertools.chain([first_archive_page], self._generate_archive_pages(
+            offset + len(first_archive_page), page_size=len(first_archive_page)))
+        for archive_page in archive_pages:
+            yield offset, archive_page
+            offset += len(archive_page)
+            _, earliest_article_date = self._get_archive_page_dates(archive_page)
+            if earliest_article_date < start_date:
+                return
+
+    def _load_archive_page_articles_in_date_range(self, archive_page: list[ArticleRow], start_date: int,
+                                                  end_date: int, download_podcasts: bool) -> Iterator[ArticleTuple]:
+        for article_row in archive_page:
+            article_type = article_row.type
+            if article_type == "podcast" and not download_podcasts:
+                continue
+            article_tuple = SubstackArchivesDownloader.convert_article_row_to_article_tuple(article_row)
+            converted_date, *_ = article_tuple
+            if start_date <= converted_date <= end_date:
+                yield self._load_article_tuple_into_cache(article_tuple)
+
+    def _load_k_articles_from_archive_index(self, k: int, download_podcasts: bool) -> Iterator[ArticleTuple]:
+        if self._archive_index.get_num_articles() != 0:
+            self._index_articles_newer_than_most_recent_indexed_article()
+        indexed_article_tuples = self._archive_index.get_most_recent_k_articles(k, download_podcasts)
+        for article_tuple in indexed_article_tuples:
+            yield self._load_article_tuple_into_cache(article_tuple)
+        num_articles_loaded = len(indexed_article_tuples)
+        if num_articles_loaded == k or self._archive_index.is_complete():
+            return
+        for article_row in self._backfill_archive_index():
+            article_type = article_row.type
+            if article_type == "podcast" and not download_podcasts:
                 continue
-            most_recent_article_date = SubstackArchivesDownloader.convert_json_date_to_yyyymmdd(
-                json_response[0]['post_date'])
-            if most_recent_article_date < start_date:
+            yield self._load_article_tuple_into_cache(
+                SubstackArchivesDownloader.convert_article_row_to_article_tuple(article_row))
+            num_articles_loaded += 1
+            if num_articles_loaded == k:
+                return
+
+    def _load_articles_in_date_range_from_archive_index(self, start_date: int, end_date: int,
+                                                         download_podcasts: bool) -> Iterator[ArticleTuple]:
+        if self._archive_index.get_num_articles() != 0:
+            self._index_articles_newer_than_most_recent_indexed_article()
+        for article_tuple in self._archive_index.get_articles_by_date_range(start_date, end_date, download_podcasts):
+            yield self._load_article_tuple_into_cache(article_tuple)
+        earliest_post_date = self._archive_index.get_earliest_post_date()
+        if self._archive_index.is_complete() or (earliest_post_date is not None and earliest_post_date < start_date):
+            return
+        if earliest_post_date is None or earliest_post_date > end_date:
+            yield from self._load_articles_older_than_archive_index(start_date, end_date, download_podcasts)
+            return
+        # the index reaches back into the range, so backfilling from its earliest article reaches the rest of it
+        for article_row in self._backfill_archive_index():
+            article_tuple = SubstackArchivesDownloader.convert_article_row_to_article_tuple(article_row)
+            converted_date, *_ = article_tuple
+            if converted_date < start_date:
+                return
+            article_type = article_row.type
+            if converted_date > end_date or (article_type == "podcast" and not download_podcasts):
+                continue
+            yield self._load_article_tuple_into_cache(article_tuple)
+
+    def _load_articles_older_than_archive_index(self, start_date: int, end_date: int,
+                                                download_podcasts: bool) -> Iterator[ArticleTuple]:
+        # galloped to rather than backfilled, which would request every page between the index and the range.
+        # Pages are only indexed if they carry on from the indexed articles: the index must stay without gaps (see
+        # ArchiveIndex), and pages further back are not known to be contiguous with it
+        num_contiguous_articles = self._archive_index.get_num_articles()
+        for offset, archive_page in self._generate_archive_pages_in_date_range(start_date, end_date):
+            if offset <= num_contiguous_articles:
+                self._archive_index.add_articles(archive_page)
+                num_contiguous_articles = max(num_contiguous_articles, offset + len(archive_page))
+            yield from self._load_archive_page_articles_in_date_range(archive_page, start_date, end_date,
+                                                                      download_podcasts)
+
+    def _load_article_tuple_into_cache(self, article_tuple: ArticleTuple) -> ArticleTuple:
+        self._url_cache.append_article_tuple(*article_tuple)
+        return article_tuple
+
+    def _get_archive_page(self, offset: int) -> list[ArticleRow]:
+        # a page that fails transiently is retried at the same offset instead of throwing away the articles loaded so far
+        json_response = self._get_json(f"{self._url_cache.get_archive_api_url()}?sort=new&offset={offset}",
+                                       'archive_page')
+        # projected onto article rows as soon as it arrives, so that the rest of each post's JSON (description,
+        # cover image, reactions, ...) is not kept alive by pages in flight or being iterated over
+        return [SubstackArchivesDownloader.convert_json_dict_to_article_row(json_dict) for json_dict in json_response]
+
+    def get_post(self, article_url: ArticleUrl) -> dict:
+        """
+        Loads a post over HTTP using the signed-in API session, which is much cheaper than navigating to it.
+        :return: the post's metadata, including body_html (the full body if the user has access to it)
+        """
+        self._get_session()
+        return self._get_json(self._url_cache.get_post_api_url(
+            SubstackArchivesDownloader.extract_post_slug(article_url)), 'load_post')
+
+    def _get_json(self, get_request_url: str, stage: str):
+        """
+        Retries throttled (429) and server (5xx) errors and dropped connections with exponential backoff,
+        honouring Retry-After.
+        :param stage: timed as, including retries
+        """
+        with stage_timings.span(stage, get_request_url) as span:
+            json_response, num_bytes = self._get_json_with_retries(get_request_url)
+            span.add_bytes(num_bytes)
+            return json_response
+
+    def _get_json_with_retries(self, get_request_url: str) -> tuple[Union[list, dict], int]:
+        for attempt in range(self.max_page_request_attempts):
+            with stage_timings.span('wait_for_rate_limit', get_request_url):
+                self._rate_limiter.wait_for_turn(get_request_url)
+            try:
+                response = self.session.get(f"{get_request_url}", timeout=self.page_request_timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self._rate_limiter.record_response(get_request_url, self.page_request_timeout, is_error=True)
+                time.sleep(retry.get_backoff_time(attempt))
+                continue
+            self._rate_limiter.record_response(get_request_url, response.elapsed.total_seconds(),
+                                               is_error=response.status_code != 200)
+            if response.status_code == 200:
+                # automatically converted to list of dict (or dict); a page served from the response cache cost no bytes
+                num_bytes = 0 if CachingHTTPAdapter.is_from_cache(response) else len(response.content)
+                return response.json(), num_bytes
+            if not retry.is_retryable(response):
                 break
-            # if code reaches here, then we have articles in the date range
-            for json_dict in json_response:
-                if json_dict['type'] == "podcast" and not download_podcasts:
-                    continue
-                post_date = json_dict['post_date']
-                converted_date = SubstackArchivesDownloader.convert_json_date_to_yyyymmdd(post_date)
-                if start_date <= converted_date <= end_date:
-                    title = json_dict['title']
-                    tags = []
-                    for tag in json_dict['postTags']:
-                        tags.append(tag['slug'])                    
-                    converted_tags = SubstackArchivesDownloader.convert_tags_to_string(tags)
-                    canonical_url = json_dict['canonical_url']
-                    self._url_cache.append_article_tuple(converted_date, title, converted_tags, canonical_url)
-            # TODO add random delay to make it more human-like?
+            retry_after = retry.get_retry_after(response)
+            if retry_after is not None:
+                self._rate_limiter.pause(get_request_url, retry_after)  # pauses every other request to the host too
+            else:
+                time.sleep(retry.get_backoff_time(attempt))
+        raise exceptions.SubsequentLoadError(f"{get_request_url}")
+
+    def _generate_archive_pages(self, start_offset: int = 0,
+                                page_size: Optional[int] = None) -> Iterator[list[ArticleRow]]:
+        """
+        Yields archive pages in order, starting from start_offset, until the end of the archive or until the caller
+        stops iterating. Subsequent pages are requested concurrently (up to max_concurrent_page_requests at once)
+        while the caller processes the current one. The number of requests in flight starts at 1 and doubles with
+        every page consumed, so a caller that stops after a page or two does not pay for many speculative requests.
+        :param page_size: if not given, it is taken to be the size of the first page, which is then loaded on its own
+        """
+        next_offset = start_offset
+        if page_size is None:
+            first_archive_page = self._get_archive_page(start_offset)
+            if len(first_archive_page) == 0:
+                return
+            yield first_archive_page
+            page_size = len(first_archive_page)
+            next_offset += page_size
+        num_requests_in_flight = 1
+        pending_archive_pages: deque[Future] = deque()
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrent_page_requests)
+        try:
+            while True:
+                while len(pending_archive_pages) < num_requests_in_flight:
+                    pending_archive_pages.append(executor.submit(self._get_archive_page, next_offset))
+                    next_offset += page_size
+                archive_page = pending_archive_pages.popleft().result()
+                if len(archive_page) == 0:
+                    return
+                yield archive_page
+                if len(archive_page) < page_size:  # a page that is not full is the last page
+                    return
+                num_requests_in_flight = min(2 * num_requests_in_flight, self.max_concurrent_page_requests)
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)  # stop speculative fetching
 
-    def _convert_article_tuples_to_pdfs(self, tuples: list[ArticleTuple]):
+    def _find_first_page_on_or_before(self, date: ArticlePostDate) -> tuple[int, list[ArticleRow]]:
+        """
+        The archive API is sorted from most to least recent, so instead of walking every page from offset 0,
+        gallop forward (doubling the step) until we overshoot date, then binary search between the last page
+        that was too recent and the overshoot. This takes O(log n) requests instead of O(n).
+        :return: offset to start streaming from and the page at that offset (empty if there is nothing left)
+        """
+        first_page = self._get_archive_page(0)
+        if not first_page or self._get_archive_page_dates(first_page)[1] <= date:
+            return 0, first_page
+        page_size = len(first_page)
+        lo = page_size  # every article before offset lo is more recent than date
+        hi = None  # the article at offset hi (if any) is on or before date
+        probed_pages = {}
+        step = page_size
+        while hi is None:  # gallop
+            offset = lo + step - page_size
+            page = probed_pages[offset] = self._get_archive_page(offset)
+            if not page or self._get_archive_page_dates(page)[0] <= date:
+                hi = offset
+            elif self._get_archive_page_dates(page)[1] > date:
+                lo = offset + len(page)
+                step *= 2
+            else:  # page straddles date
+                return offset, page
+        while hi - lo > page_size:  # binary search
+            offset = (lo + hi) // 2
+            page = probed_pages[offset] = self._get_archive_page(offset)
+            if not page or self._get_archive_page_dates(page)[0] <= date:
+                hi = offset
+            elif self._get_archive_page_dates(page)[1] > date:
+                lo = offset + len(page)
+            else:
+                return offset, page
+        # at most one page separates lo and hi; the articles in it are filtered by date while streaming
+        return lo, probed_pages[lo] if lo in probed_pages else self._get_archive_page(lo)
+
+    # Methods for keeping the archive index in sync with the archive API
+    def _index_articles_newer_than_most_recent_indexed_article(self):
+        # new articles are only indexed once the first known article is reached, all at once: indexing them page by
+        # page would leave a gap behind the indexed ones if the run stopped half way, which no later sync would fill
+        new_article_rows = []
+        for archive_page in self._generate_archive_pages():
+            for article_row in archive_page:
+                if self._archive_index.has_article(article_row.id):
+                    self._archive_index.add_articles(new_article_rows)
+                    return  # reached the first known article
+                new_article_rows.append(article_row)
+        self._archive_index.add_articles(new_article_rows)
+
+    def _backfill_archive_index(self) -> Iterator[ArticleRow]:
+        """
+        Indexes articles older than the earliest indexed article, one page at a time, until the caller stops
+        iterating or the end of the archive is reached.
+        :return: generator of newly indexed articles, from most to least recent
+        """
+        offset = max(0, self._archive_index.get_num_articles() - self.archive_index_backfill_overlap)
+        for archive_page in self._generate_archive_pages(offset):
+            new_article_rows = [article_row for article_row in archive_page
+                                if not self._archive_index.has_article(article_row.id)]
+            self._archive_index.add_articles(new_article_rows)
+            yield from new_article_rows
+        self._archive_index.set_complete()
+
+    @staticmethod
+    def _get_archive_page_dates(archive_page: list[ArticleRow]) -> tuple[ArticlePostDate, ArticlePostDate]:
+        most_recent_article_date = archive_page[0].post_date
+        earliest_article_date = archive_page[-1].post_date
+        return most_recent_article_date, earliest_article_date
+
+    def _convert_article_tuples_to_pdfs(self, tuples: Iterable[ArticleTuple]) -> int:
+        if self._num_render_workers > 1:
+            # RenderPool's queue is bounded, so loading articles (in this thread) is already overlapped with rendering
+            return self._convert_article_tuples_to_pdfs_in_parallel(tuples)
+        tuples = prefetch_in_background(tuples, self.max_prefetched_articles)
+        num_rendered = 0
+        for url, filename_path_output in self._generate_render_jobs(tuples):
+            on_saved = self._get_on_saved(url, time.perf_counter())
+            with stage_timings.span('render_article', url):
+                self._navigate_to(url)  # paced by the rate limiter
+                self._wait_for_page_to_finish_loading()
+                self._save_current_page_as_pdf_in_output_folder(filename_path_output, on_saved)
+            num_rendered += 1
+        self.wait_for_pending_pdfs()
+        return num_rendered
+
+    def _convert_article_tuples_to_pdfs_in_parallel(self, tuples: Iterable[ArticleTuple]) -> int:
+        self._sync_cookies_from_session_to_driver()
+        render_pool = RenderPool(self._num_render_workers, self.get_all_cookies(), self._rate_limiter,
+                                 on_rendered=self._mark_downloaded)
+        render_report = render_pool.run(self._generate_render_jobs(tuples))
+        print(render_report)
+        return render_report.get_num_rendered()
+
+    def _convert_article_tuples_to_exports(self, tuples: Iterable[ArticleTuple], export_format: str) -> int:
+        post_exporter = PostExporter(self._get_session(), self.get_post, self._directory.output_path, export_format,
+                                     self._url_cache.get_substack_url(), self.num_export_workers)
+        export_report = post_exporter.run(tuples)
+        print(export_report)
+        return export_report.num_exported
+
+    def _generate_render_jobs(self, tuples: Iterable[ArticleTuple]) -> Iterator[RenderJob]:
+        claimed_output_paths: set[str] = set()  # by the jobs of this run, which are not in the ledger yet
         for article_tuple in tuples:
-            date, title, tags, url = article_tuple
-            filename_output = f'{date} - {tags}{helper.clean_filename(title)}.pdf'
-            filename_path_output = os.path.join(self._directory.output_path, filename_output)
-            if os.path.isfile(filename_path_output):
-                # skip URLs that have been previously downloaded
-                # might lead to bugs if similar title + same publication date (quite unlikely)
+            date, title, tags, url, article_id = article_tuple
+            # skip articles that have been previously downloaded, even if their title or tags have changed since
+            # (but not if their PDF has since been deleted or changed)
+            if self._download_ledger.is_intact(article_id):
                 continue
-            self._driver.get(url)
-            self._save_current_page_as_pdf_in_output_folder(filename_path_output)
-            time.sleep(3)
+            filename_path_output = self._get_pdf_output_path(article_tuple)
+            owner_article_id = self._download_ledger.get_article_id(filename_path_output)
+            if owner_article_id is None and filename_path_output not in claimed_output_paths \
+                    and os.path.isfile(filename_path_output):
+                # downloaded before the ledger was kept
+                self._download_ledger.record(article_id, url, filename_path_output, render_time=None)
+                continue
+            if owner_article_id not in (None, article_id) or filename_path_output in claimed_output_paths:
+                # another article has the same date, tags and title (once cleaned), so tell them apart by id
+                filename_path_output = self._get_pdf_output_path(article_tuple, with_id=True)
+            claimed_output_paths.add(filename_path_output)
+            yield url, filename_path_output
+
+    def _generate_download_tasks(self, tuples: Iterable[ArticleTuple]) -> Iterator[DownloadTask]:
+        for url, filename_path_output in self._generate_render_jobs(tuples):
+            _, _, _, _, article_id = self._url_cache.get_article_tuple_by_url(url)
+            yield article_id, url, filename_path_output
+
+    def _get_pdf_output_path(self, article_tuple: ArticleTuple, with_id: bool = False) -> str:
+        date, title, tags, url, article_id = article_tuple
+        id_suffix = f' ({article_id})' if with_id else ''
+        filename_output = f'{date} - {tags}{helper.clean_filename(title)}{id_suffix}.pdf'
+        return self._directory.get_output_path_with_filename(url, date, filename_output)
+
+    def _get_on_saved(self, url: ArticleUrl, start_time: float) -> OnSaved:
+        def on_saved(output_path_with_filename: str):
+            self._mark_downloaded(url, output_path_with_filename, time.perf_counter() - start_time)
+        return on_saved
+
+    def _mark_downloaded(self, url: ArticleUrl, output_path_with_filename: str, render_time: float):
+        article_tuple = self._url_cache.get_article_tuple_by_url(url)
+        if article_tuple:
+            _, _, _, _, article_id = article_tuple
+            with stage_timings.span('record_download', url):  # hashes the PDF, so reads it back from disk
+                self._download_ledger.record(article_id, url, output_path_with_filename, render_time)
 
     @staticmethod
     def extract_substack_subdomain(sign_in_url: str):
@@ -221,8 +781,71 @@ class SubstackArchivesDownloader(PDFDownloader):
 
     @staticmethod
     def convert_json_date_to_yyyymmdd(post_date: str) -> int:
+        # e.g. '2021-10-12T14:52:58.738Z' -> 20211012, by slicing, which is many times faster than strptime
+        if len(post_date) >= 10 and post_date[4] == post_date[7] == '-' and post_date[:4].isdigit() \
+                and post_date[5:7].isdigit() and post_date[8:10].isdigit():
+            return int(post_date[:4]) * 10000 + int(post_date[5:7]) * 100 + int(post_date[8:10])
         return int(datetime.strptime(post_date, '%Y-%m-%dT%H:%M:%S.%fZ').strftime('%Y%m%d'))
 
+    @staticmethod
+    def convert_json_dict_to_article_row(json_dict: dict) -> ArticleRow:
+        post_date = json_dict['post_date']
+        tag_slugs = tuple(tag['slug'] for tag in json_dict['postTags'])
+        return ArticleRow(json_dict['id'], post_date,
+                          SubstackArchivesDownloader.convert_json_date_to_yyyymmdd(post_date), json_dict['title'],
+                          SubstackArchivesDownloader.convert_tag_slugs_to_string(tag_slugs),
+                          sys.intern(json_dict['type']), json_dict['canonical_url'])
+
+    @staticmethod
+    def convert_article_row_to_article_tuple(article_row: ArticleRow) -> ArticleTuple:
+        article_id, _, post_date, title, tags, _, canonical_url = article_row
+        return post_date, title, tags, canonical_url, article_id
+
+    @staticmethod
+    def is_archive_api_url(url: str) -> bool:
+        return urlparse(url).path.rstrip('/').endswith('/api/v1/archive')
+
+    @staticmethod
+    def extract_post_slug(article_url: ArticleUrl) -> str:
+        # e.g. https://newsletter.domain.com/p/slug?utm_source=... -> slug
+        path = urlparse(article_url).path.rstrip('/')
+        return path.rsplit('/', 1)[-1]
+
+    @staticmethod
+    def convert_session_cookie_to_cookie(session_cookie: Cookie) -> dict:
+        # in the shape of Network.getAllCookies, so that it can be passed to set_cookies
+        cookie = {
+            'name': session_cookie.name,
+            'value': session_cookie.value,
+            'domain': session_cookie.domain,
+            'path': session_cookie.path,
+            'secure': session_cookie.secure,
+            'httpOnly': session_cookie.has_nonstandard_attr('HttpOnly'),
+            'session': session_cookie.expires is None,
+        }
+        if session_cookie.expires is not None:
+            cookie['expires'] = session_cookie.expires
+        return cookie
+
+    @staticmethod
+    def is_cookie_expired(cookie: dict) -> bool:
+        expiry = SubstackArchivesDownloader.get_cookie_expiry(cookie)
+        return expiry is not None and expiry <= time.time()
+
+    @staticmethod
+    def get_cookie_expiry(cookie: dict) -> Optional[int]:
+        # as returned by Network.getAllCookies: session cookies have no expiry (-1)
+        if cookie.get('session', False) or cookie.get('expires', -1) <= 0:
+            return None
+        return int(cookie['expires'])
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def convert_tag_slugs_to_string(tag_slugs: tuple[str, ...]) -> ArticleTags:
+        # most articles of a publication share a few combinations of tags, so each is joined once and its string
+        # shared by every article that has it
+        return sys.intern(SubstackArchivesDownloader.convert_tags_to_string(list(tag_slugs)))
+
     @staticmethod
     def convert_tags_to_string(tags: []):
         if tags:
@@ -230,14 +853,43 @@ class SubstackArchivesDownloader(PDFDownloader):
         else:
             return ''
 
+
+class ArticleRecord:
+    """
+    An article as kept by Cache: the fields of an ArticleTuple in __slots__, so that no per-article dict is
+    allocated, with tags interned so that articles with the same tags share one string, even when they were
+    loaded from the archive index (where each row comes with its own copy).
+    """
+    __slots__ = ('date', 'title', 'tags', 'url', 'article_id')
+
+    def __init__(self, date: ArticlePostDate, title: ArticleTitle, tags: ArticleTags, url: ArticleUrl,
+                 article_id: ArticleId):
+        self.date = date
+        self.title = title
+        self.tags = sys.intern(tags)
+        self.url = url
+        self.article_id = article_id
+
+    def get_sort_key(self) -> tuple[int, int]:
+        return Cache.get_sort_key(self.date, self.article_id)
+
+    def convert_to_article_tuple(self) -> ArticleTuple:
+        return self.date, self.title, self.tags, self.url, self.article_id
+
+
 class Cache:
     def __init__(self, validated_url: str):
         self._root_url = validated_url if validated_url[-1] != '/' else validated_url[:-1]
         self._archive_url = self._root_url + '/archive'
-        self._article_tuples: list[ArticleTuple] = []
+        self._article_records: list[ArticleRecord] = []
+        self._article_records_by_id: dict[ArticleId, ArticleRecord] = {}
+        self._article_records_by_url: dict[ArticleUrl, ArticleRecord] = {}
         self._substack_url = None
 
-    # Getter for archive url
+    # Getters for root url and archive url
+    def get_root_url(self):
+        return self._root_url
+
     def get_archive_url(self):
         return self._archive_url
 
@@ -245,6 +897,10 @@ class Cache:
     def set_substack_url(self, subdomain: str):
         self._substack_url = f"https://{subdomain}.substack.com"
 
+    def set_substack_url_from_full_url(self, substack_url: str):
+        # e.g. as saved with a signed-in session
+        self._substack_url = substack_url
+
     def get_substack_url(self):
         return self._substack_url
 
@@ -253,54 +909,73 @@ class Cache:
             raise exceptions.SubstackUrlNotSet()
         return self._substack_url + '/api/v1/archive'
 
+    def get_post_api_url(self, slug: str):
+        if not self._substack_url:
+            raise exceptions.SubstackUrlNotSet()
+        return self._substack_url + f'/api/v1/posts/{slug}'
+
     # Setters and getters for article tuples
-    # TODO a self-balancing tree would be more efficient O(log n) for managing article_tuples
-    # for simplicity, we are just linear searching for everything  O(n) time (minimal difference for small n...)
-    def append_article_tuple(self, date: ArticlePostDate, title: ArticleTitle, tags: ArticleTags, url: ArticleUrl):
-        # for assumption that self.article_tuples_cache is sorted from ith to jth most recent
-        # need to append article in reverse chronological order (technically can sort also...but meh)
-        self._article_tuples.append((date, title, tags, url))
+    # articles are kept as ArticleRecords, sorted from most to least recent (ties broken by id) regardless of
+    # insertion order so that date lookups are a binary search O(log n) (on sort keys computed as needed, rather
+    # than kept alongside), and indexed by id and url so that duplicates are detected in O(1)
+    def append_article_tuple(self, date: ArticlePostDate, title: ArticleTitle, tags: ArticleTags, url: ArticleUrl,
+                             article_id: ArticleId) -> bool:
+        """
+        :return: False if the article is already in the cache (same id or same url), True otherwise
+        """
+        if article_id in self._article_records_by_id or url in self._article_records_by_url:
+            return False
+        article_record = ArticleRecord(date, title, tags, url, article_id)
+        idx = bisect.bisect_left(self._article_records, article_record.get_sort_key(), key=ArticleRecord.get_sort_key)
+        self._article_records.insert(idx, article_record)
+        self._article_records_by_id[article_id] = article_record
+        self._article_records_by_url[url] = article_record
+        return True
 
     def get_cache_size(self) -> int:
-        return len(self._article_tuples)
+        return len(self._article_records)
 
     def is_cache_empty(self) -> bool:
-        return len(self._article_tuples) == 0
+        return len(self._article_records) == 0
+
+    def get_article_tuple_by_id(self, article_id: ArticleId) -> Optional[ArticleTuple]:
+        article_record = self._article_records_by_id.get(article_id)
+        return article_record.convert_to_article_tuple() if article_record else None
+
+    def get_article_tuple_by_url(self, url: ArticleUrl) -> Optional[ArticleTuple]:
+        article_record = self._article_records_by_url.get(url)
+        return article_record.convert_to_article_tuple() if article_record else None
 
     def get_article_tuples_by_date(self, date: int) -> list[ArticleTuple]:
-        output = []
-        for article in self._article_tuples:
-            article_date, _, _, _ = article
-            if date == article_date:
-                output.append(article)
-        return output
+        return self.get_article_tuples_by_date_range(date, date)
 
     def get_article_tuples_by_date_range(self, start_date: ArticlePostDate,
                                          end_date: ArticlePostDate) -> list[ArticleTuple]:
         assert end_date >= start_date
-        output = []
-        # TODO: use binary search to find start_date faster?
-        for article in self._article_tuples:
-            article_date, _, _, _ = article
-            if start_date <= article_date <= end_date:
-                output.append(article)
-        return output
+        start_idx = bisect.bisect_left(self._article_records, (-end_date, -math.inf), key=ArticleRecord.get_sort_key)
+        end_idx = bisect.bisect_right(self._article_records, (-start_date, math.inf), key=ArticleRecord.get_sort_key)
+        return [article_record.convert_to_article_tuple()
+                for article_record in self._article_records[start_idx:end_idx]]
 
     def get_article_tuple_by_idx(self, idx: int) -> ArticleTuple:
-        return self._article_tuples[idx]
+        return self._article_records[idx].convert_to_article_tuple()
 
     def get_latest_article_tuple(self) -> ArticleTuple:
-        return self._article_tuples[0]
+        return self._article_records[0].convert_to_article_tuple()
 
     def get_earliest_article_tuple(self) -> ArticleTuple:
         # if self.get_cache_size() == 0:
         #     return None
-        return self._article_tuples[-1]
+        return self._article_records[-1].convert_to_article_tuple()
 
     def get_most_recent_k_article_tuples(self, k: int) -> list[ArticleTuple]:
-        # assumption: self.article_tuples_cache is sorted from ith to jth most recent
         assert k >= 1
-        return self._article_tuples[:k]
+        return [article_record.convert_to_article_tuple() for article_record in self._article_records[:k]]
+
+    @staticmethod
+    def get_sort_key(date: ArticlePostDate, article_id: ArticleId) -> tuple[int, int]:
+        # negated so that ascending order of sort keys is from most to least recent
+        return -date, -article_id
 
 
 class UserCredential:
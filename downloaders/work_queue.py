@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import time
+from typing import Optional
+
+WorkItemArticleId = int
+WorkItemUrl = str
+WorkItemOutputPath = str
+WorkItemPublication = str
+# (article id, url, output path) as enqueued; the publication is given for a whole batch
+WorkItemSpec = tuple[WorkItemArticleId, WorkItemUrl, WorkItemOutputPath]
+WorkItem = tuple[int, WorkItemArticleId, WorkItemPublication, WorkItemUrl, WorkItemOutputPath, int]  # + id, attempts
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class WorkQueue:
+    """
+    Durable queue of articles to render, stored as SQLite in the output folder so that it survives crashes and
+    reboots, and shared by worker processes (each with its own connection).
+
+    A worker leases an item for visibility_timeout seconds. If it does not complete or fail the item within that
+    time (e.g. because its process or browser crashed), the item becomes visible to other workers again.
+    Items are retried until they have been attempted max_attempts times, then they are marked as failed.
+    Completed items stay in the queue, so enqueueing the same article again does not render it again.
+    No two articles in the queue share an output path, even if they are enqueued from different publications.
+    """
+    filename = '.work_queue.sqlite3'
+
+    def __init__(self, output_path: str, max_attempts: int = 3):
+        self._max_attempts = max_attempts
+        # worker processes wait for each other's transactions (they are short) rather than fail
+        self._connection = sqlite3.connect(os.path.join(output_path, WorkQueue.filename), timeout=60,
+                                           isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._create_table()
+
+    def _create_table(self):
+        self._connection.execute("""
+            CREATE TABLE IF NOT EXISTS work_items (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                article_id INTEGER NOT NULL UNIQUE,
+                publication TEXT NOT NULL,
+                url TEXT NOT NULL,
+                output_path TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires_at REAL,
+                last_error TEXT,
+                enqueued_at REAL NOT NULL,
+                completed_at REAL
+            )""")
+        self._connection.execute("""
+            CREATE INDEX IF NOT EXISTS work_items_by_status ON work_items (status, lease_expires_at)""")
+        # not UNIQUE, as queues enqueued before output paths were deduplicated may have some twice
+        self._connection.execute("""
+            CREATE INDEX IF NOT EXISTS work_items_by_output_path ON work_items (output_path)""")
+
+    def close(self):
+        self._connection.close()
+
+    def enqueue(self, publication: WorkItemPublication, work_item_specs: list[WorkItemSpec]) -> int:
+        """
+        An article whose output path is already taken by another article in the queue (e.g. one with the same date,
+        tags and title of another publication, in a flat output folder) is told apart by its id, as
+        SubstackArchivesDownloader does for articles of the same publication.
+        :return: the number of items enqueued, i.e. not counting articles already in the queue
+        """
+        now = time.time()
+        num_enqueued = 0
+        with self._transaction():
+            for article_id, url, output_path in work_item_specs:
+                if self._is_output_path_taken(output_path, article_id):
+                    output_path = WorkQueue.get_output_path_with_id(output_path, article_id)
+                cursor = self._connection.execute("""
+                    INSERT OR IGNORE INTO work_items (article_id, publication, url, output_path, enqueued_at)
+                    VALUES (?, ?, ?, ?, ?)""", (article_id, publication, url, output_path, now))
+                num_enqueued += cursor.rowcount
+        return num_enqueued
+
+    def _is_output_path_taken(self, output_path: WorkItemOutputPath, article_id: WorkItemArticleId) -> bool:
+        row = self._connection.execute("SELECT 1 FROM work_items WHERE output_path = ? AND article_id != ? LIMIT 1",
+                                       (output_path, article_id)).fetchone()
+        return row is not None
+
+    @staticmethod
+    def get_output_path_with_id(output_path: WorkItemOutputPath,
+                                article_id: WorkItemArticleId) -> WorkItemOutputPath:
+        # e.g. '20211012 - Title (123).pdf', as named by SubstackArchivesDownloader._get_pdf_output_path
+        output_path_without_extension, extension = os.path.splitext(output_path)
+        return f'{output_path_without_extension} ({article_id}){extension}'
+
+    def lease(self, worker_id: str, visibility_timeout: float) -> Optional[WorkItem]:
+        """
+        :return: the next item that is neither done nor leased by another worker, or None if there is none
+        """
+        now = time.time()
+        with self._transaction():
+            self._fail_expired_leases_out_of_attempts(now)
+            row = self._connection.execute("""
+                SELECT id, article_id, publication, url, output_path, attempts FROM work_items
+                WHERE status = ? OR (status = ? AND lease_expires_at < ?)
+                ORDER BY id LIMIT 1""", (PENDING, LEASED, now)).fetchone()
+            if row is None:
+                return None
+            work_item_id, *_ = row
+            self._connection.execute("""
+                UPDATE work_items SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_expires_at = ?
+                WHERE id = ?""", (LEASED, worker_id, now + visibility_timeout, work_item_id))
+            *rest, attempts = row
+            return (*rest, attempts + 1)
+
+    def complete(self, work_item_id: int, worker_id: str) -> bool:
+        """
+        :return: False if the lease had expired and the item was leased by another worker in the meantime
+        """
+        with self._transaction():
+            cursor = self._connection.execute("""
+                UPDATE work_items SET status = ?, completed_at = ?, lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ? AND lease_owner = ?""", (DONE, time.time(), work_item_id, worker_id))
+            return cursor.rowcount == 1
+
+    def fail(self, work_item_id: int, worker_id: str, error: str):
+        # made visible again straight away, unless it is out of attempts
+        with self._transaction():
+            self._connection.execute("""
+                UPDATE work_items SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, last_error = ?,
+                lease_owner = NULL, lease_expires_at = NULL
+                WHERE id = ? AND lease_owner = ?""",
+                (self._max_attempts, FAILED, PENDING, error, work_item_id, worker_id))
+
+    def has_unfinished_items(self) -> bool:
+        # leased items count, as they become visible again if their worker crashes
+        now = time.time()
+        with self._transaction():
+            self._fail_expired_leases_out_of_attempts(now)
+            row = self._connection.execute("SELECT 1 FROM work_items WHERE status IN (?, ?) LIMIT 1",
+                                           (PENDING, LEASED)).fetchone()
+            return row is not None
+
+    def get_num_items_by_status(self) -> dict[str, int]:
+        cursor = self._connection.execute("SELECT status, COUNT(*) FROM work_items GROUP BY status")
+        return {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0, **dict(cursor.fetchall())}
+
+    def get_failed_items(self) -> list[tuple[WorkItemUrl, Optional[str]]]:
+        cursor = self._connection.execute("SELECT url, last_error FROM work_items WHERE status = ? ORDER BY id",
+                                          (FAILED,))
+        return cursor.fetchall()
+
+    def retry_failed_items(self) -> int:
+        # e.g. after fixing whatever made them fail
+        with self._transaction():
+            cursor = self._connection.execute("UPDATE work_items SET status = ?, attempts = 0 WHERE status = ?",
+                                              (PENDING, FAILED))
+            return cursor.rowcount
+
+    def _fail_expired_leases_out_of_attempts(self, now: float):
+        self._connection.execute("""
+            UPDATE work_items SET status = ?, last_error = 'lease expired', lease_owner = NULL, lease_expires_at = NULL
+            WHERE status = ? AND lease_expires_at < ? AND attempts >= ?""",
+                                 (FAILED, LEASED, now, self._max_attempts))
+
+    def _transaction(self) -> '_ImmediateTransaction':
+        return _ImmediateTransaction(self._connection)
+
+
+class _ImmediateTransaction:
+    # takes the write lock up front, so that two workers cannot lease the same item
+    def __init__(self, connection: sqlite3.Connection):
+        self._connection = connection
+
+    def __enter__(self):
+        self._connection.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._connection.execute("COMMIT" if exc_type is None else "ROLLBACK")
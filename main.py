@@ -1,8 +1,205 @@
-from user_interface import SubstackArchivesDownloaderUserInterface as downloaderUI
+import argparse
+from getpass import getpass
+import os
+import signal
+from typing import Optional
+
+from downloaders.driver_resolver import DriverResolver
+from downloaders.response_cache import ResponseCache
+from utilities.timing import StageTimings, stage_timings, startup_timing
+
+# every command imports what it needs once it runs, as importing selenium, requests and webdriver_manager up front
+# would slow down starting up (see --startup-timing)
 
 
 def main() -> None:
-    ui = downloaderUI()
+    # without a command, the downloader is run interactively
+    parser = argparse.ArgumentParser(description="Substack Archives Downloader")
+    parser.add_argument('--offline', action='store_true',
+                        help="use the chromedriver cached for the installed Chrome, without checking for a newer one")
+    parser.add_argument('--response-cache-size', type=float,
+                        help="MiB of archive API pages kept to revalidate on later runs (50 by default, 0 for none)")
+    parser.add_argument('--render-workers', type=parse_positive_int,
+                        help="render articles in parallel with this many headless browsers (1 by default; "
+                             "for batch, instead of the job file's num_render_workers; coordinate uses --workers)")
+    parser.add_argument('--startup-timing', action='store_true',
+                        help="print how long each step of starting up took, once the browser has launched")
+    parser.add_argument('--stage-timing', action='store_true',
+                        help="print how long each stage (navigating, generating PDFs, ...) took, once done")
+    parser.add_argument('--metrics-jsonl', help="append a JSON line to this file for every stage of every article")
+    parser.add_argument('--metrics-textfile',
+                        help="keep the timings of every stage in this Prometheus textfile, e.g. for node exporter")
+    subparsers = parser.add_subparsers(dest='command')
+    migrate_output_parser = subparsers.add_parser(
+        'migrate-output', help="move the PDFs in the output folder into another folder layout, in place")
+    migrate_output_parser.add_argument('--per-publication', action='store_true',
+                                       help="one folder per publication")
+    migrate_output_parser.add_argument('--shard-by', choices=('year', 'month'),
+                                       help="one folder per year or per month of publication")
+    migrate_output_parser.add_argument('--hash-bucket-digits', type=int, default=0, choices=range(0, 5),
+                                       help="spread PDFs over 16 ** N folders by a hash of their filename")
+    batch_parser = subparsers.add_parser(
+        'batch', help="run the jobs of a job file (see batch_runner.py) without prompts, signing in once")
+    batch_parser.add_argument('job_file', help="path to the JSON job file")
+    batch_parser.add_argument('--username', help="Substack account email address, if not in the job file; "
+                                                 "the password is read from SUBSTACK_PASSWORD or prompted for")
+    coordinate_parser = subparsers.add_parser(
+        'coordinate', help="render the PDF jobs of a job file with several worker processes, using a durable queue")
+    coordinate_parser.add_argument('job_file', help="path to the JSON job file")
+    coordinate_parser.add_argument('--username', help="as for batch")
+    coordinate_parser.add_argument('--workers', type=int, default=4, help="number of worker processes")
+    coordinate_parser.add_argument('--visibility-timeout', type=float, default=600,
+                                   help="seconds after which an article leased by a worker is leased again")
+    coordinate_parser.add_argument('--resume', action='store_true',
+                                   help="carry on with the queue left by a previous run, without loading archives")
+    coordinate_parser.add_argument('--retry-failed', action='store_true',
+                                   help="retry the articles that failed in previous runs")
+    watch_parser = subparsers.add_parser(
+        'watch', help="keep polling publications for new articles and download them as PDFs, until stopped")
+    watch_parser.add_argument('urls', nargs='+', help="urls of the publications to watch")
+    watch_parser.add_argument('--username', help="as for batch")
+    watch_parser.add_argument('--interval', type=parse_positive_float, default=600,
+                              help="seconds between polls of each publication, on average")
+    watch_parser.add_argument('--jitter', type=parse_fraction, default=0.2,
+                              help="fraction of the interval by which each poll is moved earlier or later at random")
+    watch_parser.add_argument('--download-podcasts', action='store_true', help="download new podcasts too")
+    watch_parser.add_argument('--status-port', type=int, default=8765,
+                              help="port on localhost serving the state of every publication as JSON, 0 for none")
+    args = parser.parse_args()
+    startup_timing.is_enabled = args.startup_timing
+    if args.offline:
+        # an environment variable, so that worker processes are offline too
+        os.environ[DriverResolver.offline_environment_variable] = '1'
+    if args.response_cache_size is not None:
+        # an environment variable like --offline, so that it applies to every downloader
+        os.environ[ResponseCache.size_environment_variable] = str(args.response_cache_size)
+    if args.metrics_textfile:
+        # an environment variable like --offline, so that coordinate's worker processes write textfiles of their own
+        os.environ[StageTimings.textfile_environment_variable] = args.metrics_textfile
+    if args.stage_timing or args.metrics_jsonl or args.metrics_textfile:
+        stage_timings.enable(args.metrics_jsonl, args.metrics_textfile)
+    startup_timing.record('parse arguments')
+    try:
+        if args.command == 'migrate-output':
+            migrate_output(args)
+        elif args.command == 'batch':
+            run_batch(args)
+        elif args.command == 'coordinate':
+            run_coordinator(args)
+        elif args.command == 'watch':
+            run_watcher(args)
+        else:
+            run_interactively(args.render_workers or 1)
+    finally:
+        stage_timings.close()
+        if args.stage_timing:
+            print(stage_timings)
+
+
+def migrate_output(args: argparse.Namespace) -> None:
+    from downloaders.output_migration import OutputMigration
+    from downloaders.pdf_downloader import OutputLayout
+    output_migration = OutputMigration(OutputLayout(args.per_publication, args.shard_by, args.hash_bucket_digits))
+    output_migration.run()
+    print(output_migration)
+
+
+def run_batch(args: argparse.Namespace) -> None:
+    from batch_runner import BatchRunner
+    startup_timing.record('import modules')
+    batch_runner = BatchRunner(args.job_file, args.render_workers)
+    username, password = get_username_and_password(args, batch_runner.username)
+    batch_report = batch_runner.run(username, password)
+    print(batch_report)
+    print_upon_exit_success() if batch_report.get_num_failed_jobs() == 0 else print_upon_exit_failure()
+
+
+def run_coordinator(args: argparse.Namespace) -> None:
+    from batch_runner import BatchRunner
+    from coordinator import Coordinator
+    from downloaders.substack_archives_downloader import SubstackArchivesDownloader
+    startup_timing.record('import modules')
+    batch_runner = BatchRunner(args.job_file)
+    batch_runner.check_jobs_are_pdf_only(args.job_file)
+    username, password = get_username_and_password(args, batch_runner.username)
+    coordinator = Coordinator(args.workers, args.visibility_timeout)
+    if args.retry_failed:
+        print(f"Retrying {coordinator.retry_failed_items()} failed article(s).")
+    scheduled_jobs = batch_runner.get_scheduled_jobs()
+    # one signed-in browser loads the archives, and its cookies are copied to every worker's browser
+    downloader = SubstackArchivesDownloader(scheduled_jobs[0].url, batch_runner.get_is_headless())
+    try:
+        downloader.log_in(username, password)
+        if not args.resume:
+            print(f"Enqueued {coordinator.enqueue(downloader, scheduled_jobs)} new article(s).")
+        cookies = downloader.get_all_cookies()
+    finally:
+        downloader.shut_down()
+    coordinator_report = coordinator.run(cookies)
+    print(coordinator_report)
+    print_upon_exit_success() if not coordinator_report.failed_items else print_upon_exit_failure()
+
+
+def run_watcher(args: argparse.Namespace) -> None:
+    from watcher import Watcher
+    startup_timing.record('import modules')
+    watcher = Watcher(args.urls, args.interval, args.jitter, args.download_podcasts, args.status_port,
+                      args.render_workers or 1)
+    username, password = get_username_and_password(args, None)
+    # SIGTERM (e.g. from systemd) stops it once the poll in progress is finished, Ctrl+C straight away
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: watcher.stop())
+    try:
+        watcher.run(username, password)
+    except KeyboardInterrupt:
+        pass
+    print(watcher)
+
+
+def get_username_and_password(args: argparse.Namespace, job_file_username: Optional[str]) -> tuple[str, str]:
+    username = args.username or job_file_username
+    if not username:
+        username = input("Please enter your Substack account email address:\n")
+    password = os.environ.get('SUBSTACK_PASSWORD') or getpass("Please enter your Substack account password:\n")
+    startup_timing.skip()  # waiting for input is not part of starting up
+    return username, password
+
+
+# argument types, so that out-of-range values are reported by argparse like any other invalid argument
+def parse_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a number")
+
+
+def parse_positive_int(value: str) -> int:
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value} is not a whole number")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not at least 1")
+    return number
+
+
+def parse_positive_float(value: str) -> float:
+    number = parse_float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"{value} is not positive")
+    return number
+
+
+def parse_fraction(value: str) -> float:
+    number = parse_float(value)
+    if not 0 <= number < 1:
+        raise argparse.ArgumentTypeError(f"{value} is not at least 0 and less than 1")
+    return number
+
+
+def run_interactively(num_render_workers: int) -> None:
+    from user_interface import SubstackArchivesDownloaderUserInterface as downloaderUI
+    startup_timing.record('import modules')
+    ui = downloaderUI(num_render_workers)
     successful_initialisation = ui.get_substack_url()
     if not successful_initialisation:
         print_upon_exit_failure()
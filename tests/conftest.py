@@ -0,0 +1,42 @@
+from typing import Callable
+
+import pytest
+
+from benchmarks.fake_driver import FakeDriver
+from benchmarks.fake_substack import FakeSubstackServer
+from benchmarks.run_benchmarks import create_downloader
+from downloaders.pdf_downloader import Directory, PDFDownloader
+from downloaders.substack_archives_downloader import SubstackArchivesDownloader
+
+
+@pytest.fixture
+def output_path(tmp_path, monkeypatch) -> str:
+    # before anything creates a Directory, so that the real output folder is not touched
+    monkeypatch.setenv(Directory.output_path_environment_variable, str(tmp_path))
+    return str(tmp_path)
+
+
+@pytest.fixture
+def fake_substack() -> FakeSubstackServer:
+    with FakeSubstackServer(num_articles=500, page_size=12) as server:
+        yield server
+
+
+@pytest.fixture
+def make_downloader(output_path, fake_substack,
+                    monkeypatch) -> Callable[..., SubstackArchivesDownloader]:
+    """
+    Creates downloaders pointed at fake_substack, with FakeDrivers instead of Chrome, all sharing output_path
+    (and so the archive index), and shuts them down after the test.
+    """
+    monkeypatch.setattr(PDFDownloader, '_initialize_driver', lambda self: FakeDriver())
+    downloaders = []
+
+    def _make_downloader(use_archive_index: bool = True) -> SubstackArchivesDownloader:
+        downloader = create_downloader(fake_substack.url, num_render_workers=1, use_archive_index=use_archive_index)
+        downloaders.append(downloader)
+        return downloader
+
+    yield _make_downloader
+    for downloader in downloaders:
+        downloader.shut_down()
@@ -0,0 +1,110 @@
+import pytest
+
+from benchmarks.fake_substack import FakeSubstackServer
+from downloaders.substack_archives_downloader import SubstackArchivesDownloader
+from utilities import exceptions
+
+
+def get_article_ids(download_tasks) -> list[int]:
+    return [article_id for article_id, _, _ in download_tasks]
+
+
+def get_indexed_ids(downloader: SubstackArchivesDownloader) -> set[int]:
+    return {article_id for *_, article_id in downloader._archive_index.get_most_recent_k_articles(10_000, True)}
+
+
+def get_post_date(server: FakeSubstackServer, idx: int) -> int:
+    return SubstackArchivesDownloader.convert_json_date_to_yyyymmdd(server.get_article(idx)['post_date'])
+
+
+def assert_index_has_no_gap(downloader: SubstackArchivesDownloader, num_articles: int):
+    indexed_ids = get_indexed_ids(downloader)
+    assert indexed_ids == set(range(num_articles, num_articles - len(indexed_ids), -1))
+
+
+def test_backfill_indexes_most_recent_articles_without_gaps(make_downloader, fake_substack):
+    downloader = make_downloader()
+    assert get_article_ids(downloader.get_download_tasks_k_most_recent(30)) == list(range(500, 470, -1))
+    num_indexed = downloader._archive_index.get_num_articles()
+    assert get_indexed_ids(downloader) == set(range(500, 500 - num_indexed, -1))
+    assert not downloader._archive_index.is_complete()
+
+    assert get_article_ids(downloader.get_download_tasks_k_most_recent(100)) == list(range(500, 400, -1))
+    num_indexed = downloader._archive_index.get_num_articles()
+    assert get_indexed_ids(downloader) == set(range(500, 500 - num_indexed, -1))
+
+    assert len(get_article_ids(downloader.get_download_tasks_k_most_recent(1000))) == 500
+    assert get_indexed_ids(downloader) == set(range(1, 501))
+    assert downloader._archive_index.is_complete()
+
+
+def test_sync_only_requests_pages_newer_than_the_index(make_downloader, fake_substack):
+    get_article_ids(make_downloader().get_download_tasks_k_most_recent(1000))
+    fake_substack.num_articles = 530
+    fake_substack.reset_counts()
+    downloader = make_downloader()
+    # the fake server dates articles by position, so the indexed ones are dated 30 days later than they now are
+    assert set(get_article_ids(downloader.get_download_tasks_k_most_recent(1000))) == set(range(1, 531))
+    assert get_indexed_ids(downloader) == set(range(1, 531))
+    # the first page (checked before anything else), the three pages with new articles and a few requested
+    # speculatively, rather than the 45 pages of the whole archive
+    assert fake_substack.get_num_requests('api_archive') <= 10
+
+
+def test_sync_interrupted_part_way_leaves_no_gap(make_downloader, fake_substack, monkeypatch):
+    get_article_ids(make_downloader().get_download_tasks_k_most_recent(1000))
+    fake_substack.num_articles = 536  # three pages of new articles
+    downloader = make_downloader()
+    get_archive_page = downloader._get_archive_page
+
+    def get_archive_page_failing_at_third_page(offset: int):
+        if offset == 24:
+            raise exceptions.SubsequentLoadError(f"offset={offset}")
+        return get_archive_page(offset)
+
+    monkeypatch.setattr(downloader, '_get_archive_page', get_archive_page_failing_at_third_page)
+    with pytest.raises(exceptions.SubsequentLoadError):
+        get_article_ids(downloader.get_download_tasks_k_most_recent(1000))
+    # none of the new articles were indexed, so the next sync still finds them all
+    assert get_indexed_ids(downloader) == set(range(1, 501))
+
+    monkeypatch.setattr(downloader, '_get_archive_page', get_archive_page)
+    get_article_ids(downloader.get_download_tasks_k_most_recent(1000))
+    assert get_indexed_ids(downloader) == set(range(1, 537))
+
+
+def test_date_range_older_than_the_index_is_galloped_to(make_downloader, fake_substack):
+    fake_substack.num_articles = 5000
+    downloader = make_downloader()
+    get_article_ids(downloader.get_download_tasks_k_most_recent(30))
+    start_date = get_post_date(fake_substack, 3999)
+    end_date = get_post_date(fake_substack, 3970)
+    fake_substack.reset_counts()
+    article_ids = get_article_ids(downloader.get_download_tasks_date_range(start_date, end_date))
+    assert article_ids == [fake_substack.get_article(idx)['id'] for idx in range(3970, 4000)]
+    # as without the archive index, rather than every page between the index and the range
+    assert fake_substack.get_num_requests('api_archive') <= 30
+    # the galloped pages are not contiguous with the indexed ones, so they are not indexed
+    assert_index_has_no_gap(downloader, 5000)
+    assert max(article_ids) < min(get_indexed_ids(downloader))
+
+
+def test_date_range_carrying_on_from_the_index_is_indexed(make_downloader, fake_substack):
+    downloader = make_downloader()
+    start_date = get_post_date(fake_substack, 20)
+    end_date = get_post_date(fake_substack, 0)
+    article_ids = get_article_ids(downloader.get_download_tasks_date_range(start_date, end_date))
+    assert article_ids == list(range(500, 479, -1))
+    assert_index_has_no_gap(downloader, 500)
+    assert set(article_ids) <= get_indexed_ids(downloader)
+
+
+def test_date_range_reaching_back_past_the_index_is_backfilled(make_downloader, fake_substack):
+    downloader = make_downloader()
+    get_article_ids(downloader.get_download_tasks_k_most_recent(30))
+    num_indexed = downloader._archive_index.get_num_articles()
+    start_date = get_post_date(fake_substack, num_indexed + 40)
+    end_date = get_post_date(fake_substack, num_indexed - 10)
+    article_ids = get_article_ids(downloader.get_download_tasks_date_range(start_date, end_date))
+    assert article_ids == [fake_substack.get_article(idx)['id'] for idx in range(num_indexed - 10, num_indexed + 41)]
+    assert_index_has_no_gap(downloader, 500)
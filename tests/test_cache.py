@@ -0,0 +1,50 @@
+from downloaders.substack_archives_downloader import Cache
+
+
+def make_cache(*article_tuples) -> Cache:
+    cache = Cache('https://example.substack.com/')
+    for article_tuple in article_tuples:
+        cache.append_article_tuple(*article_tuple)
+    return cache
+
+
+def article(date: int, article_id: int) -> tuple:
+    return date, f'Title {article_id}', '', f'https://example.substack.com/p/post-{article_id}', article_id
+
+
+def test_articles_are_sorted_from_most_to_least_recent_regardless_of_insertion_order():
+    cache = make_cache(article(20240102, 2), article(20240105, 5), article(20240101, 1), article(20240103, 3))
+    assert [cache.get_article_tuple_by_idx(idx)[4] for idx in range(cache.get_cache_size())] == [5, 3, 2, 1]
+    assert cache.get_latest_article_tuple()[4] == 5
+    assert cache.get_earliest_article_tuple()[4] == 1
+
+
+def test_articles_on_the_same_date_are_sorted_by_id():
+    cache = make_cache(article(20240101, 7), article(20240101, 9), article(20240101, 8))
+    assert [article_tuple[4] for article_tuple in cache.get_most_recent_k_article_tuples(3)] == [9, 8, 7]
+
+
+def test_duplicates_are_not_appended():
+    cache = make_cache(article(20240101, 1))
+    assert not cache.append_article_tuple(*article(20240101, 1))
+    # same url, different id
+    assert not cache.append_article_tuple(20240102, 'Title', '', 'https://example.substack.com/p/post-1', 2)
+    # same id, different url
+    assert not cache.append_article_tuple(20240102, 'Title', '', 'https://example.substack.com/p/other', 1)
+    assert cache.get_cache_size() == 1
+    assert cache.get_article_tuple_by_id(2) is None
+
+
+def test_articles_are_looked_up_by_id_and_url():
+    cache = make_cache(article(20240101, 1), article(20240102, 2))
+    assert cache.get_article_tuple_by_id(2) == article(20240102, 2)
+    assert cache.get_article_tuple_by_url('https://example.substack.com/p/post-1') == article(20240101, 1)
+    assert cache.get_article_tuple_by_url('https://example.substack.com/p/post-3') is None
+
+
+def test_date_ranges_include_both_ends():
+    cache = make_cache(*(article(20240100 + day, day) for day in range(1, 11)))
+    assert [article_tuple[4] for article_tuple in cache.get_article_tuples_by_date_range(20240103, 20240106)] \
+        == [6, 5, 4, 3]
+    assert [article_tuple[4] for article_tuple in cache.get_article_tuples_by_date(20240110)] == [10]
+    assert cache.get_article_tuples_by_date_range(20240201, 20240229) == []
@@ -0,0 +1,41 @@
+import pytest
+
+from benchmarks.fake_substack import FakeSubstackServer
+from downloaders.substack_archives_downloader import SubstackArchivesDownloader
+
+
+def get_post_date(server: FakeSubstackServer, idx: int) -> int:
+    return SubstackArchivesDownloader.convert_json_date_to_yyyymmdd(server.get_article(idx)['post_date'])
+
+
+def get_article_ids(download_tasks) -> list[int]:
+    return [article_id for article_id, _, _ in download_tasks]
+
+
+@pytest.mark.parametrize('first_idx, last_idx', [(0, 5), (10, 11), (230, 260), (480, 499)])
+def test_date_range_loads_exactly_the_articles_in_range(make_downloader, fake_substack, first_idx, last_idx):
+    downloader = make_downloader(use_archive_index=False)
+    start_date = get_post_date(fake_substack, last_idx)
+    end_date = get_post_date(fake_substack, first_idx)
+    article_ids = get_article_ids(downloader.get_download_tasks_date_range(start_date, end_date))
+    assert article_ids == [fake_substack.get_article(idx)['id'] for idx in range(first_idx, last_idx + 1)]
+
+
+def test_date_range_requests_logarithmically_many_pages(make_downloader, fake_substack):
+    fake_substack.num_articles = 5000
+    downloader = make_downloader(use_archive_index=False)
+    start_date = get_post_date(fake_substack, 3999)
+    end_date = get_post_date(fake_substack, 3970)
+    fake_substack.reset_counts()
+    assert len(get_article_ids(downloader.get_download_tasks_date_range(start_date, end_date))) == 30
+    # walking every page up to the range would take 3999 // 12 = 333 pages
+    assert fake_substack.get_num_requests('api_archive') <= 30
+
+
+def test_date_range_outside_the_archive_loads_nothing(make_downloader, fake_substack):
+    downloader = make_downloader(use_archive_index=False)
+    after_latest_date = get_post_date(fake_substack, 0) + 1
+    assert get_article_ids(downloader.get_download_tasks_date_range(after_latest_date, after_latest_date + 1)) == []
+    before_earliest_date = get_post_date(fake_substack, 499) - 1
+    assert get_article_ids(
+        downloader.get_download_tasks_date_range(before_earliest_date - 1, before_earliest_date)) == []
@@ -0,0 +1,100 @@
+import os
+import shutil
+import time
+
+import pytest
+
+from downloaders.download_ledger import DownloadLedger
+
+URL = 'https://example.substack.com/p/post'
+
+
+def write_pdf(path_with_filename: str, content: bytes = b'%PDF-1.4\npost'):
+    with open(path_with_filename, 'wb') as f:
+        f.write(content)
+
+
+def set_modified_after_download(path_with_filename: str):
+    modified_at = time.time() + 60
+    os.utime(path_with_filename, (modified_at, modified_at))
+
+
+@pytest.fixture
+def download_ledger(tmp_path) -> DownloadLedger:
+    download_ledger = DownloadLedger(str(tmp_path))
+    yield download_ledger
+    download_ledger.close()
+
+
+def test_downloads_are_looked_up_by_post_id_after_reopening(tmp_path, download_ledger):
+    path_with_filename = os.path.join(tmp_path, '20211012 - Post.pdf')
+    write_pdf(path_with_filename)
+    download_ledger.record(123, URL, path_with_filename, render_time=1.0)
+    download_ledger.close()
+
+    download_ledger = DownloadLedger(str(tmp_path))
+    assert download_ledger.get_output_path(123) == path_with_filename
+    assert download_ledger.get_article_id(path_with_filename) == 123
+    assert download_ledger.get_canonical_url(123) == URL
+    assert download_ledger.is_intact(123)
+    assert download_ledger.get_output_path(456) is None and not download_ledger.is_intact(456)
+
+
+@pytest.mark.parametrize('change', ['deleted', 'resized', 'same size, other contents'])
+def test_changed_pdf_is_not_intact_so_it_is_downloaded_again(tmp_path, download_ledger, change):
+    path_with_filename = os.path.join(tmp_path, '20211012 - Post.pdf')
+    write_pdf(path_with_filename)
+    download_ledger.record(123, URL, path_with_filename, render_time=1.0)
+    if change == 'deleted':
+        os.remove(path_with_filename)
+    elif change == 'resized':
+        write_pdf(path_with_filename, b'%PDF-1.4\n')
+    else:
+        write_pdf(path_with_filename, b'%PDF-1.4\nPOST')
+        set_modified_after_download(path_with_filename)
+    assert not download_ledger.is_intact(123)
+
+
+def test_pdf_modified_with_the_same_contents_is_intact(tmp_path, download_ledger):
+    path_with_filename = os.path.join(tmp_path, '20211012 - Post.pdf')
+    write_pdf(path_with_filename)
+    download_ledger.record(123, URL, path_with_filename, render_time=1.0)
+    set_modified_after_download(path_with_filename)  # e.g. restored from a backup
+    assert download_ledger.is_intact(123)
+
+
+def test_paths_are_relative_so_that_the_output_folder_can_be_moved(tmp_path):
+    old_output_path = os.path.join(tmp_path, 'old')
+    os.makedirs(os.path.join(old_output_path, '2021'))
+    download_ledger = DownloadLedger(old_output_path)
+    write_pdf(os.path.join(old_output_path, '2021', '20211012 - Post.pdf'))
+    download_ledger.record(123, URL, os.path.join(old_output_path, '2021', '20211012 - Post.pdf'), render_time=1.0)
+    download_ledger.close()
+
+    new_output_path = os.path.join(tmp_path, 'new')
+    shutil.move(old_output_path, new_output_path)
+    download_ledger = DownloadLedger(new_output_path)
+    new_path_with_filename = os.path.join(new_output_path, '2021', '20211012 - Post.pdf')
+    assert download_ledger.get_output_path(123) == new_path_with_filename
+    assert download_ledger.get_article_id(new_path_with_filename) == 123
+    assert download_ledger.is_intact(123)
+    download_ledger.close()
+
+
+def test_articles_with_the_same_filename_are_told_apart_by_id(output_path, make_downloader):
+    downloader = make_downloader()
+    same_day_posts = [(20211012, 'Post', '', f'https://example.substack.com/p/post-{article_id}', article_id)
+                      for article_id in (1, 2)]
+
+    render_jobs = list(downloader._generate_render_jobs(same_day_posts))
+    assert [os.path.basename(output_path_with_filename) for _, output_path_with_filename in render_jobs] == \
+           ['20211012 - Post.pdf', '20211012 - Post (2).pdf']
+
+    # once the first is downloaded, a later article with the same filename is told apart from it, and the first
+    # is not downloaded again
+    write_pdf(render_jobs[0][1])
+    downloader._download_ledger.record(1, same_day_posts[0][3], render_jobs[0][1], render_time=1.0)
+    later_post = (20211012, 'Post', '', 'https://example.substack.com/p/post-3', 3)
+    render_jobs = list(downloader._generate_render_jobs([same_day_posts[0], later_post]))
+    assert [os.path.basename(output_path_with_filename) for _, output_path_with_filename in render_jobs] == \
+           ['20211012 - Post (3).pdf']
@@ -0,0 +1,70 @@
+import json
+import os
+
+import pytest
+import webdriver_manager.chrome
+
+from downloaders.driver_resolver import DriverResolver
+from utilities import exceptions
+
+
+@pytest.fixture
+def installed_driver_paths(tmp_path, monkeypatch) -> list[str]:
+    # ChromeDriverManager would check driver versions over the network, so it installs a file of its own instead
+    installed_driver_paths = []
+
+    class LocalChromeDriverManager:
+        def install(self) -> str:
+            driver_path = tmp_path / f'chromedriver-{len(installed_driver_paths)}'
+            driver_path.write_text('')
+            installed_driver_paths.append(str(driver_path))
+            return str(driver_path)
+
+    monkeypatch.setattr(webdriver_manager.chrome, 'ChromeDriverManager', LocalChromeDriverManager)
+    monkeypatch.delenv(DriverResolver.offline_environment_variable, raising=False)
+    return installed_driver_paths
+
+
+def set_chrome_version(monkeypatch, chrome_version):
+    monkeypatch.setattr(DriverResolver, 'get_chrome_version', staticmethod(lambda: chrome_version))
+
+
+def test_driver_is_resolved_again_only_after_chrome_is_updated(tmp_path, monkeypatch, installed_driver_paths):
+    driver_resolver = DriverResolver(str(tmp_path))
+    set_chrome_version(monkeypatch, '120.0.6099.109')
+    assert driver_resolver.resolve() == driver_resolver.resolve() == installed_driver_paths[0]
+    set_chrome_version(monkeypatch, '121.0.6167.85')
+    assert driver_resolver.resolve() == installed_driver_paths[1]
+    assert len(installed_driver_paths) == 2
+
+
+def test_driver_is_cached_when_the_chrome_version_cannot_be_found(tmp_path, monkeypatch, installed_driver_paths):
+    driver_resolver = DriverResolver(str(tmp_path))
+    set_chrome_version(monkeypatch, None)
+    assert driver_resolver.resolve() == driver_resolver.resolve() == installed_driver_paths[0]
+    assert len(installed_driver_paths) == 1
+
+    monkeypatch.setenv(DriverResolver.offline_environment_variable, '1')
+    assert DriverResolver(str(tmp_path)).resolve() == installed_driver_paths[0]
+
+
+def test_offline_without_a_cached_driver(tmp_path, monkeypatch, installed_driver_paths):
+    monkeypatch.setenv(DriverResolver.offline_environment_variable, '1')
+    set_chrome_version(monkeypatch, '120.0.6099.109')
+    with pytest.raises(exceptions.ChromedriverNotCached):
+        DriverResolver(str(tmp_path)).resolve()
+    assert installed_driver_paths == []
+
+
+@pytest.mark.parametrize('cache_contents', [
+    '{"drivers": ', '[]', '{}', '{"drivers": []}', '{"drivers": {}, "last_chrome_version": 120}',
+    '{"drivers": {"120.0.6099.109": 3}, "last_chrome_version": "120.0.6099.109"}',
+])
+def test_invalid_cache_is_a_cache_miss(tmp_path, monkeypatch, installed_driver_paths, cache_contents):
+    with open(os.path.join(tmp_path, DriverResolver.filename), 'w') as f:
+        f.write(cache_contents)
+    set_chrome_version(monkeypatch, '120.0.6099.109')
+    assert DriverResolver(str(tmp_path)).resolve() == installed_driver_paths[0]
+    with open(os.path.join(tmp_path, DriverResolver.filename)) as f:
+        assert json.load(f) == {'drivers': {'120.0.6099.109': installed_driver_paths[0]},
+                                'last_chrome_version': '120.0.6099.109'}
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from downloaders.download_ledger import DownloadLedger
+from downloaders.output_migration import OutputMigration
+from downloaders.pdf_downloader import OutputLayout
+
+PER_PUBLICATION_BY_YEAR = OutputLayout(per_publication=True, shard_by='year')
+
+
+def write_pdf(output_path: str, relative_path: str, content: bytes = b'%PDF-1.4\n') -> str:
+    path_with_filename = os.path.join(output_path, relative_path)
+    os.makedirs(os.path.dirname(path_with_filename), exist_ok=True)
+    with open(path_with_filename, 'wb') as f:
+        f.write(content)
+    return path_with_filename
+
+
+@pytest.fixture
+def downloaded_pdfs(output_path) -> dict[int, str]:
+    # article id -> relative path, downloaded into a flat output folder and recorded in the ledger
+    relative_paths = {
+        1: '20211012 - First Post.pdf',
+        2: '20220301 - Second Post.pdf',
+        3: '20220301 - Other Post.pdf',
+    }
+    urls = {
+        1: 'https://example.substack.com/p/first-post',
+        2: 'https://example.substack.com/p/second-post',
+        3: 'https://other.substack.com/p/other-post',
+    }
+    download_ledger = DownloadLedger(output_path)
+    for article_id, relative_path in relative_paths.items():
+        download_ledger.record(article_id, urls[article_id], write_pdf(output_path, relative_path), render_time=1.0)
+    download_ledger.close()
+    return relative_paths
+
+
+def migrate(output_layout: OutputLayout) -> OutputMigration:
+    output_migration = OutputMigration(output_layout)
+    output_migration.run()
+    return output_migration
+
+
+def test_pdfs_are_moved_into_the_new_layout_and_the_ledger_follows(output_path, downloaded_pdfs):
+    output_migration = migrate(PER_PUBLICATION_BY_YEAR)
+
+    assert output_migration.num_moved == 3 and not output_migration.left_behind
+    expected_relative_paths = {
+        1: os.path.join('example.substack.com', '2021', '20211012 - First Post.pdf'),
+        2: os.path.join('example.substack.com', '2022', '20220301 - Second Post.pdf'),
+        3: os.path.join('other.substack.com', '2022', '20220301 - Other Post.pdf'),
+    }
+    download_ledger = DownloadLedger(output_path)
+    for article_id, relative_path in expected_relative_paths.items():
+        path_with_filename = os.path.join(output_path, relative_path)
+        assert os.path.isfile(path_with_filename)
+        assert not os.path.exists(os.path.join(output_path, downloaded_pdfs[article_id]))
+        assert download_ledger.get_output_path(article_id) == path_with_filename
+        assert download_ledger.get_article_id(path_with_filename) == article_id
+    download_ledger.close()
+    assert OutputLayout.load(output_path).per_publication
+
+
+def test_migrating_again_is_a_no_op(output_path, downloaded_pdfs):
+    migrate(PER_PUBLICATION_BY_YEAR)
+    download_ledger = DownloadLedger(output_path)
+    output_paths = {article_id: download_ledger.get_output_path(article_id) for article_id in downloaded_pdfs}
+    download_ledger.close()
+
+    output_migration = migrate(PER_PUBLICATION_BY_YEAR)
+
+    assert output_migration.num_moved == 0 and output_migration.num_in_place == 3
+    assert not output_migration.left_behind
+    download_ledger = DownloadLedger(output_path)
+    for article_id, path_with_filename in output_paths.items():
+        assert os.path.isfile(path_with_filename)
+        assert download_ledger.get_output_path(article_id) == path_with_filename
+    download_ledger.close()
+
+
+def test_files_that_cannot_be_placed_are_left_where_they_are(output_path, downloaded_pdfs):
+    not_in_ledger = write_pdf(output_path, '20200101 - Downloaded Elsewhere.pdf')
+    not_a_pdf = write_pdf(output_path, 'notes.txt')
+    hidden = write_pdf(output_path, os.path.join('.unsaved', '20200101 - Unsaved.pdf'))
+    # already where the first post goes, with other contents
+    taken = write_pdf(output_path, os.path.join('example.substack.com', '2021', '20211012 - First Post.pdf'),
+                      b'%PDF-1.4\nsomething else')
+
+    output_migration = migrate(PER_PUBLICATION_BY_YEAR)
+
+    assert output_migration.num_moved == 2
+    assert sorted(relative_path for relative_path, _ in output_migration.left_behind) == \
+           sorted(['20200101 - Downloaded Elsewhere.pdf', downloaded_pdfs[1], os.path.relpath(taken, output_path)])
+    for path_with_filename in (not_in_ledger, not_a_pdf, hidden, os.path.join(output_path, downloaded_pdfs[1])):
+        assert os.path.isfile(path_with_filename)
+    with open(taken, 'rb') as f:
+        assert f.read() == b'%PDF-1.4\nsomething else'
+    download_ledger = DownloadLedger(output_path)
+    assert download_ledger.get_output_path(1) == os.path.join(output_path, downloaded_pdfs[1])
+    download_ledger.close()
@@ -0,0 +1,52 @@
+import os
+
+import pytest
+
+from benchmarks.fake_driver import FakeDriver
+from downloaders.pdf_downloader import Directory, PDFDownloader
+from utilities import exceptions
+
+
+class QuitRecordingDriver(FakeDriver):
+    def __init__(self):
+        super().__init__()
+        self.has_quit = False
+
+    def quit(self):
+        self.has_quit = True
+        super().quit()
+
+
+@pytest.fixture
+def pdf_downloader(output_path, monkeypatch) -> PDFDownloader:
+    monkeypatch.setattr(PDFDownloader, '_initialize_driver', lambda self: QuitRecordingDriver())
+    return PDFDownloader(is_headless=False)
+
+
+def test_shut_down_quits_and_keeps_leftover_pdfs_when_saving_fails(pdf_downloader, output_path, monkeypatch):
+    def fail_to_save():
+        raise exceptions.ErrorWhileSavingPDF('article.pdf')
+
+    monkeypatch.setattr(pdf_downloader, 'wait_for_pending_pdfs', fail_to_save)
+    temp_path = pdf_downloader._directory.temp_path
+    with open(os.path.join(temp_path, 'article.pdf'), 'wb') as file:
+        file.write(b'%PDF-1.4\n')
+
+    with pytest.raises(exceptions.ErrorWhileSavingPDF):
+        pdf_downloader.shut_down()
+
+    assert pdf_downloader._driver.has_quit
+    assert not os.path.exists(pdf_downloader._profile_path)
+    assert not os.path.exists(temp_path)
+    unsaved_filenames = os.listdir(os.path.join(output_path, Directory.unsaved_folder_name))
+    assert len(unsaved_filenames) == 1 and unsaved_filenames[0].endswith('-article.pdf')
+
+
+def test_shut_down_removes_empty_temp_folder(pdf_downloader, output_path):
+    temp_path = pdf_downloader._directory.temp_path
+
+    pdf_downloader.shut_down()
+
+    assert pdf_downloader._driver.has_quit
+    assert not os.path.exists(temp_path)
+    assert not os.path.exists(os.path.join(output_path, Directory.unsaved_folder_name))
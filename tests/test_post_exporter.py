@@ -0,0 +1,50 @@
+import base64
+from pathlib import Path
+
+import requests
+
+from downloaders.post_exporter import ImageStore, PostExporter
+
+IMAGE_URL = 'https://substackcdn.com/image/fetch/w_1456/https%3A%2F%2Fexample.com%2Fimage.png'
+IMAGE_BYTES = b'\x89PNG\r\n\x1a\n not really a png'
+
+
+def make_image_store(tmp_path) -> ImageStore:
+    # with the image already downloaded by a previous run, so that nothing is requested
+    image_store = ImageStore(str(tmp_path / 'images'), requests.Session(), timeout=1)
+    (tmp_path / 'images' / (ImageStore.get_image_name(IMAGE_URL) + '.png')).write_bytes(IMAGE_BYTES)
+    return image_store
+
+
+def test_images_are_linked_locally(tmp_path):
+    image_store = make_image_store(tmp_path)
+    assert image_store.get_local_image_path(IMAGE_URL) == f'../images/{ImageStore.get_image_name(IMAGE_URL)}.png'
+    markdown = PostExporter.convert_body_html_to_markdown(f'<p><img src="{IMAGE_URL}"/></p>',
+                                                          image_store.get_local_image_path)
+    assert '../images/' in markdown
+
+
+def test_images_are_inlined_as_data_uris(tmp_path):
+    image_store = make_image_store(tmp_path)
+    xhtml = PostExporter.convert_body_html_to_xhtml(
+        f'<p><img src="{IMAGE_URL}" srcset="{IMAGE_URL} 2x"/></p>', image_store.get_image_data_uri)
+    assert f'src="data:image/png;base64,{base64.b64encode(IMAGE_BYTES).decode()}"' in xhtml
+    assert 'substackcdn.com' not in xhtml
+
+
+def test_images_that_cannot_be_downloaded_keep_their_url(tmp_path):
+    image_store = ImageStore(str(tmp_path / 'images'), requests.Session(), timeout=1)
+    assert image_store.get_image_data_uri('data:image/png;base64,AAAA') is None
+    xhtml = PostExporter.convert_body_html_to_xhtml('<img src="ftp://example.com/image.png">',
+                                                    image_store.get_image_data_uri)
+    assert 'src="ftp://example.com/image.png"' in xhtml
+
+
+def test_export_writes_a_file_per_post(make_downloader, output_path):
+    downloader = make_downloader(use_archive_index=False)
+    assert downloader.export_k_most_recent(5, 'html') == 5
+    downloader.export_k_most_recent(5, 'markdown')
+    exported_files = sorted((exported_file.parent.name, exported_file.suffix)
+                            for export_format in ('html', 'markdown')
+                            for exported_file in (Path(output_path) / export_format).iterdir())
+    assert exported_files == [('html', '.html')] * 5 + [('markdown', '.md')] * 5
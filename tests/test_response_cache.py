@@ -0,0 +1,41 @@
+import os
+
+from downloaders.caching_http_adapter import CachingHTTPAdapter
+from downloaders.response_cache import ResponseCache
+
+
+def load_every_article(downloader) -> int:
+    return sum(1 for _ in downloader.get_download_tasks_k_most_recent(1000))
+
+
+def test_unchanged_pages_are_revalidated(make_downloader, fake_substack, output_path):
+    assert load_every_article(make_downloader(use_archive_index=False)) == 500
+    downloader = make_downloader(use_archive_index=False)
+    assert load_every_article(downloader) == 500
+    response = downloader.session.get(f'{fake_substack.url}/api/v1/archive?sort=new&offset=12')
+    assert CachingHTTPAdapter.is_from_cache(response)
+    assert len(response.json()) == 12
+    assert os.path.isfile(os.path.join(output_path, ResponseCache.filename))
+
+
+def test_cache_can_be_turned_off(make_downloader, fake_substack, output_path, monkeypatch):
+    monkeypatch.setenv(ResponseCache.size_environment_variable, '0')
+    assert load_every_article(make_downloader(use_archive_index=False)) == 500
+    downloader = make_downloader(use_archive_index=False)
+    assert load_every_article(downloader) == 500
+    assert not CachingHTTPAdapter.is_from_cache(downloader.session.get(f'{fake_substack.url}/api/v1/archive'))
+    assert not os.path.exists(os.path.join(output_path, ResponseCache.filename))
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    response_cache = ResponseCache(str(tmp_path), max_size=10)
+    try:
+        response_cache.put('https://example.com/1', 'etag-1', None, 'application/json', b'12345')
+        response_cache.put('https://example.com/2', 'etag-2', None, 'application/json', b'12345')
+        response_cache.mark_used('https://example.com/1')
+        response_cache.put('https://example.com/3', 'etag-3', None, 'application/json', b'12345')
+        assert response_cache.get('https://example.com/1') is not None
+        assert response_cache.get('https://example.com/2') is None
+        assert response_cache.get('https://example.com/3') is not None
+    finally:
+        response_cache.close()
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Optional
+
+import pytest
+import requests
+
+from utilities import retry
+
+
+def make_response(status_code: int, retry_after: Optional[str] = None) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    if retry_after is not None:
+        response.headers['Retry-After'] = retry_after
+    return response
+
+
+@pytest.mark.parametrize('status_code, is_retryable', [(429, True), (503, True), (404, False), (403, False)])
+def test_is_retryable(status_code, is_retryable):
+    assert retry.is_retryable(make_response(status_code)) == is_retryable
+
+
+def test_retry_after_in_seconds():
+    assert retry.get_retry_after(make_response(429, '7')) == 7.0
+    assert retry.get_retry_after(make_response(429, ' 0 ')) == 0.0
+
+
+def test_retry_after_missing_or_malformed():
+    assert retry.get_retry_after(make_response(429)) is None
+    assert retry.get_retry_after(make_response(429, 'soon')) is None
+    assert retry.get_retry_after(make_response(429, '-5')) is None
+
+
+@pytest.mark.parametrize('usegmt', [True, False])
+def test_retry_after_as_http_date(usegmt):
+    retry_after_date = datetime.now(timezone.utc) + timedelta(seconds=60)
+    retry_after = format_datetime(retry_after_date, usegmt=usegmt)  # 'GMT' or '+0000'
+    assert 55 <= retry.get_retry_after(make_response(429, retry_after)) <= 60
+
+
+def test_retry_after_as_http_date_without_timezone_is_utc():
+    retry_after_date = datetime.now(timezone.utc) + timedelta(seconds=60)
+    # parsed as a naive datetime, which cannot be compared with an aware one
+    retry_after = format_datetime(retry_after_date.replace(tzinfo=None))
+    assert retry_after.endswith('-0000')
+    assert 55 <= retry.get_retry_after(make_response(429, retry_after)) <= 60
+
+
+def test_retry_after_in_the_past_is_zero():
+    retry_after_date = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert retry.get_retry_after(make_response(429, format_datetime(retry_after_date, usegmt=True))) == 0.0
+
+
+def test_retry_after_is_capped():
+    assert retry.get_retry_after(make_response(429, '86400')) == 300.0
+    assert retry.get_retry_after(make_response(429, '86400'), cap=10.0) == 10.0
+    retry_after_date = datetime.now(timezone.utc) + timedelta(days=1)
+    assert retry.get_retry_after(make_response(429, format_datetime(retry_after_date, usegmt=True))) == 300.0
+
+
+def test_backoff_time_is_capped():
+    assert all(0 <= retry.get_backoff_time(attempt, cap=5.0) <= 5.0 for attempt in range(20))
+
+
+def test_archive_pages_are_retried_after_429s(make_downloader, fake_substack):
+    # the fake server answers a fifth of API requests with 429 Too Many Requests and Retry-After: 0
+    fake_substack.error_rate = 0.2
+    downloader = make_downloader(use_archive_index=False)
+    article_ids = [article_id for article_id, _, _ in downloader.get_download_tasks_k_most_recent(1000)]
+    assert article_ids == list(range(500, 0, -1))
+    assert fake_substack.num_errors > 0
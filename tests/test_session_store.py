@@ -0,0 +1,71 @@
+import json
+import os
+
+import pytest
+
+from downloaders.session_store import SessionStore
+
+ROOT_URL = 'https://example.substack.com'
+USERNAME = 'reader@example.com'
+PASSWORD = 'correct horse battery staple'
+COOKIES = [{'name': 'substack.sid', 'value': 's%3Asecret', 'domain': '.substack.com'}]
+
+
+@pytest.fixture
+def session_store(tmp_path) -> SessionStore:
+    session_store = SessionStore(str(tmp_path))
+    session_store.save(ROOT_URL, USERNAME, PASSWORD, 'https://example.substack.com', COOKIES)
+    return session_store
+
+
+def test_saved_session_is_loaded_back(session_store):
+    session = session_store.load(ROOT_URL, USERNAME, PASSWORD)
+    assert session['substack_url'] == 'https://example.substack.com'
+    assert session['cookies'] == COOKIES
+    # usernames are not case sensitive
+    assert session_store.load(ROOT_URL, USERNAME.upper(), PASSWORD)['cookies'] == COOKIES
+
+
+def test_saved_session_is_encrypted(tmp_path, session_store):
+    with open(os.path.join(tmp_path, SessionStore.filename)) as f:
+        contents = f.read()
+    assert 'secret' not in contents and USERNAME not in contents and ROOT_URL not in contents
+
+
+def test_session_is_only_loaded_for_its_publication_and_username(session_store):
+    assert session_store.load('https://other.substack.com', USERNAME, PASSWORD) is None
+    assert session_store.load(ROOT_URL, 'other@example.com', PASSWORD) is None
+
+
+def test_session_saved_under_another_password_is_discarded(session_store):
+    assert session_store.load(ROOT_URL, USERNAME, 'wrong password') is None
+
+
+@pytest.mark.parametrize('corrupt', ['not json', 'not a dict', 'tampered ciphertext', 'truncated nonce',
+                                     'missing field', 'not base64'])
+def test_corrupt_session_is_discarded(tmp_path, session_store, corrupt):
+    path_to_file = os.path.join(tmp_path, SessionStore.filename)
+    with open(path_to_file) as f:
+        encrypted_sessions = json.load(f)
+    encrypted_session = encrypted_sessions[SessionStore.get_session_key(ROOT_URL, USERNAME)]
+    if corrupt == 'tampered ciphertext':
+        ciphertext = encrypted_session['ciphertext']
+        encrypted_session['ciphertext'] = ('B' if ciphertext[0] == 'A' else 'A') + ciphertext[1:]
+    elif corrupt == 'truncated nonce':
+        encrypted_session['nonce'] = encrypted_session['nonce'][:8]
+    elif corrupt == 'missing field':
+        del encrypted_session['salt']
+    elif corrupt == 'not base64':
+        encrypted_session['salt'] = '%%%'
+    with open(path_to_file, 'w') as f:
+        if corrupt == 'not json':
+            f.write('{"truncated')
+        elif corrupt == 'not a dict':
+            json.dump([encrypted_sessions], f)
+        else:
+            json.dump(encrypted_sessions, f)
+
+    assert session_store.load(ROOT_URL, USERNAME, PASSWORD) is None
+    # and is replaced by the next session saved
+    session_store.save(ROOT_URL, USERNAME, PASSWORD, 'https://example.substack.com', COOKIES)
+    assert session_store.load(ROOT_URL, USERNAME, PASSWORD)['cookies'] == COOKIES
@@ -0,0 +1,44 @@
+import pytest
+
+from utilities.timing import DurationHistogram, StageTimings
+
+
+def test_histogram_keeps_counts_not_durations():
+    histogram = DurationHistogram()
+    for _ in range(100_000):
+        histogram.observe(0.3)
+    assert histogram.count == 100_000
+    assert len(histogram.bucket_counts) == len(DurationHistogram.bucket_bounds) + 1
+    assert histogram.sum == pytest.approx(30_000)
+
+
+def test_histogram_quantiles_are_interpolated_within_buckets():
+    histogram = DurationHistogram()
+    for duration in (0.3, 0.4, 0.45, 0.5):  # all in the (0.25, 0.5] bucket
+        histogram.observe(duration)
+    assert 0.25 < histogram.get_quantile(0.5) <= 0.5
+    assert histogram.get_quantile(0.99) <= 0.5
+    histogram.observe(1_000)
+    assert histogram.get_quantile(0.99) == DurationHistogram.bucket_bounds[-1]
+    assert DurationHistogram().get_quantile(0.5) == 0.0
+
+
+def test_textfile_is_written_by_its_own_thread(tmp_path, monkeypatch):
+    monkeypatch.setattr(StageTimings, 'textfile_write_interval', 0.05)
+    textfile_path = tmp_path / 'substack.prom'
+    stage_timings = StageTimings()
+    stage_timings.enable(textfile_path=str(textfile_path), worker_id=2)
+    try:
+        stage_timings.record('navigate', 1.5)
+        for _ in range(100):
+            if textfile_path.with_name('substack.worker-2.prom').exists():
+                break
+            stage_timings._stop_event.wait(0.05)
+    finally:
+        stage_timings.close()
+    textfile = textfile_path.with_name('substack.worker-2.prom').read_text()
+    assert 'substack_archives_downloader_stage_duration_seconds_bucket{worker="2",stage="navigate",le="2.5"} 1' \
+        in textfile
+    assert 'substack_archives_downloader_stage_duration_seconds_count{worker="2",stage="navigate"} 1' in textfile
+    assert 'substack_archives_downloader_last_update_timestamp_seconds{worker="2"}' in textfile
+    assert not textfile_path.exists()
@@ -0,0 +1,89 @@
+import socket
+from typing import Optional
+
+import pytest
+
+from utilities import exceptions
+from watcher import Watcher, WatchedPublication
+
+
+class StubDownloader:
+    # stands in for a signed-in SubstackArchivesDownloader, whose session expires when told to
+    def __init__(self):
+        self.is_session_expired = False
+        self.num_session_checks = 0
+        self.num_sign_ins = 0
+        self.substack_url = 'https://example.substack.com'
+        self.unreachable_urls: set[str] = set()
+
+    def ensure_signed_in(self) -> bool:
+        self.num_session_checks += 1
+        if not self.is_session_expired:
+            return False
+        self.is_session_expired = False
+        self.num_sign_ins += 1
+        return True
+
+    def download_new_articles(self, download_podcasts: bool) -> int:
+        if self.is_session_expired:
+            raise RuntimeError("signed out")
+        return 0
+
+    def get_substack_url(self) -> str:
+        return self.substack_url
+
+    def switch_publication(self, input_url: str, substack_url: Optional[str] = None):
+        if input_url in self.unreachable_urls:
+            raise ConnectionError(f"{input_url} is unreachable")
+        self.substack_url = substack_url or input_url
+
+
+@pytest.mark.parametrize('poll_interval, jitter, num_render_workers',
+                         [(0, 0.2, 1), (-600, 0.2, 1), (600, 1.0, 1), (600, -0.1, 1), (600, 0.2, 0)])
+def test_invalid_settings_are_rejected(poll_interval, jitter, num_render_workers):
+    with pytest.raises(exceptions.InvalidWatchSettings):
+        Watcher(['https://example.substack.com'], poll_interval, jitter, num_render_workers=num_render_workers)
+
+
+def test_session_is_checked_every_few_polls_and_after_failed_polls():
+    watcher = Watcher(['https://example.substack.com'])
+    watched_publication = WatchedPublication('https://example.substack.com')
+    downloader = StubDownloader()
+    for _ in range(2 * Watcher.session_check_interval + 1):
+        watcher._poll(downloader, watched_publication, watched_publication.url)
+    assert downloader.num_session_checks == 2
+
+    downloader.is_session_expired = True
+    watcher._poll(downloader, watched_publication, watched_publication.url)  # not checked, so it fails
+    watcher._poll(downloader, watched_publication, watched_publication.url)  # checked after the failed poll, so it signs in again
+    assert downloader.num_sign_ins == 1
+    assert watched_publication.num_failed_polls == 1
+    assert watched_publication.last_error is None
+
+
+def test_failed_switch_is_retried_at_next_poll_without_stopping_watching():
+    watcher = Watcher(['https://example.substack.com', 'https://other.substack.com'])
+    watched_publication = WatchedPublication('https://other.substack.com')
+    downloader = StubDownloader()
+    downloader.unreachable_urls.add(watched_publication.url)
+
+    current_url = watcher._poll(downloader, watched_publication, 'https://example.substack.com')
+    assert current_url == 'https://example.substack.com'
+    assert watched_publication.num_failed_polls == 1
+    assert watched_publication.last_error == "https://other.substack.com is unreachable"
+    assert watched_publication.substack_url is None  # not the substack url of the publication still pointed at
+    assert watched_publication.next_poll_time > 0
+
+    downloader.unreachable_urls.clear()
+    current_url = watcher._poll(downloader, watched_publication, current_url)
+    assert current_url == watched_publication.url
+    assert watched_publication.last_error is None
+    assert watched_publication.substack_url == watched_publication.url
+
+
+def test_status_port_in_use_does_not_stop_watching():
+    with socket.socket() as other_server:
+        other_server.bind((Watcher.status_host, 0))
+        other_server.listen()
+        watcher = Watcher(['https://example.substack.com'], status_port=other_server.getsockname()[1])
+        assert watcher._start_status_server() is None
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from downloaders.work_queue import DONE, FAILED, PENDING, WorkQueue
+
+
+@pytest.fixture
+def work_queue(tmp_path) -> WorkQueue:
+    work_queue = WorkQueue(str(tmp_path), max_attempts=2)
+    work_queue.enqueue('https://example.substack.com', [
+        (1, 'https://example.substack.com/p/post-1', '/output/post-1.pdf'),
+        (2, 'https://example.substack.com/p/post-2', '/output/post-2.pdf'),
+    ])
+    yield work_queue
+    work_queue.close()
+
+
+def test_enqueueing_an_article_again_does_nothing(work_queue):
+    assert work_queue.enqueue('https://example.substack.com',
+                              [(1, 'https://example.substack.com/p/post-1', '/output/post-1.pdf')]) == 0
+    assert work_queue.get_num_items_by_status()[PENDING] == 2
+
+
+def test_article_of_another_publication_with_the_same_output_path_is_told_apart_by_id(work_queue):
+    assert work_queue.enqueue('https://other.substack.com',
+                              [(3, 'https://other.substack.com/p/post-1', '/output/post-1.pdf')]) == 1
+    output_paths = {}
+    while (item := work_queue.lease('worker-1', visibility_timeout=60)) is not None:
+        _, article_id, _, _, output_path, _ = item
+        output_paths[article_id] = output_path
+    assert output_paths == {1: '/output/post-1.pdf', 2: '/output/post-2.pdf', 3: '/output/post-1 (3).pdf'}
+
+
+def test_leased_item_is_not_leased_again_until_its_lease_expires(work_queue):
+    first_item = work_queue.lease('worker-1', visibility_timeout=0.2)
+    second_item = work_queue.lease('worker-2', visibility_timeout=0.2)
+    assert first_item[1] == 1 and second_item[1] == 2
+    assert work_queue.lease('worker-3', visibility_timeout=0.2) is None
+
+    time.sleep(0.3)
+    item = work_queue.lease('worker-3', visibility_timeout=60)
+    work_item_id, article_id, *_, attempts = item
+    assert article_id == 1 and attempts == 2
+    # the worker whose lease expired can no longer complete the item
+    assert not work_queue.complete(first_item[0], 'worker-1')
+    assert work_queue.complete(work_item_id, 'worker-3')
+    assert work_queue.get_num_items_by_status()[DONE] == 1
+
+
+def test_item_fails_once_out_of_attempts(work_queue):
+    for attempt in range(2):
+        work_item_id, article_id, *_ = work_queue.lease('worker-1', visibility_timeout=60)
+        assert article_id == 1
+        work_queue.fail(work_item_id, 'worker-1', f'error {attempt}')
+    assert work_queue.get_failed_items() == [('https://example.substack.com/p/post-1', 'error 1')]
+
+    assert work_queue.retry_failed_items() == 1
+    assert work_queue.get_num_items_by_status()[FAILED] == 0
+
+
+def test_expired_lease_fails_once_out_of_attempts(work_queue):
+    for _ in range(2):
+        work_queue.lease('worker-1', visibility_timeout=0.05)  # item 1, then item 2
+    time.sleep(0.1)
+    for _ in range(2):
+        work_queue.lease('worker-1', visibility_timeout=0.05)
+    time.sleep(0.1)
+    assert not work_queue.has_unfinished_items()
+    assert [error for _, error in work_queue.get_failed_items()] == ['lease expired', 'lease expired']
@@ -1,10 +1,11 @@
-from downloaders.substack_archives_downloader import SubstackArchivesDownloader
 from utilities import exceptions, helper
+from utilities.timing import startup_timing
 
 
 class SubstackArchivesDownloaderUserInterface:
 
-    def __init__(self):
+    def __init__(self, num_render_workers: int = 1):
+        self.num_render_workers = num_render_workers  # more than 1 renders in parallel using headless workers
         self.downloader = None
         self.username = None
         self.password = None
@@ -27,7 +28,11 @@ class SubstackArchivesDownloaderUserInterface:
                     print("The browser will perform the scraping in the background.")
                 else:
                     print("A new window will open during the scraping.")
-                self.downloader = SubstackArchivesDownloader(input_url, is_headless)
+                startup_timing.skip()
+                # imported once it is needed, so that the first prompt is shown without waiting for selenium
+                from downloaders.substack_archives_downloader import SubstackArchivesDownloader
+                startup_timing.record('import downloader')
+                self.downloader = SubstackArchivesDownloader(input_url, is_headless, self.num_render_workers)
                 return True
             except exceptions.InitialisationExceptions as init_exc:
                 print(init_exc)
@@ -1,3 +1,6 @@
+from typing import Optional
+
+
 class InitialisationExceptions(Exception):
     """For exceptions arising during initialisation"""
     pass
@@ -108,6 +111,48 @@ class InitialLoadError(ErrorWhileLoadingArticles):
 
 class SubsequentLoadError(ErrorWhileLoadingArticles):
     pass
+
+
+class ErrorWhileSavingPDF(Exception):
+    """Raised when the browser does not finish saving a PDF in time"""
+
+    def __init__(self, output_path: str):
+        self.output_path = output_path
+
+    def __str__(self):
+        return f"Timed out while saving {self.output_path}."
+
+
+class InvalidJobFile(InitialisationExceptions):
+    """Raised when a batch job file cannot be read or describes an invalid job"""
+
+    def __init__(self, job_file_path: str, reason: str):
+        self.job_file_path = job_file_path
+        self.reason = reason
+
+    def __str__(self):
+        return f"Please check the job file at {self.job_file_path}: {self.reason}."
+
+
+class ChromedriverNotCached(InitialisationExceptions):
+    """Raised when offline and no chromedriver has been cached for the installed Chrome"""
+
+    def __init__(self, chrome_version: Optional[str]):
+        self.chrome_version = chrome_version
+
+    def __str__(self):
+        chrome = f"Chrome {self.chrome_version}" if self.chrome_version else "Chrome"
+        return f"No chromedriver has been cached for {chrome} yet. Please run once without --offline."
+
+
+class InvalidWatchSettings(InitialisationExceptions):
+    """Raised when the poll interval or jitter of a Watcher is out of range"""
+
+    def __init__(self, reason: str):
+        self.reason = reason
+
+    def __str__(self):
+        return f"Please check the watch settings: {self.reason}."
 # class PreDownloadExceptions(Exception):
 #     """
 #     Raised when exception occurs pre-download
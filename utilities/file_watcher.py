@@ -0,0 +1,56 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import sys
+import time
+
+# from <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+
+
+class FolderWatcher:
+    """
+    Blocks until something changes in a folder, using inotify on Linux and falling back to polling elsewhere
+    (or if inotify is unavailable). It only says *that* something changed; callers list the folder themselves.
+    """
+
+    def __init__(self, path_to_folder: str, poll_interval: float = 0.2):
+        self._path_to_folder = path_to_folder
+        self._poll_interval = poll_interval
+        self._inotify_fd = FolderWatcher._add_inotify_watch(path_to_folder)
+
+    def wait_for_changes(self, timeout: float):
+        if self._inotify_fd is None:
+            time.sleep(min(timeout, self._poll_interval))
+            return
+        readable, _, _ = select.select([self._inotify_fd], [], [], max(timeout, 0))
+        if readable:
+            os.read(self._inotify_fd, 64 * 1024)  # drain pending events; their contents do not matter
+
+    def close(self):
+        if self._inotify_fd is not None:
+            os.close(self._inotify_fd)
+            self._inotify_fd = None
+
+    @staticmethod
+    def _add_inotify_watch(path_to_folder: str):
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            inotify_fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+            if inotify_fd < 0:
+                return None
+            watch_descriptor = libc.inotify_add_watch(inotify_fd, os.fsencode(path_to_folder),
+                                                      _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE)
+            if watch_descriptor < 0:
+                os.close(inotify_fd)
+                return None
+            return inotify_fd
+        except (OSError, AttributeError):  # no libc, or a libc without inotify
+            return None
@@ -1,18 +1,18 @@
 import re
 from urllib.parse import urlparse
 
-from validators.url import url
-from validators.email import email
-
 from utilities import exceptions
 
 
+# validators is imported when first needed, as importing it slows down starting up
 def input_is_url(input_url: str) -> None:
+    from validators.url import url
     if not url(input_url, public=True):
         raise exceptions.NotUrlException(input_url)
 
 
 def input_email_validation(input_email: str):
+    from validators.email import email
     if not email(input_email):
         raise exceptions.UsernameNotEmail(input_email)
 
@@ -0,0 +1,50 @@
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+_END_OF_ITERABLE = object()
+
+
+def prefetch_in_background(iterable: Iterable[T], max_prefetched: int) -> Iterator[T]:
+    """
+    Iterates over iterable in a background thread, staying at most max_prefetched items ahead of the consumer
+    (so a slow consumer applies backpressure instead of letting the queue grow without bound).
+    Exceptions raised by iterable are re-raised in the consumer once the items before them have been consumed.
+    :param iterable: e.g. a generator of articles yielded as archive pages arrive
+    :param max_prefetched: size of the queue between producer and consumer
+    """
+    items: queue.Queue = queue.Queue(maxsize=max_prefetched)
+    consumer_stopped = threading.Event()
+
+    def put(item) -> bool:
+        while not consumer_stopped.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_END_OF_ITERABLE)
+        except BaseException as exc:
+            put(exc)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _END_OF_ITERABLE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        consumer_stopped.set()  # unblocks the producer if the consumer stopped early
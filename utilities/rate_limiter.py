@@ -0,0 +1,156 @@
+from collections import deque
+import random
+import threading
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+
+class RateLimiter:
+    """
+    Per-host token bucket shared by everything that sends requests (archive API calls, browser navigations),
+    so that parallel workers are polite as a whole rather than individually.
+
+    Pacing is adaptive: each host's rate starts at requests_per_second, creeps up towards max_requests_per_second
+    while responses are fast, and is halved (down to min_requests_per_second) whenever a response is slow or an error.
+    Waits are jittered so that requests do not go out in lockstep.
+
+    Each host also has a CircuitBreaker: when too many recent responses from a host are errors, or the host asks
+    us to come back later (Retry-After), every caller waiting for its turn on that host is paused.
+    """
+
+    def __init__(self, requests_per_second: float = 1.0, max_requests_per_second: float = 4.0,
+                 min_requests_per_second: float = 0.2, burst: int = 2, jitter: float = 0.25,
+                 slow_response_time: float = 5.0, requests_per_second_by_host: Optional[dict[str, float]] = None):
+        """
+        :param requests_per_second: initial rate for hosts not in requests_per_second_by_host
+        :param burst: number of requests that can be sent back to back after a quiet period
+        :param jitter: waits are scaled by a random factor between 1 - jitter and 1 + jitter
+        :param slow_response_time: in seconds; responses slower than this make the host's rate back off
+        :param requests_per_second_by_host: initial rate for specific hosts and their subdomains, e.g.
+        {'substack.com': 0.5} for substack.com and every *.substack.com (the longest matching domain wins)
+        """
+        assert 0 < min_requests_per_second <= requests_per_second <= max_requests_per_second
+        self._requests_per_second = requests_per_second
+        self._max_requests_per_second = max_requests_per_second
+        self._min_requests_per_second = min_requests_per_second
+        self._burst = burst
+        self._jitter = jitter
+        self._slow_response_time = slow_response_time
+        self._requests_per_second_by_host = requests_per_second_by_host or {}
+        self._lock = threading.Lock()
+        self._buckets: dict[str, TokenBucket] = {}
+        self._circuit_breakers: dict[str, CircuitBreaker] = {}
+
+    def wait_for_turn(self, url: str):
+        self._get_circuit_breaker(url).wait_until_closed()
+        self._get_bucket(url).acquire(self._jitter)
+
+    def pause(self, url: str, seconds: float):
+        # e.g. when the host responds with Retry-After
+        self._get_circuit_breaker(url).open_for(seconds)
+
+    def record_response(self, url: str, response_time: float, is_error: bool = False):
+        self._get_circuit_breaker(url).record(is_error)
+        bucket = self._get_bucket(url)
+        # additive increase, multiplicative decrease, as in TCP congestion control
+        if is_error or response_time > self._slow_response_time:
+            bucket.set_rate(max(bucket.get_rate() / 2, self._min_requests_per_second))
+        else:
+            bucket.set_rate(min(bucket.get_rate() + 0.1, self._max_requests_per_second))
+
+    def get_rate(self, url: str) -> float:
+        return self._get_bucket(url).get_rate()
+
+    def _get_bucket(self, url: str) -> 'TokenBucket':
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self._get_initial_rate(urlparse(url).hostname or host), self._burst)
+            return self._buckets[host]
+
+    def _get_initial_rate(self, hostname: str) -> float:
+        # e.g. for foo.substack.com: foo.substack.com, then substack.com, then com
+        labels = hostname.lower().split('.')
+        for idx in range(len(labels)):
+            domain = '.'.join(labels[idx:])
+            if domain in self._requests_per_second_by_host:
+                return self._requests_per_second_by_host[domain]
+        return self._requests_per_second
+
+    def _get_circuit_breaker(self, url: str) -> 'CircuitBreaker':
+        host = urlparse(url).netloc
+        with self._lock:
+            if host not in self._circuit_breakers:
+                self._circuit_breakers[host] = CircuitBreaker()
+            return self._circuit_breakers[host]
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self._rate = rate  # tokens per second
+        self._capacity = capacity
+        self._tokens = float(capacity)
+        self._last_refill_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, jitter: float = 0.0):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait_time = (1 - self._tokens) / self._rate
+            time.sleep(wait_time * random.uniform(1 - jitter, 1 + jitter))
+
+    def get_rate(self) -> float:
+        return self._rate
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill()  # tokens accrued so far count at the old rate
+            self._rate = rate
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._last_refill_time) * self._rate)
+        self._last_refill_time = now
+
+
+class CircuitBreaker:
+    """
+    Opens (i.e. blocks every caller of wait_until_closed) for cooldown seconds once at least half of the last
+    window_size responses were errors. The window is cleared when it opens, so it closes again on its own
+    and the next few responses decide whether it needs to open again.
+    """
+
+    def __init__(self, window_size: int = 20, error_rate_threshold: float = 0.5, cooldown: float = 30.0):
+        self._outcomes: deque[bool] = deque(maxlen=window_size)  # True for errors
+        self._min_outcomes = window_size // 2
+        self._error_rate_threshold = error_rate_threshold
+        self._cooldown = cooldown
+        self._open_until = 0.0  # time.monotonic() at which the breaker closes
+        self._lock = threading.Lock()
+
+    def record(self, is_error: bool):
+        with self._lock:
+            self._outcomes.append(is_error)
+            if len(self._outcomes) < self._min_outcomes:
+                return
+            if sum(self._outcomes) / len(self._outcomes) >= self._error_rate_threshold:
+                self._open_until = max(self._open_until, time.monotonic() + self._cooldown)
+                self._outcomes.clear()
+                print(f"Too many errors, pausing requests for {self._cooldown:.0f}s")
+
+    def open_for(self, seconds: float):
+        with self._lock:
+            self._open_until = max(self._open_until, time.monotonic() + seconds)
+
+    def wait_until_closed(self):
+        while True:
+            with self._lock:
+                wait_time = self._open_until - time.monotonic()
+            if wait_time <= 0:
+                return
+            time.sleep(wait_time)
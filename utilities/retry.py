@@ -0,0 +1,38 @@
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import random
+from typing import Optional
+
+import requests
+
+# 429 Too Many Requests and the 5xx that usually mean "try again later" rather than "this will never work"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def is_retryable(response: requests.Response) -> bool:
+    return response.status_code in RETRYABLE_STATUS_CODES
+
+
+def get_retry_after(response: requests.Response, cap: float = 300.0) -> Optional[float]:
+    """
+    :param cap: in seconds; a host asking us to come back tomorrow is retried after cap instead
+    :return: seconds to wait according to the Retry-After header, which is either a number of seconds
+    or an HTTP date; None if the header is missing or malformed
+    """
+    retry_after = response.headers.get('Retry-After')
+    if retry_after is None:
+        return None
+    if retry_after.strip().isdigit():
+        return min(cap, float(retry_after))
+    try:
+        retry_after_date = parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    if retry_after_date.tzinfo is None:  # e.g. with a -0000 offset, which HTTP dates are in UTC anyway
+        retry_after_date = retry_after_date.replace(tzinfo=timezone.utc)
+    return min(cap, max(0.0, (retry_after_date - datetime.now(timezone.utc)).total_seconds()))
+
+
+def get_backoff_time(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    # exponential backoff with full jitter, see https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/
+    return random.uniform(0, min(cap, base * 2 ** attempt))
@@ -0,0 +1,272 @@
+import bisect
+from contextlib import contextmanager
+import itertools
+import json
+import os
+import threading
+import time
+from typing import Iterator, Optional
+
+
+class StartupTiming:
+    """
+    Breakdown of how long starting up takes, from the program starting to the first browser being ready
+    (importing modules, resolving chromedriver, launching the browser, ...), so that regressions in cold start
+    are easy to spot. Each step is timed from the end of the previous one.
+    Only printed when enabled, e.g. by main.py's --startup-timing.
+    """
+
+    def __init__(self):
+        self.is_enabled = False
+        self._last_time = time.perf_counter()
+        self.steps: list[tuple[str, float]] = []  # (step, time in seconds)
+        self._is_reported = False
+
+    def record(self, step: str):
+        # called once step has finished; steps after starting up are not recorded
+        if self._is_reported:
+            return
+        now = time.perf_counter()
+        self.steps.append((step, now - self._last_time))
+        self._last_time = now
+
+    def skip(self):
+        # e.g. time spent waiting for the user's input, which is not part of starting up
+        self._last_time = time.perf_counter()
+
+    def get_elapsed_time(self) -> float:
+        return sum(step_time for _, step_time in self.steps)
+
+    def report(self, final_step: Optional[str] = None):
+        # printed at most once, as later browsers (e.g. render workers') are not part of starting up
+        if self._is_reported:
+            return
+        if final_step:
+            self.record(final_step)
+        self._is_reported = True
+        if self.is_enabled:
+            print(self)
+
+    def __str__(self):
+        lines = [f"Started up in {self.get_elapsed_time():.3f}s:"]
+        for step, step_time in self.steps:
+            lines.append(f"  {step}: {step_time:.3f}s")
+        return '\n'.join(lines)
+
+
+class Span:
+    # yielded by StageTimings.span, for the stage to report what it did
+    def __init__(self):
+        self.num_bytes = 0
+        self.is_error = False
+
+    def add_bytes(self, num_bytes: int):
+        self.num_bytes += num_bytes
+
+    def set_error(self):
+        # for stages that fail without raising, e.g. timing out while waiting for an element
+        self.is_error = True
+
+
+class DurationHistogram:
+    """
+    Durations counted in fixed buckets, like a Prometheus histogram, so that a stage takes as much memory after a
+    week-long run as after a minute. Quantiles are estimated from the buckets, so they are only as precise as the
+    buckets are narrow.
+    """
+    # upper bounds in seconds, from waiting for the rate limiter to rendering a very long article
+    bucket_bounds = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+    def __init__(self):
+        self.bucket_counts = [0] * (len(self.bucket_bounds) + 1)  # the last one for durations beyond every bound
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, duration: float):
+        self.bucket_counts[bisect.bisect_left(self.bucket_bounds, duration)] += 1
+        self.count += 1
+        self.sum += duration
+
+    def get_cumulative_counts(self) -> list[int]:
+        # as exported, i.e. the number of durations up to each bound, then the count for le="+Inf"
+        return list(itertools.accumulate(self.bucket_counts))
+
+    def get_quantile(self, quantile: float) -> float:
+        # interpolated linearly within the bucket the quantile falls into, like Prometheus' histogram_quantile
+        if self.count == 0:
+            return 0.0
+        rank = quantile * self.count
+        lower_count = 0
+        for idx, bucket_count in enumerate(self.bucket_counts):
+            if lower_count + bucket_count >= rank and bucket_count:
+                if idx == len(self.bucket_bounds):
+                    return self.bucket_bounds[-1]  # beyond every bound, so only known to be at least the last one
+                lower_bound = self.bucket_bounds[idx - 1] if idx else 0.0
+                upper_bound = self.bucket_bounds[idx]
+                return lower_bound + (upper_bound - lower_bound) * (rank - lower_count) / bucket_count
+            lower_count += bucket_count
+        return self.bucket_bounds[-1]
+
+
+class StageTimings:
+    """
+    Times each stage of a run (signing in, loading archive pages, navigating, generating and writing PDFs, ...),
+    per article and aggregated by stage: count, errors, p50/p95/p99 (see DurationHistogram) and bytes written, so
+    that a slow run shows where its time went.
+
+    Once enabled (e.g. by main.py's --stage-timing, --metrics-jsonl and --metrics-textfile), every span is appended
+    to a JSON lines file if one is given, and the aggregates are written to a Prometheus textfile (for the node
+    exporter's textfile collector) by a thread of its own every textfile_write_interval seconds, and when closed.
+    Worker processes (see Coordinator) each write a textfile of their own, next to it and labelled by worker, as
+    the textfile collector reads every *.prom file in its folder.
+    """
+    metric_prefix = 'substack_archives_downloader'
+    quantiles = (0.5, 0.95, 0.99)
+    textfile_write_interval = 15  # in seconds
+    # set by main.py's --metrics-textfile, so that worker processes know where to write their own textfiles
+    textfile_environment_variable = 'SUBSTACK_ARCHIVES_DOWNLOADER_METRICS_TEXTFILE'
+
+    def __init__(self):
+        self.is_enabled = False
+        self._lock = threading.Lock()  # spans end in render workers' and archive page requests' threads
+        self._jsonl_file = None
+        self._textfile_path: Optional[str] = None
+        self._textfile_labels = ''  # e.g. 'worker="0",' in a worker process's textfile
+        self._textfile_writer: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._histograms_by_stage: dict[str, DurationHistogram] = {}
+        self._num_errors_by_stage: dict[str, int] = {}
+        self._num_bytes_by_stage: dict[str, int] = {}
+
+    def enable(self, jsonl_path: Optional[str] = None, textfile_path: Optional[str] = None,
+               worker_id: Optional[int] = None):
+        """
+        :param worker_id: of the worker process, whose textfile is then its own (see get_worker_textfile_path)
+        """
+        self.is_enabled = True
+        if jsonl_path:
+            self._jsonl_file = open(jsonl_path, 'a', buffering=1)  # line buffered, so that it can be tailed
+        if textfile_path:
+            self._textfile_path = textfile_path
+            if worker_id is not None:
+                self._textfile_path = StageTimings.get_worker_textfile_path(textfile_path, worker_id)
+                self._textfile_labels = f'worker="{worker_id}",'
+            self._stop_event.clear()
+            self._textfile_writer = threading.Thread(target=self._write_textfile_periodically, daemon=True)
+            self._textfile_writer.start()
+
+    def enable_in_worker_process(self, worker_id: int):
+        # only the textfile, as worker processes appending to the same JSON lines file would interleave their lines
+        textfile_path = os.environ.get(StageTimings.textfile_environment_variable)
+        if textfile_path:
+            self.enable(textfile_path=textfile_path, worker_id=worker_id)
+
+    def close(self):
+        if self._textfile_writer:
+            self._stop_event.set()
+            self._textfile_writer.join()
+            self._textfile_writer = None
+        with self._lock:
+            if self._textfile_path:
+                self._write_textfile()
+            if self._jsonl_file:
+                self._jsonl_file.close()
+                self._jsonl_file = None
+
+    @contextmanager
+    def span(self, stage: str, url: Optional[str] = None) -> Iterator[Span]:
+        span = Span()
+        start_time = time.perf_counter()
+        try:
+            yield span
+        except BaseException:
+            span.set_error()
+            raise
+        finally:
+            if self.is_enabled:
+                self.record(stage, time.perf_counter() - start_time, url, span.num_bytes, span.is_error)
+
+    def record(self, stage: str, duration: float, url: Optional[str] = None, num_bytes: int = 0,
+               is_error: bool = False):
+        """
+        :param duration: in seconds
+        :param url: of the article, or of the API call
+        """
+        if not self.is_enabled:
+            return
+        with self._lock:
+            if stage not in self._histograms_by_stage:
+                self._histograms_by_stage[stage] = DurationHistogram()
+            self._histograms_by_stage[stage].observe(duration)
+            self._num_errors_by_stage[stage] = self._num_errors_by_stage.get(stage, 0) + is_error
+            self._num_bytes_by_stage[stage] = self._num_bytes_by_stage.get(stage, 0) + num_bytes
+            if self._jsonl_file:
+                self._jsonl_file.write(json.dumps({
+                    'time': time.time(), 'stage': stage, 'duration': duration, 'url': url,
+                    'bytes': num_bytes, 'error': is_error,
+                }) + '\n')
+
+    def get_quantile(self, stage: str, quantile: float) -> float:
+        with self._lock:
+            histogram = self._histograms_by_stage.get(stage)
+            return histogram.get_quantile(quantile) if histogram else 0.0
+
+    def _write_textfile_periodically(self):
+        # rather than from record, so that the stage that happens to cross the interval does not pay for the write
+        while not self._stop_event.wait(self.textfile_write_interval):
+            with self._lock:
+                self._write_textfile()
+
+    def _write_textfile(self):
+        # called with the lock held; written to a temporary file first, as the node exporter may read it at any time
+        lines = []
+        for metric, metric_type, description in (
+                ('stage_duration_seconds', 'histogram', 'Time spent in each stage.'),
+                ('stage_errors_total', 'counter', 'Spans of each stage that failed.'),
+                ('stage_bytes_total', 'counter', 'Bytes written by each stage.')):
+            lines.append(f'# HELP {self.metric_prefix}_{metric} {description}')
+            lines.append(f'# TYPE {self.metric_prefix}_{metric} {metric_type}')
+            for stage, histogram in sorted(self._histograms_by_stage.items()):
+                label = f'{self._textfile_labels}stage="{stage}"'
+                if metric == 'stage_duration_seconds':
+                    for bucket_bound, cumulative_count in zip((*DurationHistogram.bucket_bounds, '+Inf'),
+                                                              histogram.get_cumulative_counts()):
+                        lines.append(f'{self.metric_prefix}_{metric}_bucket{{{label},le="{bucket_bound}"}} '
+                                     f'{cumulative_count}')
+                    lines.append(f'{self.metric_prefix}_{metric}_sum{{{label}}} {histogram.sum}')
+                    lines.append(f'{self.metric_prefix}_{metric}_count{{{label}}} {histogram.count}')
+                elif metric == 'stage_errors_total':
+                    lines.append(f'{self.metric_prefix}_{metric}{{{label}}} {self._num_errors_by_stage[stage]}')
+                else:
+                    lines.append(f'{self.metric_prefix}_{metric}{{{label}}} {self._num_bytes_by_stage[stage]}')
+        worker_label = f'{{{self._textfile_labels.rstrip(",")}}}' if self._textfile_labels else ''
+        lines.append(f'# HELP {self.metric_prefix}_last_update_timestamp_seconds When these metrics were written.')
+        lines.append(f'# TYPE {self.metric_prefix}_last_update_timestamp_seconds gauge')
+        lines.append(f'{self.metric_prefix}_last_update_timestamp_seconds{worker_label} {time.time()}')
+        part_path = f'{self._textfile_path}.{os.getpid()}.part'
+        with open(part_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(part_path, self._textfile_path)
+
+    @staticmethod
+    def get_worker_textfile_path(textfile_path: str, worker_id: int) -> str:
+        # e.g. substack.worker-0.prom for substack.prom, so that the textfile collector still picks it up
+        root, extension = os.path.splitext(textfile_path)
+        return f'{root}.worker-{worker_id}{extension}'
+
+    def __str__(self):
+        with self._lock:
+            lines = [f"{'stage':<20} {'count':>7} {'errors':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'total':>9} "
+                     f"{'MiB':>8}"]
+            for stage, histogram in sorted(self._histograms_by_stage.items()):
+                p50, p95, p99 = (histogram.get_quantile(quantile) for quantile in self.quantiles)
+                lines.append(f"{stage:<20} {histogram.count:>7} {self._num_errors_by_stage[stage]:>6} "
+                             f"{p50:>7.3f}s {p95:>7.3f}s {p99:>7.3f}s {histogram.sum:>8.1f}s "
+                             f"{self._num_bytes_by_stage[stage] / (1024 * 1024):>8.1f}")
+            return '\n'.join(lines)
+
+
+# started when first imported, which main.py does before anything else
+startup_timing = StartupTiming()
+# enabled by main.py, and in worker processes (see Coordinator) if main.py was given --metrics-textfile
+stage_timings = StageTimings()
@@ -0,0 +1,196 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+from typing import Optional
+
+from downloaders.substack_archives_downloader import SubstackArchivesDownloader
+from utilities import exceptions, helper
+
+
+class WatchedPublication:
+    def __init__(self, url: str):
+        self.url = url
+        self.substack_url: Optional[str] = None  # once resolved, so that switching back to it is free
+        self.next_poll_time = 0.0  # time.monotonic() at which it is next polled; 0.0 to poll straight away
+        self.num_polls = 0
+        self.num_failed_polls = 0
+        self.num_downloaded = 0
+        self.last_polled_at: Optional[float] = None  # time.time(), for the status endpoint
+        self.last_downloaded_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def convert_to_dict(self) -> dict:
+        publication_dict = dict(vars(self))
+        publication_dict['next_poll_in'] = max(0.0, publication_dict.pop('next_poll_time') - time.monotonic())
+        return publication_dict
+
+
+class Watcher:
+    """
+    Keeps one headless browser signed in, and polls each watched publication for new articles until stopped: only
+    the first page of its archive is requested (conditionally, so an unchanged page costs a 304, see ResponseCache),
+    and only the articles on it that have not been downloaded before are rendered (see
+    SubstackArchivesDownloader.download_new_articles). Between polls, nothing but a timer is running.
+
+    Each publication is polled every poll_interval seconds on average, jittered by up to jitter * poll_interval
+    either way so that polls do not line up with each other (or with anyone else's). A poll that fails is retried at
+    the next poll. If status_port is not 0, the state of every publication is served as JSON on localhost.
+
+    Sessions expire, so the signed-in session is checked with a cheap API call every session_check_interval polls
+    and after every failed poll, and the browser signs in again when it has expired.
+    """
+    status_host = '127.0.0.1'  # local only; the status reveals which publications are watched
+    session_check_interval = 6  # in polls, i.e. about an hour at the default poll interval
+
+    def __init__(self, urls: list[str], poll_interval: float = 600, jitter: float = 0.2,
+                 download_podcasts: bool = False, status_port: int = 0, num_render_workers: int = 1):
+        """
+        :param poll_interval: in seconds
+        :param status_port: of the status endpoint, or 0 for none
+        :param num_render_workers: more than 1 renders the new articles of a poll in parallel
+        """
+        if poll_interval <= 0:
+            raise exceptions.InvalidWatchSettings("the poll interval must be positive")
+        if not 0 <= jitter < 1:
+            raise exceptions.InvalidWatchSettings("the jitter must be at least 0 and less than 1")
+        if num_render_workers < 1:
+            raise exceptions.InvalidWatchSettings("the number of render workers must be at least 1")
+        for url in urls:
+            helper.input_is_url(url)
+        self._watched_publications = [WatchedPublication(url) for url in urls]
+        self._poll_interval = poll_interval
+        self._jitter = jitter
+        self._download_podcasts = download_podcasts
+        self._status_port = status_port
+        self._num_render_workers = num_render_workers
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()  # the status endpoint reads the state of publications from its own thread
+        self._started_at = time.time()
+        self._polling_url: Optional[str] = None
+        self._num_polls_since_session_check = 0
+
+    def run(self, username: str, password: str):
+        status_server = None
+        downloader = SubstackArchivesDownloader(self._watched_publications[0].url, is_headless=True,
+                                                num_render_workers=self._num_render_workers)
+        current_url = self._watched_publications[0].url
+        try:
+            downloader.log_in(username, password)
+            status_server = self._start_status_server() if self._status_port else None
+            while not self._stop_event.is_set():
+                watched_publication = min(self._watched_publications,
+                                          key=lambda publication: publication.next_poll_time)
+                if self._stop_event.wait(max(0.0, watched_publication.next_poll_time - time.monotonic())):
+                    break
+                current_url = self._poll(downloader, watched_publication, current_url)
+        finally:
+            downloader.shut_down()
+            if status_server:
+                status_server.shutdown()
+                status_server.server_close()
+
+    def stop(self):
+        # e.g. from a signal handler; a poll in progress is finished first
+        self._stop_event.set()
+
+    def _poll(self, downloader: SubstackArchivesDownloader, watched_publication: WatchedPublication,
+              current_url: str) -> str:
+        """
+        :param current_url: of the publication the downloader is pointed at
+        :return: the url of the publication the downloader is pointed at afterwards, which is still current_url if
+        switching to watched_publication failed (in which case it is polled again at its next poll, like any other
+        failed poll)
+        """
+        with self._lock:
+            self._polling_url = watched_publication.url
+        try:
+            if watched_publication.url != current_url:
+                downloader.switch_publication(watched_publication.url, watched_publication.substack_url)
+                current_url = watched_publication.url
+            self._ensure_signed_in(downloader)
+            num_downloaded = downloader.download_new_articles(self._download_podcasts)
+            error = None
+        except Exception as exc:
+            num_downloaded = 0
+            error = str(exc) or type(exc).__name__
+            print(f"Polling {watched_publication.url} failed: {error}")
+            self._num_polls_since_session_check = Watcher.session_check_interval  # in case it failed for that
+        with self._lock:
+            self._polling_url = None
+            if current_url == watched_publication.url:
+                watched_publication.substack_url = downloader.get_substack_url()
+            watched_publication.num_polls += 1
+            watched_publication.last_polled_at = time.time()
+            watched_publication.last_error = error
+            if error:
+                watched_publication.num_failed_polls += 1
+            if num_downloaded:
+                watched_publication.num_downloaded += num_downloaded
+                watched_publication.last_downloaded_at = watched_publication.last_polled_at
+                print(f"Downloaded {num_downloaded} new article(s) of {watched_publication.url}")
+            watched_publication.next_poll_time = time.monotonic() + self.get_jittered_interval()
+        return current_url
+
+    def _ensure_signed_in(self, downloader: SubstackArchivesDownloader):
+        if self._num_polls_since_session_check >= Watcher.session_check_interval:
+            if downloader.ensure_signed_in():
+                print("The session had expired, so signed in again")
+            self._num_polls_since_session_check = 0
+        self._num_polls_since_session_check += 1
+
+    def get_jittered_interval(self) -> float:
+        return self._poll_interval * random.uniform(1 - self._jitter, 1 + self._jitter)
+
+    # Methods for the status endpoint
+    def get_status(self) -> dict:
+        with self._lock:
+            return {
+                'started_at': self._started_at,
+                'polling': self._polling_url,
+                'publications': [watched_publication.convert_to_dict()
+                                 for watched_publication in self._watched_publications],
+            }
+
+    def _start_status_server(self) -> Optional[ThreadingHTTPServer]:
+        # watching matters more than its status, so a port that is already in use only costs the status endpoint
+        try:
+            status_server = ThreadingHTTPServer((Watcher.status_host, self._status_port), _make_request_handler(self))
+        except OSError as exc:
+            print(f"Could not serve the status on port {self._status_port}, watching without it: {exc}")
+            return None
+        status_server.daemon_threads = True
+        threading.Thread(target=status_server.serve_forever, daemon=True).start()
+        print(f"Status at http://{Watcher.status_host}:{status_server.server_port}/status")
+        return status_server
+
+    def __str__(self):
+        lines = [f"Watched {len(self._watched_publications)} publication(s) for "
+                 f"{(time.time() - self._started_at) / 60:.1f} minutes."]
+        for watched_publication in self._watched_publications:
+            lines.append(f"  {watched_publication.url}: {watched_publication.num_downloaded} article(s) downloaded "
+                         f"in {watched_publication.num_polls} poll(s), of which "
+                         f"{watched_publication.num_failed_polls} failed")
+        return '\n'.join(lines)
+
+
+def _make_request_handler(watcher: Watcher):
+    class RequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.rstrip('/') not in ('', '/status'):
+                self._send(404, 'text/plain', b'Not Found')
+                return
+            self._send(200, 'application/json', json.dumps(watcher.get_status(), indent=4).encode())
+
+        def _send(self, status_code: int, content_type: str, body: bytes):
+            self.send_response(status_code)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # a line per request would drown out the watcher's own output
+
+    return RequestHandler